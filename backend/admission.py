@@ -0,0 +1,294 @@
+"""
+Admission Control for ChatHDI - bounded, prioritised access to AI providers
+Every provider call (AIService.chat, MediaService.generate_image) takes a
+slot from the limiter of its provider first. A limiter combines
+- a concurrency limit (calls in flight), and
+- an optional token bucket (`rate` calls per second, bursts up to `burst`),
+so a burst of users queues here instead of tripping the provider's rate
+limit for everyone at once.
+
+Waiting calls are served by priority - interactive chat before background
+work (PPTX outlines, images) before batch jobs - and first come, first
+served within a priority. A call whose estimated queue time exceeds the
+deadline of its priority is rejected immediately with AdmissionRejected
+(carrying a retry-after hint) rather than waiting to time out.
+
+A slot covers one provider attempt, not the retries: retry_policy releases
+the held slot (`current_slot`) while it backs off and queues for it again
+before the next attempt, so a call sleeping on a Retry-After does not block
+the callers behind it.
+
+Limits are per provider (aiml, groq, vercel, gemini, openai, huggingface);
+a MODEL_MAPPING id can get its own limiter, e.g. for per-model quotas:
+    ADMISSION_LIMITS='{"groq": {"concurrency": 4, "rate": 0.5, "burst": 5},
+                       "hdi-grok-mini": {"concurrency": 8, "rate": 1}}'
+    ADMISSION_DEADLINES='{"interactive": 15, "background": 60, "batch": 300}'
+"""
+
+import os
+import json
+import math
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from contextvars import ContextVar
+from enum import IntEnum
+from contextlib import asynccontextmanager
+from typing import Dict, List, NamedTuple, Optional
+from metrics import ADMISSION_QUEUE_SECONDS, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', 'true').lower() in ('1', 'true', 'yes')
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # chat
+    BACKGROUND = 1   # PPTX outlines, image generation
+    BATCH = 2        # bulk jobs
+
+
+class Limit(NamedTuple):
+    concurrency: int
+    rate: Optional[float] = None   # calls per second, None = no token bucket
+    burst: Optional[float] = None  # bucket size, defaults to max(1, rate)
+
+
+# Concurrency only by default: request rates depend on the account's plan
+DEFAULT_LIMITS: Dict[str, Limit] = {
+    "aiml": Limit(16),
+    "groq": Limit(16),
+    "vercel": Limit(16),
+    "gemini": Limit(8),
+    "openai": Limit(4),
+    "huggingface": Limit(4),
+}
+FALLBACK_LIMIT = Limit(16)
+
+DEFAULT_DEADLINES = {Priority.INTERACTIVE: 15.0, Priority.BACKGROUND: 60.0, Priority.BATCH: 300.0}
+
+
+def _load_limits() -> Dict[str, Limit]:
+    limits = dict(DEFAULT_LIMITS)
+    raw = os.environ.get('ADMISSION_LIMITS', '')
+    if raw:
+        try:
+            for key, value in json.loads(raw).items():
+                limits[key] = Limit(int(value.get("concurrency", FALLBACK_LIMIT.concurrency)),
+                                    value.get("rate"), value.get("burst"))
+        except (ValueError, AttributeError, TypeError) as e:
+            logger.error(f"Invalid ADMISSION_LIMITS, using defaults: {e}")
+    return limits
+
+
+def _load_deadlines() -> Dict[Priority, float]:
+    deadlines = dict(DEFAULT_DEADLINES)
+    raw = os.environ.get('ADMISSION_DEADLINES', '')
+    if raw:
+        try:
+            for name, seconds in json.loads(raw).items():
+                deadlines[Priority[name.upper()]] = float(seconds)
+        except (ValueError, KeyError, AttributeError, TypeError) as e:
+            logger.error(f"Invalid ADMISSION_DEADLINES, using defaults: {e}")
+    return deadlines
+
+
+class AdmissionRejected(Exception):
+    """The provider queue is too long to start this call within its deadline"""
+
+    def __init__(self, key: str, priority: Priority, retry_after: float):
+        super().__init__(f"{key} queue is full for {priority.name.lower()} calls")
+        self.key = key
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+def busy_message(rejected: AdmissionRejected) -> str:
+    """User-facing text for a rejected call (same style as the provider quota messages)"""
+    seconds = max(1, math.ceil(rejected.retry_after))
+    return (f"⏳ Server sedang sibuk: antrean ke {rejected.key} penuh. "
+            f"Silakan coba lagi dalam {seconds} detik atau gunakan model lain.")
+
+
+class Limiter:
+    """Concurrency limit + token bucket with a priority queue of waiting calls"""
+
+    def __init__(self, key: str, limit: Limit):
+        self.key = key
+        self.limit = limit
+        self.burst = limit.burst or max(1.0, limit.rate or 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.active = 0
+        self.waiters: List[list] = []  # heap of [priority, seq, future]
+        self.queued = 0
+        self.hold_time: Optional[float] = None  # moving average of call duration
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.limit.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.limit.rate)
+        self.updated = now
+
+    def _can_start(self) -> bool:
+        return self.active < self.limit.concurrency and (not self.limit.rate or self.tokens >= 1)
+
+    def _start(self):
+        self.active += 1
+        if self.limit.rate:
+            self.tokens -= 1
+
+    def estimated_wait(self, priority: Priority) -> float:
+        """Seconds until a new call of this priority would start (0 when unknown)"""
+        ahead = sum(1 for p, _, future in self.waiters if p <= priority and not future.done())
+        throughput = []
+        if self.hold_time:
+            throughput.append(self.limit.concurrency / self.hold_time)
+        if self.limit.rate:
+            throughput.append(self.limit.rate)
+        if not throughput:
+            return 0.0
+        return (ahead + 1) / min(throughput)
+
+    def _wake(self):
+        """Start as many queued calls as the limits allow, highest priority first"""
+        self._refill()
+        while self.waiters and self.active < self.limit.concurrency:
+            if self.limit.rate and self.tokens < 1:
+                if self._timer is None:
+                    delay = (1 - self.tokens) / self.limit.rate
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+            future = heapq.heappop(self.waiters)[2]
+            if future.done():
+                continue
+            self._start()
+            future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._wake()
+
+    async def acquire(self, priority: Priority, deadline: float):
+        self._refill()
+        if not self.waiters and self._can_start():
+            self._start()
+            ADMISSION_QUEUE_SECONDS.labels(provider=self.key, priority=priority.name.lower()).observe(0)
+            return
+        estimate = self.estimated_wait(priority)
+        if estimate > deadline:
+            ADMISSION_REJECTED.labels(provider=self.key, priority=priority.name.lower(), reason="estimate").inc()
+            raise AdmissionRejected(self.key, priority, estimate)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, [priority, next(self._seq), future])
+        self.queued += 1
+        ADMISSION_QUEUE_DEPTH.labels(provider=self.key).inc()
+        start = time.perf_counter()
+        self._wake()
+        try:
+            await asyncio.wait_for(future, deadline)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTED.labels(provider=self.key, priority=priority.name.lower(), reason="deadline").inc()
+            raise AdmissionRejected(self.key, priority, self.estimated_wait(priority)) from None
+        except asyncio.CancelledError:
+            # Granted in the same tick the caller went away: hand the slot on
+            if future.done() and not future.cancelled():
+                self.release(None)
+            raise
+        finally:
+            self.queued -= 1
+            ADMISSION_QUEUE_DEPTH.labels(provider=self.key).dec()
+            ADMISSION_QUEUE_SECONDS.labels(provider=self.key, priority=priority.name.lower()).observe(
+                time.perf_counter() - start)
+
+    def release(self, held: Optional[float]):
+        self.active -= 1
+        if held is not None:
+            self.hold_time = held if self.hold_time is None else 0.8 * self.hold_time + 0.2 * held
+        self._wake()
+
+    def report(self) -> Dict:
+        self._refill()
+        return {
+            "concurrency": self.limit.concurrency,
+            "rate": self.limit.rate,
+            "active": self.active,
+            "queued": self.queued,
+            "tokens": round(self.tokens, 2) if self.limit.rate else None,
+            "avg_call_seconds": round(self.hold_time, 3) if self.hold_time else None,
+        }
+
+
+class Slot:
+    """A slot held by one call; released while the call waits to retry"""
+
+    def __init__(self, limiter: Limiter, priority: Priority, deadline: float):
+        self.limiter = limiter
+        self.priority = priority
+        self.deadline = deadline
+        self.held = False
+        self.start = 0.0
+
+    async def acquire(self):
+        await self.limiter.acquire(self.priority, self.deadline)
+        self.held = True
+        self.start = time.perf_counter()
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.limiter.release(time.perf_counter() - self.start)
+
+
+# Slot of the provider call running in this task, if any
+current_slot: ContextVar[Optional[Slot]] = ContextVar("admission_slot", default=None)
+
+
+class AdmissionController:
+    """One limiter per provider (or per MODEL_MAPPING id when configured)"""
+
+    def __init__(self, limits: Optional[Dict[str, Limit]] = None,
+                 deadlines: Optional[Dict[Priority, float]] = None, enabled: bool = True):
+        self.limits = limits if limits is not None else _load_limits()
+        self.deadlines = deadlines or _load_deadlines()
+        self.enabled = enabled
+        self.limiters: Dict[str, Limiter] = {}
+
+    def limiter(self, provider: str, model_id: Optional[str] = None) -> Limiter:
+        key = model_id if model_id in self.limits else provider
+        limiter = self.limiters.get(key)
+        if limiter is None:
+            limiter = self.limiters[key] = Limiter(key, self.limits.get(key, FALLBACK_LIMIT))
+        return limiter
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model_id: Optional[str] = None,
+                   priority: Priority = Priority.INTERACTIVE):
+        """Hold a provider slot for the duration of one call (raises AdmissionRejected)"""
+        if not self.enabled:
+            yield
+            return
+        slot = Slot(self.limiter(provider, model_id), priority, self.deadlines[priority])
+        await slot.acquire()
+        token = current_slot.set(slot)
+        try:
+            yield
+        finally:
+            current_slot.reset(token)
+            slot.release()
+
+    def report(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "deadlines": {priority.name.lower(): seconds for priority, seconds in self.deadlines.items()},
+            "limiters": {key: limiter.report() for key, limiter in sorted(self.limiters.items())},
+        }
+
+
+# Singleton instance
+admission = AdmissionController(enabled=ADMISSION_CONTROL)
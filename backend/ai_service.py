@@ -9,10 +9,24 @@ Supports:
 """
 
 import os
+import time
+import asyncio
 import logging
 import google.generativeai as genai
 from openai import AsyncOpenAI
-from typing import List, Dict
+from typing import Awaitable, Callable, List, Dict, Optional, Union
+from metrics import (
+    PROVIDER_REQUEST_DURATION, PROVIDER_TIME_TO_FIRST_TOKEN, PROVIDER_ERRORS, PROVIDER_IN_FLIGHT,
+    error_status
+)
+from tracing import tracer, traced
+from admission import admission, AdmissionRejected, Priority, busy_message
+from single_flight import SingleFlight, request_key
+from retry_policy import retry_policy
+from usage import usage_meter, note_usage
+from chat_messages import ChatHistory
+from image_preprocess import image_preprocessor
+from model_router import model_router, RouteDecision, AUTO_MODEL_ID
 
 logger = logging.getLogger(__name__)
 
@@ -38,9 +52,32 @@ AIML_API_KEY = os.environ.get('AIML_API_KEY', '')
 def is_valid_key(key):
     return key and 'your_' not in key and 'api_key_here' not in key and len(key) > 10
 
+# Provider base URLs - override to use a proxy or the local mock provider (mock_provider.py)
+MOCK_PROVIDER_URL = os.environ.get('MOCK_PROVIDER_URL', '').rstrip('/')
+MOCK_API_KEY = 'mock-provider-key'
+
+def provider_base_url(env_name, default):
+    return os.environ.get(env_name) or (f"{MOCK_PROVIDER_URL}/v1" if MOCK_PROVIDER_URL else default)
+
+GROQ_BASE_URL = provider_base_url('GROQ_BASE_URL', "https://api.groq.com/openai/v1")
+AIML_BASE_URL = provider_base_url('AIML_BASE_URL', "https://api.aimlapi.com/v1")
+VERCEL_BASE_URL = provider_base_url('VERCEL_BASE_URL', "https://ai-gateway.vercel.sh/v1")
+GEMINI_BASE_URL = os.environ.get('GEMINI_BASE_URL') or MOCK_PROVIDER_URL
+
+if MOCK_PROVIDER_URL:
+    # The mock accepts any key, so every provider is usable offline
+    logger.warning(f"MOCK_PROVIDER_URL set - all AI providers point at {MOCK_PROVIDER_URL}")
+    GOOGLE_API_KEY = GOOGLE_API_KEY if is_valid_key(GOOGLE_API_KEY) else MOCK_API_KEY
+    GROQ_API_KEY = GROQ_API_KEY if is_valid_key(GROQ_API_KEY) else MOCK_API_KEY
+    VERCEL_AI_GATEWAY_KEY = VERCEL_AI_GATEWAY_KEY if is_valid_key(VERCEL_AI_GATEWAY_KEY) else MOCK_API_KEY
+    AIML_API_KEY = AIML_API_KEY if is_valid_key(AIML_API_KEY) else MOCK_API_KEY
+
 # Configure Gemini (direct API - fallback)
 if not is_valid_key(GOOGLE_API_KEY):
     logger.warning("GOOGLE_API_KEY not set - Direct Gemini features will not work")
+elif GEMINI_BASE_URL:
+    # Custom endpoints are only reachable over REST (the default transport is gRPC)
+    genai.configure(api_key=GOOGLE_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_BASE_URL})
 else:
     genai.configure(api_key=GOOGLE_API_KEY)
 
@@ -51,7 +88,8 @@ if not is_valid_key(GROQ_API_KEY):
 else:
     groq_client = AsyncOpenAI(
         api_key=GROQ_API_KEY,
-        base_url="https://api.groq.com/openai/v1",
+        base_url=GROQ_BASE_URL,
+        max_retries=0,  # retried by retry_policy
     )
 
 # Configure AIML API (RECOMMENDED - FREE, access to 400+ models)
@@ -61,7 +99,8 @@ if not is_valid_key(AIML_API_KEY):
 else:
     aiml_client = AsyncOpenAI(
         api_key=AIML_API_KEY,
-        base_url="https://api.aimlapi.com/v1",
+        base_url=AIML_BASE_URL,
+        max_retries=0,  # retried by retry_policy
     )
     logger.info("AIML API configured - Access to GPT-4o, Claude, Llama, and 400+ models!")
 
@@ -72,7 +111,8 @@ if not is_valid_key(VERCEL_AI_GATEWAY_KEY):
 else:
     vercel_client = AsyncOpenAI(
         api_key=VERCEL_AI_GATEWAY_KEY,
-        base_url="https://ai-gateway.vercel.sh/v1",
+        base_url=VERCEL_BASE_URL,
+        max_retries=0,  # retried by retry_policy
     )
     logger.info("Vercel AI Gateway configured")
 
@@ -147,14 +187,104 @@ MODEL_MAPPING = {
 }
 
 
+# Upstream whose admission limiter a routed provider uses (admission.py)
+ADMISSION_PROVIDER = {"vercel-grounding": "vercel", "web-search": "groq"}
+
+# Gemini models behind MODEL_MAPPING, built ahead of time by warm_up()
+GEMINI_MODELS = sorted({name for provider, name, _ in MODEL_MAPPING.values() if provider == "gemini"})
+
+
 class AIService:
     """Multi-provider AI service (AIML + Vercel + Gemini + Groq)"""
     
     def __init__(self):
-        pass
+        # GenerativeModel objects for the plain system prompt, reused across chats
+        self._gemini_models: Dict[str, "genai.GenerativeModel"] = {}
+        self._flight = SingleFlight("chat")
+    
+    def _gemini_model(self, model_name: str, context: Optional[str] = None):
+        """GenerativeModel for a chat; the variant without extra context is cached"""
+        if context:
+            return genai.GenerativeModel(model_name=model_name, system_instruction=self._system_prompt(context))
+        model = self._gemini_models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name=model_name, system_instruction=SYSTEM_PROMPT)
+            self._gemini_models[model_name] = model
+        return model
+    
+    def provider_checks(self) -> Dict[str, Callable[[], Awaitable]]:
+        """Cheap reachability call per configured provider (no tokens generated)
+
+        The OpenAI-compatible clients list models; Gemini counts the tokens of
+        a one-word prompt, over the same transport `_chat_gemini` uses.
+        """
+        def list_models(client):
+            return lambda: client.models.list()
+
+        async def count_gemini_tokens():
+            model = self._gemini_model(GEMINI_MODELS[0])
+            if GEMINI_BASE_URL:
+                await asyncio.to_thread(model.count_tokens, "ping")
+            else:
+                await model.count_tokens_async("ping")
+
+        checks = {name: list_models(client) for name, client in
+                  (("aiml", aiml_client), ("groq", groq_client), ("vercel", vercel_client)) if client}
+        if is_valid_key(GOOGLE_API_KEY):
+            checks["gemini"] = count_gemini_tokens
+        return checks
     
-    async def chat(self, messages: List[Dict], model_id: str = "hdi-gpt4o") -> str:
-        """Route chat request to appropriate provider"""
+    async def warm_up(self, timeout: float = 10.0) -> Dict[str, str]:
+        """Open provider connections and build Gemini models before the first chat
+
+        Running the provider checks leaves a pooled keep-alive connection
+        (DNS and TLS done) per provider and creates the Gemini SDK client.
+        """
+        if is_valid_key(GOOGLE_API_KEY):
+            for model_name in GEMINI_MODELS:
+                self._gemini_model(model_name)
+        checks = self.provider_checks()
+        results = await asyncio.gather(*(asyncio.wait_for(check(), timeout) for check in checks.values()),
+                                       return_exceptions=True)
+        return {
+            name: "ok" if not isinstance(result, BaseException) else f"error: {type(result).__name__}: {result}"
+            for name, result in zip(checks, results)
+        }
+    
+    def provider_configured(self, model_id: str) -> bool:
+        """Whether the provider behind a MODEL_MAPPING id has credentials"""
+        provider = MODEL_MAPPING.get(model_id, ("",))[0]
+        if provider in ("vercel", "vercel-grounding"):
+            return vercel_client is not None
+        if provider in ("groq", "web-search"):
+            return groq_client is not None
+        if provider == "aiml":
+            return aiml_client is not None
+        if provider == "gemini":
+            return is_valid_key(GOOGLE_API_KEY)
+        return False
+    
+    def auto_route(self, messages: Union[ChatHistory, List[Dict]], context: Optional[str] = None) -> RouteDecision:
+        """Model for an hdi-auto request (see model_router.py)"""
+        return model_router.route(messages, context, available=self.provider_configured)
+    
+    def _system_prompt(self, context: Optional[str] = None) -> str:
+        """System prompt, extended with retrieved context (e.g. R&D Database records)"""
+        if not context:
+            return SYSTEM_PROMPT
+        return f"{SYSTEM_PROMPT}\n\n{context}"
+    
+    async def chat(self, messages: Union[ChatHistory, List[Dict]], model_id: str = "hdi-gpt4o",
+                   context: Optional[str] = None,
+                   priority: Priority = Priority.INTERACTIVE, feature: str = "chat") -> str:
+        """Route chat request to appropriate provider (after admission control)
+
+        `feature` labels the call's token usage and cost (see usage.py).
+        """
+        conversation = ChatHistory.of(messages)
+        
+        if model_id == AUTO_MODEL_ID:
+            model_id = self.auto_route(conversation, context).model_id
         
         # Get model info, default to AIML GPT-4o if model not found
         model_info = MODEL_MAPPING.get(model_id, ("aiml", "gpt-4o", "Default GPT-4o"))
@@ -188,21 +318,54 @@ class AIService:
                 provider = "gemini"
                 model_name = "gemini-1.5-flash"
         
-        # Route to appropriate provider
+        # Identical chats already in flight (e.g. the same suggestion clicked by many users) share one call.
+        # Priority is part of the key: an interactive chat must not wait in the batch queue of an equal batch item
+        key = request_key(model_id, conversation.digest, context, int(priority), feature)
+        return await self._flight.do(
+            key, lambda: self._chat_admitted(provider, model_id, model_name, conversation, context, priority, feature))
+
+    async def _chat_admitted(self, provider: str, model_id: str, model_name: str, conversation: ChatHistory,
+                             context: Optional[str], priority: Priority, feature: str) -> str:
+        """One provider call, within an admission slot"""
+        labels = {"model_id": model_id, "provider": provider, "model": model_name}
+        # Downscale attached images for this provider before taking a slot
+        conversation = await image_preprocessor.prepare(conversation, provider)
+        try:
+            async with admission.slot(ADMISSION_PROVIDER.get(provider, provider), model_id, priority):
+                PROVIDER_IN_FLIGHT.labels(provider=provider).inc()
+                start = time.perf_counter()
+                try:
+                    with tracer.span("AIService.chat", **labels, messages=len(conversation)), \
+                            usage_meter.track(provider, model_id, model_name, feature):
+                        return await self._dispatch(provider, conversation, model_name, context)
+                finally:
+                    elapsed = time.perf_counter() - start
+                    PROVIDER_IN_FLIGHT.labels(provider=provider).dec()
+                    PROVIDER_REQUEST_DURATION.labels(**labels).observe(elapsed)
+                    # Responses are not streamed, so the first token arrives with the full response
+                    PROVIDER_TIME_TO_FIRST_TOKEN.labels(**labels).observe(elapsed)
+        except AdmissionRejected as e:
+            logger.warning(f"Chat rejected by admission control: {e}")
+            return busy_message(e)
+
+    async def _dispatch(self, provider: str, conversation: ChatHistory, model_name: str,
+                        context: Optional[str] = None) -> str:
+        """Route to appropriate provider"""
         if provider == "aiml":
-            return await self._chat_aiml(messages, model_name)
+            return await self._chat_aiml(conversation, model_name, context)
         elif provider == "vercel":
-            return await self._chat_vercel(messages, model_name)
+            return await self._chat_vercel(conversation, model_name, context)
         elif provider == "vercel-grounding":
-            return await self._chat_vercel_with_grounding(messages, model_name)
+            return await self._chat_vercel_with_grounding(conversation, model_name, context)
         elif provider == "groq":
-            return await self._chat_groq(messages, model_name)
+            return await self._chat_groq(conversation, model_name, context)
         elif provider == "web-search":
-            return await self._chat_with_search(messages, model_name)
+            return await self._chat_with_search(conversation, model_name, context)
         else:
-            return await self._chat_gemini(messages, model_name)
+            return await self._chat_gemini(conversation, model_name, context)
 
-    async def _chat_aiml(self, messages: List[Dict], model_name: str) -> str:
+    @traced("AIService._chat_aiml")
+    async def _chat_aiml(self, conversation: ChatHistory, model_name: str, context: Optional[str] = None) -> str:
         """Handle chat with AIML API (GPT-4o, Claude, Llama, 400+ models)"""
         if not aiml_client:
             return """❌ **AIML API tidak dikonfigurasi**
@@ -215,19 +378,20 @@ Untuk menggunakan GPT-4o, Claude 3.5, Llama, dan 400+ model:
 **Gratis 50,000 credits tanpa kartu kredit!**"""
             
         try:
-            # Prepare messages with system prompt
-            formatted_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-            formatted_messages.extend(messages)
+            # Messages behind the system prompt (encoded once per conversation)
+            formatted_messages = conversation.openai(self._system_prompt(context))
             
-            response = await aiml_client.chat.completions.create(
-                model=model_name,
-                messages=formatted_messages,
-            )
+            response = await retry_policy.call("aiml", lambda: aiml_client.chat.completions.create(
+                    model=model_name,
+                    messages=formatted_messages,
+                ))
+            note_usage(response)
             
             return response.choices[0].message.content
             
         except Exception as e:
             logger.error(f"AIML API Error: {e}")
+            PROVIDER_ERRORS.labels(provider="aiml", status=error_status(e)).inc()
             error_str = str(e)
             
             return f"""❌ **Error dari AIML API:**
@@ -241,7 +405,8 @@ Untuk menggunakan GPT-4o, Claude 3.5, Llama, dan 400+ model:
 2. Pastikan model `{model_name}` tersedia di akun Anda
 3. Cek sisa credits di dashboard"""
 
-    async def _chat_vercel(self, messages: List[Dict], model_name: str) -> str:
+    @traced("AIService._chat_vercel")
+    async def _chat_vercel(self, conversation: ChatHistory, model_name: str, context: Optional[str] = None) -> str:
         """Handle chat with Vercel AI Gateway (OpenAI, Claude, Gemini)"""
         if not vercel_client:
             return """❌ **Vercel AI Gateway tidak dikonfigurasi**
@@ -255,19 +420,20 @@ Model ini (GPT-4o, Claude 3.5, Gemini 2.0) memerlukan Vercel AI Gateway yang **m
 Cukup pilih model FREE di dropdown untuk mulai chat!"""
             
         try:
-            # Prepare messages with system prompt
-            formatted_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-            formatted_messages.extend(messages)
+            # Messages behind the system prompt (encoded once per conversation)
+            formatted_messages = conversation.openai(self._system_prompt(context))
             
-            response = await vercel_client.chat.completions.create(
-                model=model_name,
-                messages=formatted_messages,
-            )
+            response = await retry_policy.call("vercel", lambda: vercel_client.chat.completions.create(
+                    model=model_name,
+                    messages=formatted_messages,
+                ))
+            note_usage(response)
             
             return response.choices[0].message.content
             
         except Exception as e:
             logger.error(f"Vercel AI Gateway Error: {e}")
+            PROVIDER_ERRORS.labels(provider="vercel", status=error_status(e)).inc()
             error_str = str(e)
             
             # Show full error for debugging, with helpful context
@@ -289,21 +455,19 @@ Cukup pilih model FREE di dropdown untuk mulai chat!"""
             
             return error_msg
 
-    async def _chat_vercel_with_grounding(self, messages: List[Dict], model_name: str) -> str:
+    @traced("AIService._chat_vercel_with_grounding")
+    async def _chat_vercel_with_grounding(self, conversation: ChatHistory, model_name: str, context: Optional[str] = None) -> str:
         """Handle chat with Vercel AI Gateway + Google Search Grounding"""
         if not vercel_client:
             return "❌ Error: VERCEL_AI_GATEWAY_KEY tidak dikonfigurasi."
             
         try:
             # Get the last user message for search context
-            last_user_msg = ""
-            for msg in reversed(messages):
-                if msg["role"] == "user":
-                    last_user_msg = msg["content"]
-                    break
+            last_user = conversation.last_user
+            last_user_msg = last_user.text if last_user else ""
             
             # Add grounding instruction to system prompt
-            grounding_prompt = f"""{SYSTEM_PROMPT}
+            grounding_prompt = f"""{self._system_prompt(context)}
 
 **PENTING - Mode Google Search Grounding Aktif:**
 - Kamu memiliki akses ke informasi terkini dari internet
@@ -313,15 +477,15 @@ Cukup pilih model FREE di dropdown untuk mulai chat!"""
 
 Pertanyaan user memerlukan informasi real-time, jadi berikan jawaban yang akurat dan terkini."""
 
-            formatted_messages = [{"role": "system", "content": grounding_prompt}]
-            formatted_messages.extend(messages)
+            formatted_messages = conversation.openai(grounding_prompt)
             
             # Use Gemini with web search capability through Vercel
-            response = await vercel_client.chat.completions.create(
-                model=model_name,
-                messages=formatted_messages,
-                # Note: Vercel AI Gateway handles grounding for supported models
-            )
+            response = await retry_policy.call("vercel", lambda: vercel_client.chat.completions.create(
+                    model=model_name,
+                    messages=formatted_messages,
+                    # Note: Vercel AI Gateway handles grounding for supported models
+                ))
+            note_usage(response)
             
             result = response.choices[0].message.content
             
@@ -333,31 +497,35 @@ Pertanyaan user memerlukan informasi real-time, jadi berikan jawaban yang akurat
             
         except Exception as e:
             logger.error(f"Vercel Grounding Error: {e}")
+            PROVIDER_ERRORS.labels(provider="vercel-grounding", status=error_status(e)).inc()
             # Fallback to regular Vercel call
-            return await self._chat_vercel(messages, model_name)
+            return await self._chat_vercel(conversation, model_name, context)
 
-    async def _chat_groq(self, messages: List[Dict], model_name: str) -> str:
+    @traced("AIService._chat_groq")
+    async def _chat_groq(self, conversation: ChatHistory, model_name: str, context: Optional[str] = None) -> str:
         """Handle chat with Groq (via OpenAI SDK)"""
         if not groq_client:
             return "❌ Error: GROQ_API_KEY tidak dikonfigurasi. Tambahkan ke backend/.env"
             
         try:
-            # Prepare messages with system prompt
-            formatted_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-            formatted_messages.extend(messages)
+            # Messages behind the system prompt (encoded once per conversation)
+            formatted_messages = conversation.openai(self._system_prompt(context))
             
-            response = await groq_client.chat.completions.create(
-                model=model_name,
-                messages=formatted_messages,
-            )
+            response = await retry_policy.call("groq", lambda: groq_client.chat.completions.create(
+                    model=model_name,
+                    messages=formatted_messages,
+                ))
+            note_usage(response)
             
             return response.choices[0].message.content
             
         except Exception as e:
             logger.error(f"Groq Error: {e}")
+            PROVIDER_ERRORS.labels(provider="groq", status=error_status(e)).inc()
             return f"❌ Error dari Groq: {str(e)}"
 
-    async def _chat_with_search(self, messages: List[Dict], model_name: str) -> str:
+    @traced("AIService._chat_with_search")
+    async def _chat_with_search(self, conversation: ChatHistory, model_name: str, context: Optional[str] = None) -> str:
         """Handle chat with web search + LLM"""
         search_svc = get_search_service()
         
@@ -376,11 +544,8 @@ Lalu restart backend server."""
         
         try:
             # Get the last user message for search
-            last_user_msg = ""
-            for msg in reversed(messages):
-                if msg["role"] == "user":
-                    last_user_msg = msg["content"]
-                    break
+            last_user = conversation.last_user
+            last_user_msg = last_user.text if last_user else ""
             
             if not last_user_msg:
                 return "❌ Error: Tidak ada pesan user untuk dicari."
@@ -407,7 +572,7 @@ Atau tanyakan langsung tanpa Web Search."""
             search_context = search_svc.format_results_for_ai(search_results, last_user_msg)
             
             # Create enhanced prompt with search results
-            search_prompt = f"""{SYSTEM_PROMPT}
+            search_prompt = f"""{self._system_prompt(context)}
 
 **MODE WEB SEARCH AKTIF**
 
@@ -422,14 +587,14 @@ Kamu memiliki akses ke hasil pencarian web terbaru. Gunakan informasi dari hasil
 4. Format jawaban dengan rapi menggunakan Markdown"""
 
             # Prepare messages with search context
-            formatted_messages = [{"role": "system", "content": search_prompt}]
-            formatted_messages.extend(messages)
+            formatted_messages = conversation.openai(search_prompt)
             
             # Use Groq for fast response
-            response = await groq_client.chat.completions.create(
-                model=model_name,
-                messages=formatted_messages,
-            )
+            response = await retry_policy.call("groq", lambda: groq_client.chat.completions.create(
+                    model=model_name,
+                    messages=formatted_messages,
+                ))
+            note_usage(response)
             
             result = response.choices[0].message.content
             
@@ -453,51 +618,39 @@ Kamu memiliki akses ke hasil pencarian web terbaru. Gunakan informasi dari hasil
             
         except Exception as e:
             logger.error(f"Web Search Error: {e}")
+            PROVIDER_ERRORS.labels(provider="web-search", status=error_status(e)).inc()
             # Fallback to regular Groq chat
-            return await self._chat_groq(messages, model_name)
+            return await self._chat_groq(conversation, model_name, context)
 
-    async def _chat_gemini(self, messages: List[Dict], model_name: str) -> str:
+    @traced("AIService._chat_gemini")
+    async def _chat_gemini(self, conversation: ChatHistory, model_name: str, context: Optional[str] = None) -> str:
         """Handle chat with Google Gemini (Direct API)"""
         if not is_valid_key(GOOGLE_API_KEY):
              return "❌ Error: GOOGLE_API_KEY tidak dikonfigurasi. Tambahkan ke backend/.env"
 
         try:
-            # Initialize model
-            model = genai.GenerativeModel(
-                model_name=model_name,
-                system_instruction=SYSTEM_PROMPT
-            )
-            
-            # Convert messages to Gemini format
-            history = []
-            last_user_message = ""
-            
-            for msg in messages:
-                role = msg["role"]
-                content = msg["content"]
-                
-                if role == "system":
-                    continue # System prompt passed separately
-                
-                if role == "assistant":
-                    role = "model"
-                
-                # Check for last message (which is the prompt)
-                if msg == messages[-1] and role == "user":
-                    last_user_message = content
-                else:
-                    history.append({"role": role, "parts": [content]})
+            # Initialize model (reused when there is no extra context)
+            model = self._gemini_model(model_name, context)
+            
+            # History and prompt parts, in one pass over the messages
+            history, prompt = conversation.gemini()
             
-            # Create chat session
-            chat_session = model.start_chat(history=history)
+            async def send():
+                # Fresh chat session per attempt: a failed send must not leave a half-updated history
+                chat_session = model.start_chat(history=history)
+                # The SDK has no async REST transport, so custom endpoints run in a thread
+                if GEMINI_BASE_URL:
+                    return await asyncio.to_thread(chat_session.send_message, prompt)
+                return await chat_session.send_message_async(prompt)
             
-            # Send message
-            response = await chat_session.send_message_async(last_user_message)
+            response = await retry_policy.call("gemini", send)
+            note_usage(response)
             
             return response.text
                 
         except Exception as e:
             logger.error(f"Gemini Error: {e}")
+            PROVIDER_ERRORS.labels(provider="gemini", status=error_status(e)).inc()
             # Handle potential quota error gracefully
             if "429" in str(e):
                 return "⏳ Kuota API Gemini (Google) sedang penuh. Silakan coba lagi nanti atau gunakan model lain."
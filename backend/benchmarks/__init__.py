@@ -0,0 +1,8 @@
+"""
+Benchmarks for the ChatHDI backend hot paths
+
+Run from the backend directory:
+    python -m benchmarks.run --save          # record a local baseline (baselines.json, not committed)
+    python -m benchmarks.run                 # run everything, compare to it
+    python -m benchmarks.run -k pptx         # only cases whose name contains "pptx"
+"""
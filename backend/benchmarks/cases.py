@@ -0,0 +1,171 @@
+"""
+Benchmark cases for the backend hot paths
+
+Each case is a setup function returning the operation to time (a plain
+function or a coroutine function); expensive fixtures are built in setup
+and not counted.
+"""
+
+import io
+import json
+import tempfile
+from pathlib import Path
+from typing import Callable, List, NamedTuple
+
+from benchmarks import fixtures
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[], Callable]
+    rounds: int
+
+
+CASES: List[Case] = []
+
+
+def case(name: str, rounds: int = 20):
+    """Register a benchmark case"""
+    def decorator(setup: Callable[[], Callable]) -> Callable[[], Callable]:
+        CASES.append(Case(name, setup, rounds))
+        return setup
+    return decorator
+
+
+def _server():
+    import server
+    return server
+
+
+# ============ CONVERSATIONS ============
+
+def _conversation_store(count: int) -> Path:
+    server = _server()
+    path = Path(tempfile.mkdtemp(prefix="chathdi-bench-")) / "conversations.json"
+    path.write_text(json.dumps(fixtures.make_conversations(count)), encoding="utf-8")
+    server.state_store.conversations_file = path
+    return path
+
+
+for _count, _label in ((10, "10"), (1000, "1k"), (10000, "10k")):
+    def _register(count=_count, label=_label):
+        rounds = 5 if count >= 10000 else 20
+
+        @case(f"conversations.get[{label}]", rounds)
+        def get_conversations():
+            server = _server()
+            _conversation_store(count)
+            return server.get_conversations
+
+        @case(f"conversations.save[{label}]", rounds)
+        def save_conversation():
+            server = _server()
+            _conversation_store(count)
+            conversation = server.Conversation(**fixtures.make_conversations(1, seed=99)[0])
+            return lambda: server.save_conversation(conversation)
+    _register()
+
+
+# ============ DOCUMENT PARSING ============
+
+def _upload(filename: str, content: bytes):
+    from fastapi import UploadFile
+
+    def make():
+        return UploadFile(file=io.BytesIO(content), filename=filename)
+    return make
+
+
+for _name, _builder, _rounds in (
+    ("large.pdf", lambda: fixtures.make_pdf(100), 5),
+    ("large.docx", lambda: fixtures.make_docx(3000), 5),
+    ("large.xlsx", lambda: fixtures.make_xlsx(5000), 5),
+    ("large.csv", lambda: fixtures.make_csv(50000), 5),
+):
+    def _register(filename=_name, builder=_builder, rounds=_rounds):
+        @case(f"document.parse[{filename.split('.')[-1]}]", rounds)
+        def parse_document():
+            from document_service import document_service
+            make_upload = _upload(filename, builder())
+            return lambda: document_service.parse_document(make_upload())
+    _register()
+
+
+# ============ PPTX ============
+
+for _slides in (10, 50, 200):
+    def _register(slides=_slides):
+        @case(f"pptx.create_presentation[{slides}]", 5 if slides >= 200 else 10)
+        def create_presentation():
+            from pptx_service import pptx_service
+            content = fixtures.make_slides(slides)
+            return lambda: pptx_service.create_presentation("Benchmark", content)
+    _register()
+
+
+@case("pptx.parse_ai_response[200]", 200)
+def parse_ai_response():
+    from pptx_service import pptx_service
+    response = fixtures.make_outline_response(200)
+    return lambda: pptx_service._parse_ai_response(response)
+
+
+# ============ R&D DATABASE ============
+
+def _papers_store(count: int):
+    server = _server()
+    from rnd_store import ColumnarCollection
+    server.in_memory_db["rnd_papers"] = ColumnarCollection(server.ResearchPaper, fixtures.make_papers(count))
+    return server
+
+
+for _count, _label in ((1000, "1k"), (10000, "10k")):
+    def _register(count=_count, label=_label):
+        @case(f"rnd.list_papers[{label}]", 10)
+        def list_papers():
+            server = _papers_store(count)
+            return lambda: server.get_papers()
+
+        @case(f"rnd.list_papers_filtered[{label}]", 20)
+        def list_papers_filtered():
+            server = _papers_store(count)
+            return lambda: server.get_papers(category="Fuel Cells", country="Japan", year_from=2020)
+
+        @case(f"rnd.similar_papers[{label}]", 50)
+        def similar_papers():
+            from rnd_similarity import TfidfIndex, PAPER_FIELDS
+            index = TfidfIndex(PAPER_FIELDS)
+            index.rebuild(fixtures.make_papers(count))
+            index.similar("paper-0")  # compile outside the timed loop
+            ids = iter(range(1, 10 ** 9))
+            return lambda: index.similar(f"paper-{next(ids) % count}", 10)
+    _register()
+
+
+# ============ CHAT END-TO-END ============
+
+@case("chat.end_to_end[stub provider]", 50)
+def chat_end_to_end():
+    import httpx
+    from openai import AsyncOpenAI
+    import ai_service as ai_module
+    from mock_provider import create_app, MockConfig
+
+    server = _server()
+    mock = create_app(MockConfig(latency_ms=0, tokens_per_second=0, completion_tokens=200))
+    ai_module.aiml_client = AsyncOpenAI(
+        api_key="mock-provider-key", base_url="http://mock/v1", max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=mock), base_url="http://mock"),
+    )
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench")
+    payload = {
+        "messages": [{"role": "user" if i % 2 == 0 else "assistant", "content": f"Pesan nomor {i} tentang hidrogen"}
+                     for i in range(9)],
+        "model": "hdi-gpt4o",
+    }
+
+    async def post_chat():
+        response = await client.post("/api/chat", json=payload)
+        response.raise_for_status()
+        return response
+    return post_chat
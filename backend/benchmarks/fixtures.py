@@ -0,0 +1,148 @@
+"""
+Synthetic fixtures for the benchmarks (generated in memory, deterministic)
+"""
+
+import io
+import random
+from typing import Dict, List
+
+WORDS = (
+    "hydrogen electrolysis renewable energy fuel cell catalyst membrane efficiency pressure "
+    "temperature reactor storage production analysis system process material hidrogen energi"
+).split()
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_conversations(count: int, messages_per_conversation: int = 6, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"conv-{i}",
+            "title": sentence(rng, 5),
+            "messages": [
+                {"role": "user" if m % 2 == 0 else "assistant", "content": sentence(rng, 40),
+                 "timestamp": "2026-01-01T00:00:00"}
+                for m in range(messages_per_conversation)
+            ],
+            "timestamp": "2026-01-01T00:00:00",
+            "projectId": None,
+            "isPinned": False,
+        }
+        for i in range(count)
+    ]
+
+
+def make_papers(count: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    categories = ["Hydrogen Production", "Hydrogen Storage", "Fuel Cells", "Solar Energy", "Wind Energy"]
+    countries = ["USA", "Germany", "Japan", "UK", "Indonesia", "China"]
+    return [
+        {
+            "id": f"paper-{i}",
+            "title": sentence(rng, 8),
+            "authors": [f"Author {rng.randint(1, 5000)}" for _ in range(3)],
+            "institution": f"Institute {rng.randint(1, 200)}",
+            "journal": f"Journal {rng.randint(1, 50)}",
+            "year": rng.randint(2000, 2025),
+            "doi": f"10.1000/{i}",
+            "abstract": " ".join(sentence(rng) for _ in range(5)),
+            "keywords": rng.sample(WORDS, 4),
+            "citations": rng.randint(0, 500),
+            "category": rng.choice(categories),
+            "country": rng.choice(countries),
+        }
+        for i in range(count)
+    ]
+
+
+def make_pdf(pages: int, lines_per_page: int = 40, seed: int = 0) -> bytes:
+    """Minimal text PDF (one Helvetica content stream per page) with a valid xref table"""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for _ in range(pages):
+        text = "".join(
+            f"BT /F1 10 Tf 40 {780 - 18 * line} Td ({sentence(rng, 10)}) Tj ET\n" for line in range(lines_per_page)
+        ).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(text) + text + b"endstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def make_docx(paragraphs: int, seed: int = 0) -> bytes:
+    import docx
+
+    rng = random.Random(seed)
+    document = docx.Document()
+    for _ in range(paragraphs):
+        document.add_paragraph(sentence(rng, 30))
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_table(rows: int, seed: int = 0):
+    import pandas as pd
+
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "sample": [f"S-{i}" for i in range(rows)],
+        "material": [rng.choice(WORDS) for _ in range(rows)],
+        "pressure_bar": [round(rng.uniform(1, 700), 2) for _ in range(rows)],
+        "temperature_c": [round(rng.uniform(-253, 900), 1) for _ in range(rows)],
+        "efficiency": [round(rng.uniform(0.4, 0.9), 3) for _ in range(rows)],
+    })
+
+
+def make_xlsx(rows: int, seed: int = 0) -> bytes:
+    out = io.BytesIO()
+    make_table(rows, seed).to_excel(out, index=False)
+    return out.getvalue()
+
+
+def make_csv(rows: int, seed: int = 0) -> bytes:
+    return make_table(rows, seed).to_csv(index=False).encode("utf-8")
+
+
+def make_outline_response(slides: int, bullets: int = 4, seed: int = 0) -> str:
+    """AI outline in the format PPTXService._parse_ai_response expects"""
+    rng = random.Random(seed)
+    lines = ["JUDUL: Benchmark Presentasi Hidrogen", ""]
+    for i in range(1, slides + 1):
+        lines.append(f"SLIDE {i}:")
+        lines.append(f"Judul: {sentence(rng, 4)}")
+        lines.extend(f"- {sentence(rng, 10)}" for _ in range(bullets))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def make_slides(count: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    return [
+        {"title": sentence(rng, 4), "content": [sentence(rng, 10) for _ in range(4)],
+         "type": "section" if i % 10 == 0 else "content"}
+        for i in range(count)
+    ]
@@ -0,0 +1,158 @@
+"""
+Benchmark runner - times every case, saves JSON baselines and flags regressions
+
+    python -m benchmarks.run [--save] [--baseline PATH] [--threshold 0.25] [-k FILTER]
+
+Exit code is 1 when a case regressed: its median is slower than the
+baseline median by more than the threshold *and* even its fastest round is
+slower than the baseline's p95, so overlapping (noisy) timings never count.
+
+Baselines are absolute timings of one machine: baselines.json is local
+(not committed), and a baseline recorded on a different machine/Python is
+ignored with a notice. Record one with --save before comparing.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import inspect
+import logging
+import argparse
+import platform
+import statistics
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+BENCH_DIR = Path(__file__).parent
+DEFAULT_BASELINE = BENCH_DIR / "baselines.json"
+DEFAULT_THRESHOLD = 0.25
+# Slowdowns smaller than this (seconds) are timer noise, never regressions
+MIN_DELTA = 0.0005
+
+
+async def time_case(operation, rounds: int, warmup: int = 3) -> Dict:
+    """Run an operation `rounds` times and summarise the timings (seconds)"""
+    async def call():
+        result = operation()
+        if inspect.isawaitable(result):
+            await result
+
+    for _ in range(warmup):
+        await call()
+    samples: List[float] = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "rounds": rounds,
+        "min": samples[0],
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "p95": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "max": samples[-1],
+    }
+
+
+def is_regression(result: Dict, base: Dict, threshold: float) -> bool:
+    slower = result["median"] - base["median"]
+    return (slower > MIN_DELTA and result["median"] > base["median"] * (1 + threshold)
+            and result["min"] > base["p95"])
+
+
+def environment() -> Dict[str, str]:
+    """What a baseline is only valid for"""
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine()}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Names of cases whose median regressed beyond the threshold"""
+    return [
+        name for name, result in results.items()
+        if name in baseline and is_regression(result, baseline[name], threshold)
+    ]
+
+
+def _fmt(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:8.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:8.2f}ms"
+    return f"{seconds:8.3f}s "
+
+
+async def run(selected, baseline: Dict[str, Dict], threshold: float) -> Dict[str, Dict]:
+    results = {}
+    print(f"{'case':<42} {'median':>10} {'p95':>10} {'baseline':>10}  change")
+    for bench in selected:
+        operation = bench.setup()
+        result = await time_case(operation, bench.rounds)
+        results[bench.name] = result
+        base = baseline.get(bench.name)
+        change = ""
+        if base:
+            ratio = result["median"] / base["median"] - 1
+            flag = "  REGRESSION" if is_regression(result, base, threshold) else ""
+            change = f"{ratio:+7.1%}{flag}"
+        print(f"{bench.name:<42} {_fmt(result['median'])} {_fmt(result['p95'])} "
+              f"{_fmt(base['median']) if base else '         -'}  {change}")
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ChatHDI backend benchmarks")
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed median slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("-k", dest="filter", default="", help="only run cases containing this text")
+    parser.add_argument("--output", type=Path, help="also write this run's results to a JSON file")
+    args = parser.parse_args(argv)
+
+    # Keep provider/service start-up chatter out of the report
+    logging.disable(logging.WARNING)
+    os.environ.setdefault("TRACING_ENABLED", "false")
+    from benchmarks.cases import CASES
+
+    selected = [c for c in CASES if args.filter in c.name]
+    if not selected:
+        print(f"No benchmark matches '{args.filter}'")
+        return 1
+
+    baseline_doc = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    baseline = baseline_doc.get("results", {})
+    recorded_on = {key: baseline_doc.get("meta", {}).get(key) for key in environment()}
+    if baseline and recorded_on != environment() and not args.save:
+        print(f"Ignoring {args.baseline}: recorded on {recorded_on}, not this machine. "
+              f"Run with --save to record a local baseline.\n")
+        baseline = {}
+    elif not baseline and not args.save:
+        print(f"No baseline at {args.baseline}; run with --save first to detect regressions.\n")
+    results = asyncio.run(run(selected, baseline, args.threshold))
+
+    document = {
+        "meta": {"timestamp": datetime.now(timezone.utc).isoformat(), **environment()},
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(document, indent=2))
+    if args.save:
+        # Keep baselines of cases that were not part of this (filtered) run
+        document["results"] = {**baseline, **results}
+        args.baseline.write_text(json.dumps(document, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Change Feed for ChatHDI - live R&D Database updates over Server-Sent Events
+- Demo mode: in-process pub/sub with a replay buffer (resume token = sequence number)
+- MongoDB mode: MongoDB change streams (resume token = change stream `_data` token)
+- SQLite state store: polls the shared change log, so every worker sees every
+  worker's writes (resume token = change log sequence number)
+
+Clients reconnect with the last token they saw (SSE `Last-Event-ID`) and
+receive everything they missed, so nobody needs to re-poll /api/rnd/all.
+"""
+
+import json
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Events kept for resuming clients in demo mode
+REPLAY_BUFFER_SIZE = 1000
+# Per-subscriber backlog before the subscriber is told to resync
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Seconds between SSE keep-alive comments
+HEARTBEAT_INTERVAL = 15.0
+# Seconds between polls of a shared state store's change log
+STORE_POLL_INTERVAL = 0.5
+
+MONGO_OPERATIONS = {"insert": "insert", "update": "update", "replace": "update", "delete": "delete"}
+
+
+def format_sse(event: Optional[Dict]) -> str:
+    """Serialise an event (or a keep-alive when None) as an SSE frame"""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"id: {event['token']}\nevent: {event['op']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+class ChangeFeed:
+    """In-process pub/sub of R&D collection changes with resumable replay"""
+
+    def __init__(self):
+        self.seq = 0
+        self.buffer: deque = deque(maxlen=REPLAY_BUFFER_SIZE)
+        self.subscribers: Set[asyncio.Queue] = set()
+
+    def publish(self, collection: str, op: str, doc_id: str, doc: Optional[Dict] = None) -> Dict:
+        """Record a change and fan it out to live subscribers"""
+        self.seq += 1
+        event = {
+            "token": str(self.seq),
+            "collection": collection,
+            "op": op,
+            "id": doc_id,
+            "doc": doc,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        self.buffer.append(event)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow to keep up: tell it to refetch and stop feeding it
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(self._reset_event())
+        return event
+
+    def _reset_event(self, token: Optional[int] = None) -> Dict:
+        return {"token": str(self.seq if token is None else token), "collection": None, "op": "reset", "id": None, "doc": None,
+                "timestamp": datetime.now(timezone.utc).isoformat()}
+
+    def _replay(self, resume_token: str) -> Optional[List[Dict]]:
+        """Buffered events after a token, or None if the token is too old/invalid"""
+        try:
+            after = int(resume_token)
+        except ValueError:
+            return None
+        if after > self.seq:
+            return None
+        if after == self.seq:
+            return []
+        if not self.buffer or int(self.buffer[0]["token"]) > after + 1:
+            return None
+        return [e for e in self.buffer if int(e["token"]) > after]
+
+    async def subscribe(self, collections: List[str], resume_token: Optional[str] = None,
+                        heartbeat: float = HEARTBEAT_INTERVAL) -> AsyncIterator[Optional[Dict]]:
+        """Yield events for the given collections; yields None as a keep-alive"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        try:
+            if resume_token:
+                missed = self._replay(resume_token)
+                if missed is None:
+                    yield self._reset_event()
+                else:
+                    for event in missed:
+                        if event["collection"] in collections:
+                            yield event
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["op"] == "reset":
+                    yield event
+                    return
+                if event["collection"] in collections:
+                    yield event
+        finally:
+            self.subscribers.discard(queue)
+
+    async def watch_store(self, store, collections: List[str], resume_token: Optional[str] = None,
+                          heartbeat: float = HEARTBEAT_INTERVAL,
+                          interval: float = STORE_POLL_INTERVAL) -> AsyncIterator[Optional[Dict]]:
+        """Yield events from a shared state store's change log (see state_store.py)"""
+        try:
+            after = int(resume_token) if resume_token else None
+        except ValueError:
+            after = None
+        latest = await store.rnd_version()
+        if after is None or after > latest:
+            if resume_token:
+                yield self._reset_event(latest)
+            after = latest
+
+        idle = 0.0
+        while True:
+            events = await store.changes_since(after, collections)
+            if events is None:
+                after = await store.rnd_version()
+                yield self._reset_event(after)
+                continue
+            for event in events:
+                after = int(event["token"])
+                yield event
+            if events:
+                idle = 0.0
+                continue
+            if idle >= heartbeat:
+                idle = 0.0
+                yield None
+            await asyncio.sleep(interval)
+            idle += interval
+
+    async def watch_mongo(self, db, collections: List[str], resume_token: Optional[str] = None,
+                          heartbeat: float = HEARTBEAT_INTERVAL) -> AsyncIterator[Optional[Dict]]:
+        """Yield events from a MongoDB change stream (requires a replica set, e.g. Atlas)"""
+        pipeline = [{"$match": {"ns.coll": {"$in": collections}}}]
+        options = {"full_document": "updateLookup", "max_await_time_ms": int(heartbeat * 1000)}
+        if resume_token:
+            options["resume_after"] = {"_data": resume_token}
+        async with db.watch(pipeline, **options) as stream:
+            while stream.alive:
+                change = await stream.try_next()
+                if change is None:
+                    yield None
+                    continue
+                op = MONGO_OPERATIONS.get(change["operationType"])
+                if op is None:
+                    continue
+                doc = change.get("fullDocument")
+                if doc is not None:
+                    doc = {k: v for k, v in doc.items() if k != "_id"}
+                yield {
+                    "token": change["_id"]["_data"],
+                    "collection": change["ns"]["coll"],
+                    "op": op,
+                    "id": (doc or {}).get("id") or str(change["documentKey"]["_id"]),
+                    "doc": doc,
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                }
+
+
+# Singleton instance
+change_feed = ChangeFeed()
@@ -0,0 +1,152 @@
+"""
+Batch Chat for ChatHDI - evaluation sets of questions via POST /api/chat/batch
+The request body is JSONL, one question per line:
+    {"id": "q1", "question": "Apa itu SOEC?", "model": "hdi-grok"}
+    {"id": "q2", "messages": [{"role": "user", "content": "..."}], "use_rnd_context": true}
+`?models=hdi-grok,hdi-gpt4o` asks every line each of those models (a line's
+own "model" wins when the query has none; the default is hdi-4).
+
+Up to BATCH_CONCURRENCY questions run at once, at batch priority, so the
+per-provider admission limits (admission.py) keep interactive chat ahead of
+the batch. Results stream back as JSONL in completion order:
+    {"id": "q1", "model": "hdi-grok", "status": "ok", "response": "...", "seconds": 1.2}
+
+Every finished answer is appended to <data dir>/batches/<batch_id>.jsonl.
+Posting the same file again with the same `batch_id` (returned in the
+X-Batch-Id header) replays the stored answers and only runs the questions
+that are missing or failed, so an interrupted run resumes where it stopped.
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '32'))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '5000'))
+DEFAULT_MODEL = "hdi-4"
+
+BATCH_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# AIService reports provider failures and admission rejections as text
+ERROR_PREFIXES = ("❌", "⏳", "Maaf, terjadi kesalahan")
+
+
+class BatchItem(NamedTuple):
+    id: str
+    model: str
+    messages: List[Dict]
+    use_rnd_context: bool = False
+
+
+# answer(messages, model, use_rnd_context) -> (response, extra result fields)
+AnswerFn = Callable[[List[Dict], str, bool], Awaitable[Tuple[str, Dict[str, Any]]]]
+
+
+def parse_batch(body: str, models: Optional[List[str]] = None) -> Tuple[List[BatchItem], List[Dict]]:
+    """Questions of a JSONL body, plus an error result for every unusable line"""
+    items, errors, seen = [], [], set()
+    for number, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            item_id = str(entry.get("id") or f"line-{number}")
+            messages = entry.get("messages") or [{"role": "user", "content": entry["question"]}]
+            if not isinstance(messages, list) or not all(isinstance(m, dict) and "content" in m for m in messages):
+                raise ValueError("messages must be a list of {role, content}")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            errors.append({"id": f"line-{number}", "status": "error", "error": f"Invalid line: {e}"})
+            continue
+        for model in models or [entry.get("model") or DEFAULT_MODEL]:
+            if (item_id, model) in seen:
+                errors.append({"id": item_id, "model": model, "status": "error", "error": "Duplicate id"})
+                continue
+            seen.add((item_id, model))
+            items.append(BatchItem(item_id, model, messages, bool(entry.get("use_rnd_context"))))
+    return items, errors
+
+
+class ChatBatches:
+    """Runs batches with bounded concurrency and keeps their answers for resuming"""
+
+    def __init__(self, results_dir: Optional[Path] = None, concurrency: int = BATCH_CONCURRENCY):
+        self.results_dir = results_dir
+        self.concurrency = concurrency
+
+    def _path(self, batch_id: str) -> Path:
+        return self.results_dir / f"{batch_id}.jsonl"
+
+    def stored(self, batch_id: str) -> Dict[Tuple[str, str], Dict]:
+        """Answers already written for a batch, by (id, model)"""
+        path = self._path(batch_id)
+        results = {}
+        if not path.exists():
+            return results
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of an interrupted write
+                results[(result["id"], result["model"])] = result
+        return results
+
+    def _append(self, batch_id: str, result: Dict):
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        with open(self._path(batch_id), "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    async def _answer(self, batch_id: str, item: BatchItem, answer: AnswerFn) -> Dict:
+        start = time.perf_counter()
+        try:
+            response, extra = await answer(item.messages, item.model, item.use_rnd_context)
+            failed = not response or response.startswith(ERROR_PREFIXES)
+            result = {"id": item.id, "model": item.model, "status": "error" if failed else "ok",
+                      "response": response, **extra}
+        except Exception as e:
+            logger.error(f"Batch {batch_id} item {item.id} failed: {e}")
+            result = {"id": item.id, "model": item.model, "status": "error", "error": str(e)}
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        if result["status"] == "ok":
+            await asyncio.to_thread(self._append, batch_id, result)
+        return result
+
+    async def run(self, batch_id: str, items: List[BatchItem], answer: AnswerFn) -> AsyncIterator[Dict]:
+        """Stored answers first, then new ones as they complete"""
+        stored = await asyncio.to_thread(self.stored, batch_id)
+        todo = []
+        for item in items:
+            result = stored.get((item.id, item.model))
+            if result is not None:
+                yield {**result, "resumed": True}
+            else:
+                todo.append(item)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in todo:
+            queue.put_nowait(item)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            while not queue.empty():
+                item = queue.get_nowait()
+                await results.put(await self._answer(batch_id, item, answer))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(todo)))]
+        try:
+            for _ in todo:
+                yield await results.get()
+        finally:
+            # Client went away: stop; the next request with this batch_id resumes
+            for task in workers:
+                task.cancel()
+
+
+# Singleton instance (server.py sets results_dir to <data dir>/batches)
+chat_batches = ChatBatches()
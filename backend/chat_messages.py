@@ -0,0 +1,142 @@
+"""
+Chat Messages for ChatHDI - one normalised conversation per request
+/api/chat, batch chat and PPTX outlines build a ChatHistory once; AIService
+encodes it for the provider on demand and memoises the encoding:
+- openai(system)  system prompt + messages for the OpenAI-compatible clients
+                  (AIML, Groq, Vercel), text or multimodal content parts
+- gemini()        (history, prompt parts) for a Gemini chat session, with
+                  data-URL images as inline blobs
+Both are built in one pass over the messages, by position: the previous
+Gemini conversion compared every message with messages[-1], so an earlier
+message equal to the prompt (e.g. a second "Lanjutkan") vanished from the
+history, and multimodal content was sent to Gemini as raw OpenAI parts.
+"""
+
+import base64
+import binascii
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from single_flight import request_key
+
+
+class Message:
+    """One chat message: role, original content, its text and image URLs"""
+
+    __slots__ = ("role", "content", "text", "images")
+
+    def __init__(self, role: str, content: Any):
+        self.role = role
+        self.content = content  # str, or a list of OpenAI-style content parts
+        if isinstance(content, str):
+            self.text, self.images = content, ()
+            return
+        texts, images = [], []
+        for part in content if isinstance(content, list) else ():
+            if not isinstance(part, dict):
+                continue
+            if part.get("type") == "text":
+                texts.append(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                url = part.get("image_url")
+                images.append(url.get("url", "") if isinstance(url, dict) else url)
+        self.text = " ".join(texts).strip()
+        self.images = tuple(images)
+
+
+def _gemini_parts(message: Message) -> List:
+    """Gemini parts of a message: its text plus inline image blobs"""
+    parts: List = [message.text] if message.text or not message.images else []
+    for url in message.images:
+        if url.startswith("data:") and ";base64," in url:
+            header, data = url.split(",", 1)
+            try:
+                parts.append({"mime_type": header[5:].split(";")[0], "data": base64.b64decode(data)})
+                continue
+            except (binascii.Error, ValueError):
+                pass
+        parts.append(f"[Gambar: {url[:200]}]")
+    return parts
+
+
+class ChatHistory:
+    """The messages of one request with memoised provider encodings"""
+
+    def __init__(self, messages: Iterable[Message]):
+        self.messages = list(messages)
+        self._dicts: Optional[List[Dict]] = None
+        self._openai: Dict[str, List[Dict]] = {}
+        self._gemini: Optional[Tuple[List[Dict], List]] = None
+        self._digest: Optional[str] = None
+
+    @classmethod
+    def of(cls, messages) -> "ChatHistory":
+        """ChatHistory from dicts or ChatMessage models (returned as is if already one)"""
+        if isinstance(messages, ChatHistory):
+            return messages
+        return cls(Message(m["role"], m["content"]) if isinstance(m, dict) else Message(m.role, m.content)
+                   for m in messages)
+
+    def with_images(self, replacements: Dict[str, str]) -> "ChatHistory":
+        """Copy with image URLs replaced (e.g. by downscaled data URLs)"""
+        if not replacements:
+            return self
+
+        def replace(part):
+            if not isinstance(part, dict) or part.get("type") != "image_url":
+                return part
+            url = part.get("image_url")
+            old = url.get("url", "") if isinstance(url, dict) else url
+            if old not in replacements:
+                return part
+            new = {**url, "url": replacements[old]} if isinstance(url, dict) else replacements[old]
+            return {**part, "image_url": new}
+
+        return ChatHistory(
+            Message(m.role, [replace(part) for part in m.content]) if m.images else m for m in self.messages)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    @property
+    def last_text(self) -> str:
+        """Text of the last message (text parts of multimodal content)"""
+        return self.messages[-1].text if self.messages else ""
+
+    @property
+    def last_user(self) -> Optional[Message]:
+        return next((m for m in reversed(self.messages) if m.role == "user"), None)
+
+    @property
+    def digest(self) -> str:
+        """Stable hash of the messages (single-flight key)"""
+        if self._digest is None:
+            self._digest = request_key([(m.role, m.content) for m in self.messages])
+        return self._digest
+
+    def dicts(self) -> List[Dict]:
+        """OpenAI-style {role, content} dicts (content shared, not copied)"""
+        if self._dicts is None:
+            self._dicts = [{"role": m.role, "content": m.content} for m in self.messages]
+        return self._dicts
+
+    def openai(self, system_prompt: str) -> List[Dict]:
+        """Messages for chat.completions.create, behind a system prompt"""
+        encoded = self._openai.get(system_prompt)
+        if encoded is None:
+            encoded = self._openai[system_prompt] = [{"role": "system", "content": system_prompt}, *self.dicts()]
+        return encoded
+
+    def gemini(self) -> Tuple[List[Dict], List]:
+        """(history, prompt parts) for GenerativeModel.start_chat / send_message"""
+        if self._gemini is None:
+            history, prompt = [], [""]
+            last = len(self.messages) - 1
+            for i, message in enumerate(self.messages):
+                if message.role == "system":
+                    continue  # System prompt passed separately
+                if i == last and message.role == "user":
+                    prompt = _gemini_parts(message)
+                else:
+                    role = "model" if message.role == "assistant" else message.role
+                    history.append({"role": role, "parts": _gemini_parts(message)})
+            self._gemini = history, prompt
+        return self._gemini
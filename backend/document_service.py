@@ -1,17 +1,31 @@
 import io
+import asyncio
 import logging
+from typing import Dict
 import PyPDF2
 import docx
 import pandas as pd
 from fastapi import UploadFile
+from metrics import DOCUMENT_PARSE_DURATION
+from tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# File types reported as their own metric label; everything else is "other"
+KNOWN_FILE_TYPES = {'pdf', 'docx', 'xlsx', 'xls', 'csv', 'txt', 'md', 'py', 'js', 'json'}
+
 class DocumentService:
+    @traced("DocumentService.parse_document")
     async def parse_document(self, file: UploadFile) -> str:
         """Parse uploaded file and return extracted text"""
         filename = file.filename.lower()
         content = await file.read()
+        file_type = filename.rsplit('.', 1)[-1] if '.' in filename else ''
+        file_type = file_type if file_type in KNOWN_FILE_TYPES else 'other'
+        with DOCUMENT_PARSE_DURATION.labels(file_type=file_type).time():
+            return self._parse_content(filename, content)
+
+    def _parse_content(self, filename: str, content: bytes) -> str:
         file_obj = io.BytesIO(content)
 
         try:
@@ -59,4 +73,15 @@ class DocumentService:
         df = pd.read_csv(file_obj)
         return df.to_string(index=False)
 
+    async def warm_up(self, timeout: float = 10.0) -> Dict[str, str]:
+        """Run a tiny CSV through pandas and import the Excel engine ahead of the first upload"""
+        def load():
+            self._parse_csv(io.BytesIO(b"a,b\n1,2\n"))
+            import openpyxl  # noqa: F401 - pandas imports it lazily for .xlsx
+        try:
+            await asyncio.wait_for(asyncio.to_thread(load), timeout)
+            return {"parsers": "ok"}
+        except Exception as e:
+            return {"parsers": f"error: {e}"}
+
 document_service = DocumentService()
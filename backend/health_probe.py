@@ -0,0 +1,80 @@
+"""
+Health Prober for ChatHDI - dependency status checked in the background
+/api/health used to ping MongoDB on every call and said nothing about the
+AI providers. The prober checks MongoDB and every configured provider
+(AIML, Groq, Vercel, Gemini, OpenAI, Hugging Face) every
+HEALTH_PROBE_INTERVAL seconds and caches status, latency and timestamp per
+dependency, so /api/health is a constant-time read no matter how often a
+load balancer polls it.
+
+The checks are cheap on purpose (model list, token count, Hugging Face
+whoami) and only cover services that are already loaded (service_loader.py),
+so the prober never imports a heavy SDK by itself.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+from metrics import DEPENDENCY_UP, DEPENDENCY_PROBE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_INTERVAL = float(os.environ.get('HEALTH_PROBE_INTERVAL', '30'))
+HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', '5'))
+
+Checks = Dict[str, Callable[[], Awaitable]]
+
+
+class HealthProber:
+    """Runs dependency checks periodically and keeps the latest result of each"""
+
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL, timeout: float = HEALTH_PROBE_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self.results: Dict[str, Dict] = {}
+        self.probed_at: Optional[str] = None
+
+    async def _check(self, name: str, check: Callable[[], Awaitable]) -> Dict:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+            result = {"status": "up"}
+        except asyncio.TimeoutError:
+            result = {"status": "down", "error": f"timeout after {self.timeout:g}s"}
+        except Exception as e:
+            result = {"status": "down", "error": f"{type(e).__name__}: {e}"}
+        elapsed = time.perf_counter() - start
+        result["latency_ms"] = round(elapsed * 1000, 1)
+        result["checked_at"] = datetime.now(timezone.utc).isoformat()
+        DEPENDENCY_UP.labels(dependency=name).set(1 if result["status"] == "up" else 0)
+        DEPENDENCY_PROBE_SECONDS.labels(dependency=name).set(elapsed)
+        return result
+
+    async def probe(self, checks: Checks):
+        """Run all checks concurrently and replace the cached results"""
+        results = await asyncio.gather(*(self._check(name, check) for name, check in checks.items()))
+        for name, result in zip(checks, results):
+            if result["status"] != "up" and self.results.get(name, {}).get("status") != "down":
+                logger.warning(f"Health probe: {name} is down ({result['error']})")
+        self.results = dict(zip(checks, results))
+        self.probed_at = datetime.now(timezone.utc).isoformat()
+
+    async def run(self, checks: Callable[[], Checks]):
+        """Probe forever; `checks` is called each round so newly loaded services join in"""
+        while True:
+            try:
+                await self.probe(checks())
+            except Exception as e:
+                logger.error(f"Health probe round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def snapshot(self) -> Dict:
+        """Latest results (never triggers a check)"""
+        return {"probed_at": self.probed_at, "dependencies": self.results}
+
+
+# Singleton instance
+health_prober = HealthProber()
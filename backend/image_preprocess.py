@@ -0,0 +1,168 @@
+"""
+Image Preprocessing for ChatHDI - shrink multimodal chat inputs before upload
+Images arrive in ChatMessage.content as base64 data URLs, often multi-megabyte
+phone photos far above what the models look at. Before a chat reaches the
+provider (AIService._chat_admitted) every data-URL image is
+- decoded and EXIF-rotated,
+- downscaled so its long edge fits the provider's effective resolution
+  (IMAGE_MAX_EDGE, larger images are resized by the provider anyway), and
+- re-encoded as JPEG (or WebP with IMAGE_FORMAT=webp; alpha is kept as WebP),
+unless the original is already within the limit and smaller.
+
+The work runs in a thread pool of IMAGE_WORKERS (Pillow releases the GIL
+while decoding, resizing and encoding), off the event loop. Results are
+cached by content hash and target (LRU, IMAGE_CACHE_MB), so the same image
+re-sent with every turn of a conversation is processed once.
+
+Remote image URLs are passed through; without Pillow nothing is changed.
+"""
+
+import io
+import os
+import json
+import base64
+import hashlib
+import asyncio
+import logging
+import binascii
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Tuple
+from metrics import IMAGE_PREPROCESS_BYTES, IMAGE_PREPROCESS_CACHE, IMAGE_PREPROCESS_DURATION
+from chat_messages import ChatHistory
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PREPROCESS = os.environ.get('IMAGE_PREPROCESS', 'true').lower() in ('1', 'true', 'yes')
+IMAGE_FORMAT = os.environ.get('IMAGE_FORMAT', 'jpeg').lower()
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', '85'))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+IMAGE_CACHE_MB = float(os.environ.get('IMAGE_CACHE_MB', '64'))
+
+# Long edge (pixels) each provider actually uses; GPT-4o scales to 768 on the
+# short side / 2048 long, Claude to 1568, Gemini tiles at 768
+DEFAULT_MAX_EDGE = {
+    "aiml": 1568,
+    "vercel": 1568,
+    "vercel-grounding": 1568,
+    "groq": 1120,
+    "web-search": 1120,
+    "gemini": 1536,
+}
+FALLBACK_MAX_EDGE = 1568
+
+
+class Target(NamedTuple):
+    max_edge: int
+    format: str
+    quality: int
+
+
+def _load_max_edges() -> Dict[str, int]:
+    edges = dict(DEFAULT_MAX_EDGE)
+    raw = os.environ.get('IMAGE_MAX_EDGE', '')
+    if raw:
+        try:
+            edges.update({provider: int(edge) for provider, edge in json.loads(raw).items()})
+        except (ValueError, AttributeError, TypeError) as e:
+            logger.error(f"Invalid IMAGE_MAX_EDGE, using defaults: {e}")
+    return edges
+
+
+def shrink(data: bytes, mime_type: str, target: Target) -> Tuple[bytes, str]:
+    """Downscaled, recompressed image bytes (the original when that is already smaller)"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as opened:
+        image = ImageOps.exif_transpose(opened)
+        oversized = max(image.size) > target.max_edge
+        if oversized:
+            image.thumbnail((target.max_edge, target.max_edge), Image.LANCZOS)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        fmt = "webp" if target.format == "webp" or has_alpha else "jpeg"
+        if fmt == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt.upper(), quality=target.quality, optimize=fmt == "jpeg")
+    output = buffer.getvalue()
+    if not oversized and len(output) >= len(data):
+        return data, mime_type
+    return output, f"image/{fmt}"
+
+
+class ImagePreprocessor:
+    """Shrinks data-URL images in a thread pool, with an LRU cache by content hash"""
+
+    def __init__(self, enabled: bool = IMAGE_PREPROCESS, workers: int = IMAGE_WORKERS,
+                 cache_mb: float = IMAGE_CACHE_MB, image_format: str = IMAGE_FORMAT,
+                 quality: int = IMAGE_QUALITY, max_edges: Optional[Dict[str, int]] = None):
+        self.enabled = enabled
+        self.format = image_format
+        self.quality = quality
+        self.max_edges = max_edges or _load_max_edges()
+        self.cache: "OrderedDict[Tuple[str, Target], str]" = OrderedDict()
+        self.cache_bytes = 0
+        self.cache_limit = int(cache_mb * 1024 * 1024)
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def target(self, provider: str) -> Target:
+        return Target(self.max_edges.get(provider, FALLBACK_MAX_EDGE), self.format, self.quality)
+
+    def _cached(self, key) -> Optional[str]:
+        url = self.cache.get(key)
+        if url is not None:
+            self.cache.move_to_end(key)
+        return url
+
+    def _store(self, key, url: str):
+        self.cache[key] = url
+        self.cache_bytes += len(url)
+        while self.cache_bytes > self.cache_limit and self.cache:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= len(evicted)
+
+    async def process(self, url: str, target: Target) -> str:
+        """Data URL of the shrunk image (`url` itself when it cannot or need not change)"""
+        header, _, payload = url.partition(",")
+        if not header.startswith("data:image/") or not header.endswith(";base64"):
+            return url
+        key = (hashlib.sha256(payload.encode("ascii", "ignore")).hexdigest(), target)
+        cached = self._cached(key)
+        if cached is not None:
+            IMAGE_PREPROCESS_CACHE.labels(result="hit").inc()
+            return cached
+        IMAGE_PREPROCESS_CACHE.labels(result="miss").inc()
+        try:
+            data = base64.b64decode(payload, validate=True)
+        except (binascii.Error, ValueError):
+            return url
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-preprocess")
+        try:
+            with IMAGE_PREPROCESS_DURATION.time():
+                output, mime_type = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, shrink, data, header[5:-7], target)
+        except Exception as e:
+            # Not an image Pillow can read (or no Pillow): forward it unchanged
+            logger.warning(f"Image preprocessing skipped: {type(e).__name__}: {e}")
+            output, mime_type = data, header[5:-7]
+        IMAGE_PREPROCESS_BYTES.labels(stage="input").inc(len(data))
+        IMAGE_PREPROCESS_BYTES.labels(stage="output").inc(len(output))
+        result = url if output is data else f"data:{mime_type};base64,{base64.b64encode(output).decode('ascii')}"
+        self._store(key, result)
+        return result
+
+    async def prepare(self, history: ChatHistory, provider: str) -> ChatHistory:
+        """The history with its data-URL images shrunk for `provider`"""
+        urls = {url for message in history.messages for url in message.images if url.startswith("data:")}
+        if not self.enabled or not urls:
+            return history
+        target = self.target(provider)
+        urls = list(urls)
+        processed = await asyncio.gather(*(self.process(url, target) for url in urls))
+        return history.with_images({old: new for old, new in zip(urls, processed) if new != old})
+
+
+# Singleton instance
+image_preprocessor = ImagePreprocessor()
@@ -0,0 +1,13 @@
+"""
+Load-test harness for the ChatHDI backend
+
+Virtual users replay a weighted mix of /api/chat, /api/conversations
+autosaves, /api/upload-document and /api/generate/pptx while a ramp profile
+raises and lowers the number of concurrent users. Scenarios live in
+loadtest/scenarios/*.json.
+
+Run from the backend directory:
+    python -m loadtest.run mixed                         # in-process app + mock provider
+    python -m loadtest.run mixed --url http://127.0.0.1:8000 --mock-url http://127.0.0.1:8090
+    python -m loadtest.run chat --users 50 --duration 60 --output report.json
+"""
@@ -0,0 +1,146 @@
+"""
+Load-test entry point
+
+    python -m loadtest.run [SCENARIO] [--url URL] [--mock-url URL] [--users N --duration S [--ramp-up S]]
+                           [--output report.json] [--max-error-rate 0.01]
+
+Without --url the backend app runs in-process (httpx ASGITransport) and a
+mock provider (mock_provider.py) is started on a free local port, so no
+real AI provider is contacted. The load generator then shares the event
+loop with the app; to measure what one uvicorn worker sustains, run the
+worker separately with MOCK_PROVIDER_URL set and pass --url/--mock-url.
+"""
+
+import os
+import sys
+import json
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from loadtest.runner import LoadRunner
+from loadtest.scenario import Scenario, available_scenarios, load_scenario
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_up(url: str, timeout: float = 15.0):
+    async with httpx.AsyncClient() as client:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                (await client.get(url)).raise_for_status()
+                return
+            except httpx.HTTPError:
+                if asyncio.get_running_loop().time() > deadline:
+                    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+                await asyncio.sleep(0.2)
+
+
+async def configure_mock(mock_url: str, scenario: Scenario):
+    """Push the scenario's latency/error settings to the mock provider"""
+    async with httpx.AsyncClient() as client:
+        response = await client.post(f"{mock_url}/_mock/config", json={"seed": scenario.seed, **scenario.mock})
+        response.raise_for_status()
+
+
+@asynccontextmanager
+async def in_process_target(scenario: Scenario):
+    """Backend app in-process, providers stubbed by a mock provider subprocess"""
+    port = free_port()
+    mock_url = f"http://127.0.0.1:{port}"
+    mock = subprocess.Popen(
+        [sys.executable, str(BACKEND_DIR / "mock_provider.py"), "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        await wait_until_up(f"{mock_url}/_mock/config")
+        await configure_mock(mock_url, scenario)
+
+        # ai_service/media_service read MOCK_PROVIDER_URL at import time
+        if "server" in sys.modules:
+            raise RuntimeError("server was imported before the mock provider was configured")
+        os.environ["MOCK_PROVIDER_URL"] = mock_url
+        import server
+
+        # Keep autosaves out of the real data directory
+        conversations_file = Path(tempfile.mkdtemp(prefix="chathdi-loadtest-")) / "conversations.json"
+        conversations_file.write_text("[]", encoding="utf-8")
+        server.state_store.conversations_file = conversations_file
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            yield client
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+@asynccontextmanager
+async def remote_target(url: str, scenario: Scenario, mock_url: Optional[str]):
+    """A running backend (which should point at a mock provider via MOCK_PROVIDER_URL)"""
+    await wait_until_up(f"{url.rstrip('/')}/api/")
+    if mock_url:
+        await configure_mock(mock_url.rstrip("/"), scenario)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=scenario.timeout) as client:
+        yield client
+
+
+async def run(scenario: Scenario, url: Optional[str], mock_url: Optional[str]):
+    target = remote_target(url, scenario, mock_url) if url else in_process_target(scenario)
+    async with target as client:
+        return await LoadRunner(client, scenario).run()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ChatHDI backend load test")
+    parser.add_argument("scenario", nargs="?", default="mixed",
+                        help=f"scenario name ({', '.join(available_scenarios())}) or path to a JSON file")
+    parser.add_argument("--url", help="run against a live server instead of in-process")
+    parser.add_argument("--mock-url", help="mock provider to configure with the scenario's settings")
+    parser.add_argument("--users", type=int, help="flat profile: concurrent users (replaces the ramp)")
+    parser.add_argument("--duration", type=float, default=60.0, help="flat profile: seconds at --users")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="flat profile: seconds to reach --users")
+    parser.add_argument("--output", type=Path, help="write the full report (incl. timeline) as JSON")
+    parser.add_argument("--max-error-rate", type=float, help="exit 1 when the error rate exceeds this")
+    args = parser.parse_args(argv)
+
+    scenario = load_scenario(args.scenario)
+    if args.users is not None:
+        scenario = scenario.with_profile(args.users, args.duration, args.ramp_up)
+
+    # Keep per-request INFO logging of the in-process app out of the report
+    logging.disable(logging.WARNING)
+    os.environ.setdefault("TRACING_ENABLED", "false")
+    print(f"Running '{scenario.name}' for {scenario.duration:.0f}s, up to {scenario.peak_users} users "
+          f"against {args.url or 'in-process app'}")
+    report = asyncio.run(run(scenario, args.url, args.mock_url))
+
+    print(report.format())
+    if args.output:
+        args.output.write_text(json.dumps(report.to_dict(), indent=2), encoding="utf-8")
+        print(f"Report written to {args.output}")
+    error_rate = report.summary()["total"]["error_rate"]
+    if args.max_error_rate is not None and error_rate > args.max_error_rate:
+        print(f"Error rate {error_rate:.1%} exceeds {args.max_error_rate:.1%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+Load-test runner - virtual users, ramp controller and latency report
+"""
+
+import math
+import time
+import random
+import asyncio
+import functools
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+
+import httpx
+
+from benchmarks import fixtures
+from loadtest.scenario import ActionSpec, Scenario
+
+# Chat failures come back as HTTP 200 with an error message as the reply
+CHAT_ERROR_PREFIXES = ("❌", "⏳", "Maaf, terjadi kesalahan")
+
+TOPICS = [
+    "Produksi hidrogen hijau dengan elektrolisis PEM",
+    "Penyimpanan hidrogen dalam bentuk amonia",
+    "Sel bahan bakar untuk transportasi berat",
+    "Integrasi energi surya dan elektrolisis",
+    "Keselamatan fasilitas pengisian hidrogen",
+]
+
+QUESTIONS = [
+    "Jelaskan efisiensi elektrolisis alkalin dibanding PEM",
+    "Apa tantangan utama penyimpanan hidrogen bertekanan tinggi?",
+    "Bandingkan katalis platina dan nikel untuk produksi hidrogen",
+    "Bagaimana cara menghitung LCOH untuk proyek skala 10 MW?",
+    "Ringkas perkembangan riset sel bahan bakar di Jepang",
+]
+
+MIME_TYPES = {
+    "csv": "text/csv",
+    "txt": "text/plain",
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def build_document(kind: str, size: int) -> bytes:
+    """Synthetic upload of the given type (built once per kind/size)"""
+    if kind == "pdf":
+        return fixtures.make_pdf(size)
+    if kind == "docx":
+        return fixtures.make_docx(size)
+    if kind == "xlsx":
+        return fixtures.make_xlsx(size)
+    if kind == "csv":
+        return fixtures.make_csv(size)
+    rng = random.Random(size)
+    return "\n".join(fixtures.sentence(rng) for _ in range(size)).encode("utf-8")
+
+
+def action_label(spec: ActionSpec) -> str:
+    if spec.action == "chat":
+        return f"chat[{spec.model}]"
+    if spec.action == "upload":
+        return f"upload[{spec.file}]"
+    return spec.action
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class Sample(NamedTuple):
+    label: str
+    start: float      # seconds since the run started
+    latency: float    # seconds
+    status: int       # HTTP status, 0 when no response arrived
+    error: Optional[str]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def summarize(samples: List[Sample], duration: float) -> Dict:
+    latencies = sorted(s.latency for s in samples)
+    errors = sum(1 for s in samples if not s.ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "throughput": len(samples) / duration if duration > 0 else 0.0,
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+    }
+
+
+class LoadReport:
+    """Samples of one run plus the users-over-time timeline"""
+
+    def __init__(self, scenario: Scenario, samples: List[Sample], duration: float, users: Dict[int, int]):
+        self.scenario = scenario
+        self.samples = samples
+        self.duration = duration
+        self.users = users
+
+    def summary(self) -> Dict:
+        by_label: Dict[str, List[Sample]] = {}
+        for sample in self.samples:
+            by_label.setdefault(sample.label, []).append(sample)
+        return {
+            "total": summarize(self.samples, self.duration),
+            "actions": {label: summarize(samples, self.duration) for label, samples in sorted(by_label.items())},
+        }
+
+    def errors(self) -> Dict[str, int]:
+        return dict(Counter(f"{s.label}: {s.error}" for s in self.samples if not s.ok).most_common())
+
+    def timeline(self) -> List[Dict]:
+        """Per-second completions, errors, p95 and active users"""
+        buckets: Dict[int, List[Sample]] = {}
+        for sample in self.samples:
+            buckets.setdefault(int(sample.start + sample.latency), []).append(sample)
+        seconds = range(int(self.duration) + 1)
+        return [
+            {
+                "second": second,
+                "users": self.users.get(second, 0),
+                "requests": len(buckets.get(second, [])),
+                "errors": sum(1 for s in buckets.get(second, []) if not s.ok),
+                "p95": percentile(sorted(s.latency for s in buckets.get(second, [])), 95),
+            }
+            for second in seconds
+        ]
+
+    def to_dict(self) -> Dict:
+        return {
+            "scenario": self.scenario.model_dump(),
+            "duration": self.duration,
+            "peak_users": max(self.users.values(), default=0),
+            **self.summary(),
+            "error_messages": self.errors(),
+            "timeline": self.timeline(),
+        }
+
+    def format(self) -> str:
+        summary = self.summary()
+        lines = [
+            f"Scenario '{self.scenario.name}': {self.duration:.1f}s, peak {max(self.users.values(), default=0)} users",
+            f"{'action':<28} {'reqs':>6} {'err%':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}",
+        ]
+        rows = list(summary["actions"].items()) + [("TOTAL", summary["total"])]
+        for label, stats in rows:
+            lines.append(
+                f"{label:<28} {stats['requests']:>6} {stats['error_rate']:>6.1%} {stats['throughput']:>7.2f} "
+                + " ".join(f"{stats[key] * 1000:>6.0f}ms" for key in ("p50", "p95", "p99", "max"))
+            )
+        errors = self.errors()
+        if errors:
+            lines.append("Errors:")
+            lines.extend(f"  {count:>5} x {message}" for message, count in list(errors.items())[:10])
+        return "\n".join(lines)
+
+
+class VirtualUser:
+    """One simulated browser session looping over the scenario's action mix"""
+
+    def __init__(self, runner: "LoadRunner", index: int):
+        self.runner = runner
+        self.index = index
+        self.rng = random.Random(f"{runner.scenario.seed}-{index}")
+        self.conversation_id = f"loadtest-{runner.run_id}-{index}"
+        self.messages: List[Dict] = []
+        self.saved = False
+        self.stop_event = asyncio.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    @property
+    def stopping(self) -> bool:
+        return self.stop_event.is_set()
+
+    def next_message(self) -> str:
+        return f"{self.rng.choice(QUESTIONS)} (pengguna {self.index}, pesan {len(self.messages) // 2 + 1})"
+
+    def history(self, length: int) -> List[Dict]:
+        """Rolling conversation, as the frontend keeps it"""
+        self.messages.append({"role": "user", "content": self.next_message()})
+        self.messages = self.messages[-max(length, 1):]
+        if self.messages[0]["role"] != "user":
+            self.messages = self.messages[1:]
+        return list(self.messages)
+
+    async def chat(self, client: httpx.AsyncClient, spec: ActionSpec) -> httpx.Response:
+        response = await client.post("/api/chat", json={"messages": self.history(spec.history), "model": spec.model})
+        if response.status_code == 200:
+            self.messages.append({"role": "assistant", "content": response.json().get("response", "")})
+        return response
+
+    async def autosave(self, client: httpx.AsyncClient, spec: ActionSpec) -> httpx.Response:
+        # The frontend autosaves the conversation as it stands after each exchange
+        messages = self.messages[-spec.history:] if self.messages else self.history(spec.history)
+        self.saved = True
+        return await client.post("/api/conversations", json={
+            "id": self.conversation_id,
+            "title": messages[0]["content"][:50],
+            "messages": messages,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+
+    async def upload(self, client: httpx.AsyncClient, spec: ActionSpec) -> httpx.Response:
+        content = build_document(spec.file, spec.size)
+        files = {"file": (f"loadtest-{spec.size}.{spec.file}", content, MIME_TYPES[spec.file])}
+        return await client.post("/api/upload-document", files=files)
+
+    async def pptx(self, client: httpx.AsyncClient, spec: ActionSpec) -> httpx.Response:
+        return await client.post("/api/generate/pptx", json={"topic": spec.topic or self.rng.choice(TOPICS)})
+
+    async def run(self):
+        scenario = self.runner.scenario
+        actions = scenario.actions
+        weights = [spec.weight for spec in actions]
+        low, high = scenario.think_time_ms
+        while not self.stopping:
+            spec = self.rng.choices(actions, weights)[0]
+            await self.runner.execute(self, spec)
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), self.rng.uniform(low, high) / 1000)
+            except asyncio.TimeoutError:
+                pass
+
+
+class LoadRunner:
+    """Spawns and stops virtual users to follow the scenario's ramp profile"""
+
+    def __init__(self, client: httpx.AsyncClient, scenario: Scenario, tick: float = 0.1):
+        self.client = client
+        self.scenario = scenario
+        self.tick = tick
+        self.run_id = f"{int(time.time())}-{random.randrange(16 ** 4):04x}"
+        self.samples: List[Sample] = []
+        self.started = 0.0
+
+    @staticmethod
+    def check(spec: ActionSpec, response: httpx.Response) -> Optional[str]:
+        """Error description, or None when the response is a success"""
+        if response.status_code >= 400:
+            return f"HTTP {response.status_code}"
+        if spec.action == "autosave":
+            return None
+        body = response.json()
+        if spec.action == "chat":
+            reply = body.get("response", "")
+            return reply.splitlines()[0][:80] if reply.startswith(CHAT_ERROR_PREFIXES) else None
+        if not body.get("success"):
+            return str(body.get("error"))[:80]
+        return None
+
+    async def execute(self, user: VirtualUser, spec: ActionSpec):
+        handler = getattr(user, spec.action)
+        start = time.perf_counter()
+        status, error = 0, None
+        try:
+            response = await asyncio.wait_for(handler(self.client, spec), self.scenario.timeout)
+            status = response.status_code
+            error = self.check(spec, response)
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except (httpx.HTTPError, ValueError) as e:
+            error = type(e).__name__
+        self.samples.append(Sample(action_label(spec), start - self.started, time.perf_counter() - start, status, error))
+
+    async def run(self) -> LoadReport:
+        scenario = self.scenario
+        users: List[VirtualUser] = []
+        tasks: List[asyncio.Task] = []
+        timeline: Dict[int, int] = {}
+        self.started = time.perf_counter()
+
+        while True:
+            elapsed = time.perf_counter() - self.started
+            if elapsed >= scenario.duration:
+                break
+            target = scenario.target_users(elapsed)
+            active = [u for u in users if not u.stopping]
+            for index in range(len(users), len(users) + target - len(active)):
+                user = VirtualUser(self, index)
+                users.append(user)
+                tasks.append(asyncio.create_task(user.run()))
+            # Ramp down newest users first; they finish their current request
+            for user in active[target:]:
+                user.stop()
+            timeline[int(elapsed)] = max(timeline.get(int(elapsed), 0), target)
+            await asyncio.sleep(self.tick)
+
+        for user in users:
+            user.stop()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=scenario.timeout)
+            for task in pending:
+                task.cancel()
+        duration = time.perf_counter() - self.started
+        await self.cleanup(users)
+        return LoadReport(scenario, self.samples, duration, timeline)
+
+    async def cleanup(self, users: List[VirtualUser]):
+        """Delete the conversations the autosave action created"""
+        for user in users:
+            if user.saved:
+                try:
+                    await self.client.delete(f"/api/conversations/{user.conversation_id}")
+                except httpx.HTTPError:
+                    pass
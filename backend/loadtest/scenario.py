@@ -0,0 +1,80 @@
+"""
+Load-test scenarios - traffic mix, think time and ramp profile (JSON files)
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+SCENARIO_DIR = Path(__file__).parent / "scenarios"
+
+
+class Stage(BaseModel):
+    """Move linearly to `target` concurrent users over `duration` seconds"""
+    duration: float = Field(gt=0)
+    target: int = Field(ge=0)
+
+
+class ActionSpec(BaseModel):
+    """One entry of the traffic mix"""
+    action: Literal["chat", "autosave", "upload", "pptx"]
+    weight: float = Field(default=1.0, gt=0)
+    model: str = "hdi-gpt4o"        # chat: MODEL_MAPPING id
+    history: int = 6                # chat/autosave: messages sent with each request
+    file: Literal["csv", "docx", "pdf", "xlsx", "txt"] = "csv"
+    size: int = 1000                # upload: rows / paragraphs / pages
+    topic: Optional[str] = None     # pptx: fixed topic (default: rotate through TOPICS)
+
+
+class Scenario(BaseModel):
+    name: str
+    description: str = ""
+    stages: List[Stage]
+    actions: List[ActionSpec]
+    think_time_ms: Tuple[float, float] = (500, 1500)
+    timeout: float = 120.0
+    seed: int = 0
+    mock: Dict = Field(default_factory=dict)  # MockConfig overrides pushed to the mock provider
+
+    @property
+    def duration(self) -> float:
+        return sum(stage.duration for stage in self.stages)
+
+    @property
+    def peak_users(self) -> int:
+        return max(stage.target for stage in self.stages)
+
+    def target_users(self, elapsed: float) -> int:
+        """Concurrent users the ramp profile asks for `elapsed` seconds in"""
+        previous = 0
+        for stage in self.stages:
+            if elapsed < stage.duration:
+                return round(previous + (stage.target - previous) * elapsed / stage.duration)
+            elapsed -= stage.duration
+            previous = stage.target
+        return previous
+
+    def with_profile(self, users: int, duration: float, ramp_up: float = 0.0) -> "Scenario":
+        """Replace the ramp with a flat profile (optionally preceded by a linear ramp-up)"""
+        stages = []
+        if ramp_up > 0:
+            stages.append(Stage(duration=ramp_up, target=users))
+        stages.append(Stage(duration=duration, target=users))
+        return self.model_copy(update={"stages": stages})
+
+
+def available_scenarios() -> List[str]:
+    return sorted(path.stem for path in SCENARIO_DIR.glob("*.json"))
+
+
+def load_scenario(name_or_path: str) -> Scenario:
+    """Load a bundled scenario by name or any scenario JSON file by path"""
+    path = Path(name_or_path)
+    if not path.exists():
+        path = SCENARIO_DIR / f"{name_or_path}.json"
+    if not path.exists():
+        raise FileNotFoundError(
+            f"Scenario '{name_or_path}' not found (available: {', '.join(available_scenarios())})")
+    return Scenario(**json.loads(path.read_text(encoding="utf-8")))
@@ -0,0 +1,145 @@
+"""
+Event-loop Lag Monitor for ChatHDI - detects blocking calls in async handlers
+A heartbeat task sleeps LOOP_MONITOR_INTERVAL_MS at a time and records how
+late it wakes up (chathdi_event_loop_lag_seconds). A watchdog thread
+watches the heartbeat: when the loop has not come back for
+LOOP_LAG_THRESHOLD_MS it captures the loop thread's stack, i.e. whatever
+synchronous call is blocking it (PyPDF2, pandas, python-pptx, the
+Hugging Face client, file I/O ...). Stalls are counted per call site and
+the most recent ones are kept for GET /api/admin/event-loop.
+
+Disable with LOOP_MONITOR_ENABLED=false.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from metrics import EVENT_LOOP_LAG, EVENT_LOOP_BLOCKED
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.environ.get('LOOP_MONITOR_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LOOP_MONITOR_INTERVAL_MS = float(os.environ.get('LOOP_MONITOR_INTERVAL_MS', '50'))
+LOOP_LAG_THRESHOLD_MS = float(os.environ.get('LOOP_LAG_THRESHOLD_MS', '100'))
+RECENT_STALLS = 50
+STACK_DEPTH = 12
+
+BACKEND_DIR = str(Path(__file__).resolve().parent)
+
+
+def _call_site(stack: List[traceback.FrameSummary]) -> str:
+    """Innermost backend frame of a stack (where our code made the blocking call)"""
+    if stack and stack[-1].filename.endswith("selectors.py"):
+        # The loop was idle in select() but could not get back in time: another
+        # thread held the GIL or the machine was out of CPU
+        return "idle (GIL/CPU contention)"
+    own = [frame for frame in stack if frame.filename.startswith(BACKEND_DIR)
+           and not frame.filename.endswith("loop_monitor.py")]
+    frame = (own or stack)[-1]
+    return f"{Path(frame.filename).name}:{frame.lineno} {frame.name}"
+
+
+class LoopMonitor:
+    """Heartbeat task on the event loop plus a watchdog thread that samples its stack"""
+
+    def __init__(self, interval_ms: float = LOOP_MONITOR_INTERVAL_MS,
+                 threshold_ms: float = LOOP_LAG_THRESHOLD_MS):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.recent: deque = deque(maxlen=RECENT_STALLS)
+        self.sites: Dict[str, Dict] = {}
+        self.max_lag = 0.0
+        self._beat = 0.0
+        # (heartbeat the stall started after, captured stall) - set by the watchdog
+        self._pending: Optional[Tuple[float, Dict]] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start monitoring the running event loop"""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-monitor", daemon=True).start()
+        logger.info(f"Event-loop monitor started (threshold {self.threshold * 1000:.0f}ms)")
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            previous, self._beat = self._beat, now
+            lag = max(0.0, now - previous - self.interval)
+            EVENT_LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self._finish_stall(lag, previous)
+
+    def _watchdog(self):
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._beat
+            stalled = time.perf_counter() - beat - self.interval
+            if stalled >= self.threshold and (self._pending is None or self._pending[0] != beat):
+                self._capture(beat, stalled)
+
+    def _capture(self, beat: float, stalled: float):
+        """Runs in the watchdog thread while the loop is still blocked"""
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        self._pending = beat, {
+            "site": _call_site(stack),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "stack": [f"{f.filename}:{f.lineno} {f.name}" + (f" | {f.line}" if f.line else "")
+                      for f in stack[-STACK_DEPTH:]],
+            "detected_after_ms": round(stalled * 1000, 1),
+        }
+
+    def _finish_stall(self, lag: float, beat: float):
+        """Back on the loop: record how long the captured stall really took"""
+        pending, self._pending = self._pending, None
+        stall = pending[1] if pending and pending[0] == beat else None
+        if stall is None:
+            # Shorter than the watchdog's sampling period - only the lag is known
+            stall = {"site": "unknown", "started_at": None, "stack": [], "detected_after_ms": None}
+        stall["blocked_ms"] = round(lag * 1000, 1)
+        EVENT_LOOP_BLOCKED.labels(site=stall["site"]).inc()
+        with self._lock:
+            self.recent.append(stall)
+            site = self.sites.setdefault(stall["site"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            site["count"] += 1
+            site["total_ms"] = round(site["total_ms"] + stall["blocked_ms"], 1)
+            site["max_ms"] = max(site["max_ms"], stall["blocked_ms"])
+        logger.warning(f"Event loop blocked for {stall['blocked_ms']:.0f}ms at {stall['site']}")
+
+    def report(self, recent: int = 20) -> Dict:
+        with self._lock:
+            sites = sorted(self.sites.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            return {
+                "enabled": self._task is not None and not self._task.done(),
+                "threshold_ms": self.threshold * 1000,
+                "max_lag_ms": round(self.max_lag * 1000, 1),
+                "stalls": sum(site["count"] for _, site in sites),
+                "sites": [{"site": name, **site} for name, site in sites],
+                "recent": list(self.recent)[-recent:][::-1],
+            }
+
+
+# Singleton instance
+loop_monitor = LoopMonitor()
@@ -5,13 +5,22 @@ Includes: Master Prompt Engineering for technical/CAD visualizations
 """
 
 import os
+import copy
 import base64
 import re
 import io
+import time
+import asyncio
 import logging
 from pathlib import Path
-from typing import Optional, Tuple, Dict
+from typing import Awaitable, Callable, Optional, Tuple, Dict
 import httpx
+from metrics import MEDIA_GENERATION_DURATION, PROVIDER_ERRORS, PROVIDER_IN_FLIGHT, error_status
+from tracing import traced
+from admission import admission, AdmissionRejected, Priority, busy_message
+from single_flight import SingleFlight, request_key
+from retry_policy import retry_policy
+from media_store import media_store, media_url, request_key as media_request_key
 
 # Load environment variables first
 from dotenv import load_dotenv
@@ -43,6 +52,17 @@ HUGGINGFACE_API_KEY = os.environ.get('HUGGINGFACE_API_KEY', '')
 if not OPENAI_API_KEY and EMERGENT_KEY:
     OPENAI_API_KEY = EMERGENT_KEY
 
+# Provider base URLs - override to use a proxy or the local mock provider (mock_provider.py)
+MOCK_PROVIDER_URL = os.environ.get('MOCK_PROVIDER_URL', '').rstrip('/')
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or (f"{MOCK_PROVIDER_URL}/v1" if MOCK_PROVIDER_URL else None)
+HF_BASE_URL = (os.environ.get('HF_BASE_URL') or MOCK_PROVIDER_URL).rstrip('/')
+# Token check used by the health prober (cheap, no inference)
+HF_STATUS_URL = f"{HF_BASE_URL}/api/whoami-v2" if HF_BASE_URL else "https://huggingface.co/api/whoami-v2"
+
+if MOCK_PROVIDER_URL:
+    OPENAI_API_KEY = OPENAI_API_KEY or 'mock-provider-key'
+    HUGGINGFACE_API_KEY = HUGGINGFACE_API_KEY or 'mock-provider-key'
+
 # Log API key status
 if HUGGINGFACE_API_KEY:
     logger.info(f"HUGGINGFACE_API_KEY loaded: {HUGGINGFACE_API_KEY[:10]}...")
@@ -175,7 +195,8 @@ class MediaService:
         
         # Initialize OpenAI client
         if OPENAI_AVAILABLE and OPENAI_API_KEY:
-            self.openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+            # Retries are done by retry_policy (budgeted across calls)
+            self.openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
         
         # Initialize Hugging Face client
         if HUGGINGFACE_AVAILABLE and HUGGINGFACE_API_KEY:
@@ -185,6 +206,7 @@ class MediaService:
             logger.warning("HUGGINGFACE_API_KEY not set - Hugging Face features will not work")
         
         self.master_prompts = MASTER_PROMPTS
+        self._flight = SingleFlight("image")
     
     def detect_engineering_context(self, message: str) -> Tuple[Optional[str], Dict]:
         """
@@ -336,7 +358,9 @@ class MediaService:
         
         return (None, None)
     
-    async def generate_image(self, prompt: str, model: str = 'huggingface') -> dict:
+    @traced("MediaService.generate_image")
+    async def generate_image(self, prompt: str, model: str = 'huggingface',
+                             priority: Priority = Priority.BACKGROUND) -> dict:
         """
         Generate image using Hugging Face (primary) or OpenAI DALL-E (fallback)
         
@@ -347,19 +371,69 @@ class MediaService:
                    - 'dall-e-3', 'dall-e-2' -> OpenAI DALL-E (paid)
             
         Returns:
-            dict with 'success', 'images' (list of base64 strings), 'error'
+            dict with 'success', 'images' (list of /api/media URLs), 'media' (content hashes), 'error'
         """
-        # Use Hugging Face for free models
-        if model in ['huggingface', 'sdxl', 'sd-2.1', 'flux', 'default', 'hdi-image', 'hdi-image-flux']:
-            return await self.generate_image_huggingface(prompt, model)
-        
-        # Use OpenAI DALL-E for paid models
-        if model in ['dall-e-3', 'dall-e-2']:
-            return await self.generate_image_openai(prompt, model)
+        provider = 'openai' if model in ['dall-e-3', 'dall-e-2'] else 'huggingface'
+        # Identical prompts in flight at the same priority share one generation; each caller gets its own copy
+        result = await self._flight.do(request_key(model, prompt, int(priority)),
+                                       lambda: self._generate_image_cached(provider, prompt, model, priority))
+        return copy.deepcopy(result)
+    
+    async def _generate_image_cached(self, provider: str, prompt: str, model: str, priority: Priority) -> dict:
+        """Serve a repeated prompt from the media store; store new images by content hash.
+        Images are returned as /api/media URLs (base64 only if they could not be stored)"""
+        if provider == 'openai':
+            key = media_request_key(prompt, model, size="1024x1024")
+        else:
+            key = media_request_key(prompt, HF_IMAGE_MODELS.get(model, HF_IMAGE_MODELS['default']))
+        cached = await media_store.get(key)
+        if cached:
+            logger.info(f"Image served from media cache: {prompt[:60]}...")
+            return {
+                'success': True,
+                'images': [media_url(media_hash) for media_hash in cached['media']],
+                'media': cached['media'],
+                'model': cached['model'],
+                'cached': True,
+                'error': None
+            }
         
-        # Default to Hugging Face (free)
-        return await self.generate_image_huggingface(prompt, model)
+        result = await self._generate_image_admitted(provider, prompt, model, priority)
+        if result.get('success') and result.get('images'):
+            try:
+                images = [base64.b64decode(image) for image in result['images']]
+                hashes = await media_store.put(key, result['model'], images)
+                if hashes:
+                    result['media'] = hashes
+                    result['images'] = [media_url(media_hash) for media_hash in hashes]
+            except Exception as e:
+                # The generation itself succeeded; only storing failed
+                logger.warning(f"Could not store generated image: {e}")
+        return result
     
+    async def _generate_image_admitted(self, provider: str, prompt: str, model: str, priority: Priority) -> dict:
+        try:
+            async with admission.slot(provider, model, priority):
+                return await self._generate_image(provider, prompt, model)
+        except AdmissionRejected as e:
+            logger.warning(f"Image generation rejected by admission control: {e}")
+            return {'success': False, 'images': [], 'model': model, 'error': busy_message(e)}
+    
+    async def _generate_image(self, provider: str, prompt: str, model: str) -> dict:
+        PROVIDER_IN_FLIGHT.labels(provider=provider).inc()
+        start = time.perf_counter()
+        try:
+            # Use OpenAI DALL-E for paid models
+            if provider == 'openai':
+                return await self.generate_image_openai(prompt, model)
+            
+            # Use Hugging Face for free models (and as the default)
+            return await self.generate_image_huggingface(prompt, model)
+        finally:
+            PROVIDER_IN_FLIGHT.labels(provider=provider).dec()
+            MEDIA_GENERATION_DURATION.labels(kind="image", model=model).observe(time.perf_counter() - start)
+    
+    @traced("MediaService.generate_image_huggingface")
     async def generate_image_huggingface(self, prompt: str, model: str = 'sdxl') -> dict:
         """
         Generate image using Hugging Face Inference API (FREE)
@@ -386,11 +460,13 @@ class MediaService:
             logger.info(f"Generating image with Hugging Face model: {model_name}")
             logger.info(f"Prompt: {prompt[:100]}...")
             
-            # Generate image using Hugging Face
-            image = self.hf_client.text_to_image(
+            # Generate image using Hugging Face (a full URL targets a custom endpoint).
+            # The client is synchronous: run it in a thread so retries can back off without blocking the loop
+            image = await retry_policy.call("huggingface", lambda: asyncio.to_thread(
+                self.hf_client.text_to_image,
                 prompt=prompt,
-                model=model_name
-            )
+                model=f"{HF_BASE_URL}/models/{model_name}" if HF_BASE_URL else model_name
+            ))
             
             # Convert PIL Image to base64
             buffered = io.BytesIO()
@@ -408,6 +484,7 @@ class MediaService:
             
         except Exception as e:
             logger.error(f"Hugging Face image generation error: {e}")
+            PROVIDER_ERRORS.labels(provider="huggingface", status=error_status(e)).inc()
             return {
                 'success': False,
                 'images': [],
@@ -415,6 +492,7 @@ class MediaService:
                 'error': str(e)
             }
     
+    @traced("MediaService.generate_image_openai")
     async def generate_image_openai(self, prompt: str, model: str = 'dall-e-3') -> dict:
         """
         Generate image using OpenAI DALL-E (paid)
@@ -435,13 +513,13 @@ class MediaService:
             }
             
         try:
-            response = await self.openai_client.images.generate(
+            response = await retry_policy.call("openai", lambda: self.openai_client.images.generate(
                 model=model,
                 prompt=prompt,
                 n=1,
                 size="1024x1024",
                 response_format="b64_json"
-            )
+            ))
             
             images_base64 = [img.b64_json for img in response.data]
             
@@ -454,6 +532,7 @@ class MediaService:
             
         except Exception as e:
             logger.error(f"OpenAI image generation error: {e}")
+            PROVIDER_ERRORS.labels(provider="openai", status=error_status(e)).inc()
             return {
                 'success': False,
                 'images': [],
@@ -461,6 +540,7 @@ class MediaService:
                 'error': str(e)
             }
     
+    @traced("MediaService.generate_video")
     async def generate_video(self, prompt: str, model: str = 'hdi-video') -> dict:
         """
         Generate video using HuggingFace Inference API
@@ -493,6 +573,42 @@ Hugging Face **tidak lagi menyediakan** layanan Text-to-Video gratis secara serv
 *Untuk saat ini, silakan gunakan fitur **HDI Image** untuk visualisasi.*"""
         }
     
+    def provider_checks(self) -> Dict[str, Callable[[], Awaitable]]:
+        """Cheap reachability call per configured image provider"""
+        checks = {}
+        if self.openai_client:
+            checks["openai"] = lambda: self.openai_client.models.list()
+        if self.hf_client:
+            async def whoami():
+                async with httpx.AsyncClient(timeout=None) as client:
+                    response = await client.get(HF_STATUS_URL,
+                                                headers={"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"})
+                    response.raise_for_status()
+            checks["huggingface"] = whoami
+        return checks
+    
+    async def warm_up(self, timeout: float = 10.0) -> Dict[str, str]:
+        """Load the PNG encoder and open the OpenAI connection before the first image
+
+        Hugging Face is not pre-connected: huggingface_hub keeps one session per
+        thread, so the connection would not be the one text_to_image reuses.
+        """
+        results = {}
+        try:
+            from PIL import Image
+            await asyncio.to_thread(Image.init)
+            results["pillow"] = "ok"
+        except Exception as e:
+            results["pillow"] = f"error: {e}"
+        check = self.provider_checks().get("openai")
+        if check:
+            try:
+                await asyncio.wait_for(check(), timeout)
+                results["openai"] = "ok"
+            except Exception as e:
+                results["openai"] = f"error: {type(e).__name__}: {e}"
+        return results
+    
     def get_master_prompts(self) -> Dict:
         """Return all master prompt templates"""
         return self.master_prompts
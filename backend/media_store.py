@@ -0,0 +1,356 @@
+"""
+Media Store for ChatHDI - content-addressed on-disk store of generated media
+Generated images are stored once under the SHA-256 of their bytes
+(<data dir>/media/blobs/<hash>) and served by GET /api/media/{hash} with
+immutable cache headers. A request index maps the normalised
+(prompt, model, parameters) of a generation to the hashes it produced
+(<data dir>/media/requests/<key>.json), so a repeated prompt is a file read
+instead of a 20-second generation.
+
+The blobs form an LRU bounded by MEDIA_CACHE_MB: reads refresh a blob's
+mtime and the least recently used blobs are deleted when a write goes over
+the limit. Request entries are deleted with the blobs they point to (and
+entries whose blobs are gone are swept at startup), so the index never
+outgrows the blobs.
+Disable the request cache with IMAGE_CACHE=false.
+
+Media that a conversation refers to lives in a second, durable area
+(<media dir>/pinned/<hash>) that is never evicted: images and videos
+returned by /api/chat (pinned from the cache), files uploaded with
+POST /api/media (the PPTX files built by the frontend) and inline base64
+moved out of saved conversations. Put MEDIA_DIR on persistent storage
+(e.g. /data/media on a Hugging Face Space), otherwise a restart loses it.
+
+Media leaves the backend as references ("/api/media/<hash>"), not base64.
+"""
+
+import io
+import os
+import re
+import json
+import time
+import hashlib
+import base64
+import asyncio
+import logging
+import shutil
+import zipfile
+import binascii
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from metrics import MEDIA_CACHE_LOOKUPS, MEDIA_STORE_BYTES
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE = os.environ.get('IMAGE_CACHE', 'true').lower() in ('1', 'true', 'yes')
+MEDIA_CACHE_MB = float(os.environ.get('MEDIA_CACHE_MB', '512'))
+MEDIA_DIR = os.environ.get('MEDIA_DIR', '')
+MEDIA_UPLOAD_MB = float(os.environ.get('MEDIA_UPLOAD_MB', '50'))
+MEDIA_PINNED_MB = float(os.environ.get('MEDIA_PINNED_MB', '2048'))
+
+MEDIA_URL_PREFIX = "/api/media/"
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+MAGIC = [(b"\x89PNG", "image/png"), (b"\xff\xd8\xff", "image/jpeg"), (b"GIF8", "image/gif"),
+         # The only zip archives stored are presentations from the frontend
+         (b"PK\x03\x04", "application/vnd.openxmlformats-officedocument.presentationml.presentation")]
+
+
+def media_url(media_hash: str) -> str:
+    return MEDIA_URL_PREFIX + media_hash
+
+
+def sniff_media_type(head: bytes) -> str:
+    for magic, media_type in MAGIC:
+        if head.startswith(magic):
+            return media_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return "video/mp4"
+    return "application/octet-stream"
+
+
+def upload_media_type(data: bytes) -> Optional[str]:
+    """Media type of an acceptable upload (an image or a real PPTX), None otherwise"""
+    media_type = sniff_media_type(data[:12])
+    if media_type.startswith("image/"):
+        return media_type
+    if media_type == MAGIC[-1][1]:
+        # Any zip starts like a PPTX (docx, xlsx, jar, ...): look for the presentation part
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                archive.getinfo("ppt/presentation.xml")
+            return media_type
+        except (zipfile.BadZipFile, KeyError):
+            return None
+    return None
+
+
+class PinnedStoreFull(Exception):
+    """Pinning more media would go over MEDIA_PINNED_MB"""
+
+
+def request_key(prompt: str, model: str, **params) -> str:
+    """Cache key of a generation: case- and whitespace-normalised prompt, model and parameters"""
+    normalised = " ".join(prompt.split()).casefold()
+    payload = json.dumps([normalised, model, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MediaStore:
+    """Blobs by content hash with an LRU size bound, a generation request index and pinned media"""
+
+    def __init__(self, directory: Optional[Path] = None, max_mb: float = MEDIA_CACHE_MB,
+                 cache_requests: bool = IMAGE_CACHE, pinned_mb: float = MEDIA_PINNED_MB):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_pinned_bytes = int(pinned_mb * 1024 * 1024)
+        self.cache_requests = cache_requests
+        self.blobs: "OrderedDict[str, int]" = OrderedDict()  # hash -> size, least recently used first
+        self.total_bytes = 0
+        self.requests: Dict[str, Set[str]] = {}  # hash -> request keys that produced it
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    # ---------- paths ----------
+
+    def blob_path(self, media_hash: str) -> Path:
+        return self.directory / "blobs" / media_hash
+
+    def pinned_path(self, media_hash: str) -> Path:
+        return self.directory / "pinned" / media_hash
+
+    def _request_path(self, key: str) -> Path:
+        return self.directory / "requests" / f"{key}.json"
+
+    def _load(self):
+        """Index the blobs already on disk, oldest access first (once per process)"""
+        if self._loaded:
+            return
+        blobs = self.directory / "blobs"
+        blobs.mkdir(parents=True, exist_ok=True)
+        (self.directory / "requests").mkdir(parents=True, exist_ok=True)
+        (self.directory / "pinned").mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in blobs.iterdir():
+            if HASH_PATTERN.match(path.name):
+                stat = path.stat()
+                entries.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self.blobs[name] = size
+        self.total_bytes = sum(self.blobs.values())
+        MEDIA_STORE_BYTES.set(self.total_bytes)
+        for path in (self.directory / "requests").glob("*.json"):
+            try:
+                hashes = json.loads(path.read_text(encoding="utf-8"))["media"]
+            except (OSError, ValueError, KeyError, TypeError):
+                hashes = None
+            if not hashes or not all(media_hash in self.blobs for media_hash in hashes):
+                path.unlink(missing_ok=True)
+                continue
+            self._index_request(path.stem, hashes)
+        self._loaded = True
+
+    def _index_request(self, key: str, hashes: List[str]):
+        for media_hash in hashes:
+            self.requests.setdefault(media_hash, set()).add(key)
+
+    def _drop_request(self, key: str, media_hash: str):
+        """Delete a request entry if it (still) points to media_hash"""
+        path = self._request_path(key)
+        try:
+            if media_hash not in json.loads(path.read_text(encoding="utf-8"))["media"]:
+                return  # the key was generated again since
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        path.unlink(missing_ok=True)
+
+    # ---------- blobs ----------
+
+    def _touch(self, media_hash: str) -> bool:
+        """Mark a blob as recently used; False if it is gone"""
+        path = self.blob_path(media_hash)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            if self.blobs.pop(media_hash, None) is not None:
+                self.total_bytes = sum(self.blobs.values())
+            return False
+        if media_hash in self.blobs:
+            self.blobs.move_to_end(media_hash)
+        else:
+            # Written by another worker
+            self.blobs[media_hash] = path.stat().st_size
+            self.total_bytes += self.blobs[media_hash]
+        return True
+
+    def _put_blob(self, data: bytes) -> str:
+        media_hash = hashlib.sha256(data).hexdigest()
+        if self._touch(media_hash):
+            return media_hash
+        path = self.blob_path(media_hash)
+        tmp = path.with_name(f".{media_hash}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.blobs[media_hash] = len(data)
+        self.total_bytes += len(data)
+        self._evict(keep=media_hash)
+        return media_hash
+
+    def _evict(self, keep: str):
+        while self.total_bytes > self.max_bytes and len(self.blobs) > 1:
+            media_hash, size = next(iter(self.blobs.items()))
+            if media_hash == keep:
+                break
+            del self.blobs[media_hash]
+            self.total_bytes -= size
+            try:
+                self.blob_path(media_hash).unlink()
+            except FileNotFoundError:
+                pass
+            # A request entry is useless once one of its images is gone
+            for key in self.requests.pop(media_hash, ()):
+                self._drop_request(key, media_hash)
+            logger.info(f"Evicted media {media_hash[:12]} ({size} bytes)")
+        MEDIA_STORE_BYTES.set(self.total_bytes)
+
+    def _open(self, media_hash: str) -> Optional[Path]:
+        self._load()
+        pinned = self.pinned_path(media_hash)
+        if pinned.exists():
+            return pinned
+        return self.blob_path(media_hash) if self._touch(media_hash) else None
+
+    async def open_blob(self, media_hash: str) -> Optional[Path]:
+        """Path of a pinned or cached blob (refreshing its LRU position), None if unknown"""
+        if self.directory is None or not HASH_PATTERN.match(media_hash):
+            return None
+        async with self._lock:
+            return await asyncio.to_thread(self._open, media_hash)
+
+    async def media_type(self, path: Path) -> str:
+        def head():
+            with open(path, "rb") as f:
+                return f.read(12)
+        return sniff_media_type(await asyncio.to_thread(head))
+
+    # ---------- generation requests ----------
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Stored result of a generation request: {"model", "media": [hash]}"""
+        if self.directory is None or not self.cache_requests:
+            return None
+
+        def read():
+            self._load()
+            try:
+                entry = json.loads(self._request_path(key).read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                return None
+            if not all(self._touch(media_hash) for media_hash in entry["media"]):
+                self._request_path(key).unlink(missing_ok=True)
+                return None
+            return entry
+
+        async with self._lock:
+            entry = await asyncio.to_thread(read)
+        MEDIA_CACHE_LOOKUPS.labels(result="hit" if entry else "miss").inc()
+        return entry
+
+    async def put(self, key: Optional[str], model: str, images: List[bytes]) -> List[str]:
+        """Store generated images (and the request that produced them); returns their hashes"""
+        if self.directory is None:
+            return []
+
+        def write():
+            self._load()
+            hashes = [self._put_blob(data) for data in images]
+            if key and self.cache_requests:
+                entry = {"model": model, "media": hashes, "created": time.time()}
+                self._request_path(key).write_text(json.dumps(entry), encoding="utf-8")
+                self._index_request(key, hashes)
+            return hashes
+
+        async with self._lock:
+            return await asyncio.to_thread(write)
+
+    # ---------- pinned media ----------
+
+    def _pinned_bytes(self) -> int:
+        """Size of the pinned area, shared by every worker (so scanned, not counted)"""
+        with os.scandir(self.directory / "pinned") as entries:
+            return sum(entry.stat().st_size for entry in entries if HASH_PATTERN.match(entry.name))
+
+    def _pin_blob(self, data: bytes) -> str:
+        media_hash = hashlib.sha256(data).hexdigest()
+        path = self.pinned_path(media_hash)
+        if not path.exists():
+            if self._pinned_bytes() + len(data) > self.max_pinned_bytes:
+                raise PinnedStoreFull(f"pinned media would exceed {self.max_pinned_bytes} bytes")
+            tmp = path.with_name(f".{media_hash}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        return media_hash
+
+    async def store(self, items: List[bytes]) -> List[str]:
+        """Store media permanently (never evicted); returns their hashes (PinnedStoreFull over the quota)"""
+        if self.directory is None:
+            return []
+
+        def write():
+            self._load()
+            return [self._pin_blob(data) for data in items]
+
+        async with self._lock:
+            return await asyncio.to_thread(write)
+
+    async def pin(self, hashes: List[str]):
+        """Keep cached blobs permanently, e.g. once they are in a conversation (PinnedStoreFull over the quota)"""
+        if self.directory is None:
+            return
+
+        def link():
+            self._load()
+            for media_hash in hashes:
+                path = self.pinned_path(media_hash)
+                if path.exists() or not self._touch(media_hash):
+                    continue
+                if self._pinned_bytes() + self.blobs[media_hash] > self.max_pinned_bytes:
+                    raise PinnedStoreFull(f"pinned media would exceed {self.max_pinned_bytes} bytes")
+                tmp = path.with_name(f".{media_hash}.{os.getpid()}.tmp")
+                try:
+                    os.link(self.blob_path(media_hash), tmp)
+                except OSError:
+                    shutil.copyfile(self.blob_path(media_hash), tmp)
+                os.replace(tmp, path)
+
+        async with self._lock:
+            await asyncio.to_thread(link)
+
+    async def references(self, media_data: List[str]) -> List[str]:
+        """Media strings with inline base64 (or data URLs) pinned and replaced by /api/media URLs"""
+        if self.directory is None:
+            return media_data
+        inline = {}
+        for item in media_data:
+            # Not "/" alone: JPEG base64 starts with "/9j/"
+            if not isinstance(item, str) or item.startswith((MEDIA_URL_PREFIX, "http://", "https://")):
+                continue
+            try:
+                inline[item] = base64.b64decode(item.split(",", 1)[1] if item.startswith("data:") else item,
+                                                validate=True)
+            except (binascii.Error, ValueError, IndexError):
+                continue
+        if not inline:
+            return media_data
+        try:
+            urls = dict(zip(inline, map(media_url, await self.store(list(inline.values())))))
+        except PinnedStoreFull as e:
+            logger.warning(f"Keeping media inline: {e}")
+            return media_data
+        return [urls.get(item, item) if isinstance(item, str) else item for item in media_data]
+
+
+# Singleton instance (server.py sets directory to <data dir>/media)
+media_store = MediaStore()
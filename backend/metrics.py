@@ -0,0 +1,313 @@
+"""
+Metrics for ChatHDI - Prometheus text-format instrumentation
+Dependency-free counters, gauges and histograms with labels, rendered at
+/metrics in the Prometheus exposition format (version 0.0.4).
+"""
+
+import abc
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds) covering fast endpoints up to slow image generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """A new child (value holder) for one label combination"""
+
+    @abc.abstractmethod
+    def _render_child(self, values, child) -> List[str]:
+        """Sample lines of one child"""
+
+    def _default(self):
+        return self.labels()
+
+    @property
+    def family(self) -> str:
+        """Name on the HELP/TYPE lines (must match the samples)"""
+        return self.name
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.family} {self.documentation}", f"# TYPE {self.family} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = float(value)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    @property
+    def family(self) -> str:
+        # Samples carry the _total suffix; the family is named the same (as prometheus_client does)
+        return self.name if self.name.endswith("_total") else f"{self.name}_total"
+
+    def _render_child(self, values, child):
+        return [f"{self.family}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (e.g. requests in flight)"""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders the /metrics payload"""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def error_status(exc: Exception) -> str:
+    """Best-effort HTTP status of a provider exception (openai/httpx/HF errors)"""
+    status: Optional[int] = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    if status is None and "429" in str(exc):
+        status = 429
+    return str(status) if status is not None else type(exc).__name__
+
+
+# Singleton registry
+metrics = MetricsRegistry()
+
+# ============ METRIC DEFINITIONS ============
+
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "chathdi_http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"])
+HTTP_REQUESTS_IN_FLIGHT = metrics.gauge(
+    "chathdi_http_requests_in_flight", "HTTP requests currently being served")
+
+PROVIDER_REQUEST_DURATION = metrics.histogram(
+    "chathdi_provider_request_duration_seconds", "Provider call latency per MODEL_MAPPING entry",
+    ["model_id", "provider", "model"])
+PROVIDER_TIME_TO_FIRST_TOKEN = metrics.histogram(
+    "chathdi_provider_time_to_first_token_seconds",
+    "Time until the first token arrives (equals full latency for non-streaming calls)",
+    ["model_id", "provider", "model"])
+PROVIDER_ERRORS = metrics.counter(
+    "chathdi_provider_errors", "Provider call errors by provider and status", ["provider", "status"])
+PROVIDER_IN_FLIGHT = metrics.gauge(
+    "chathdi_provider_requests_in_flight", "Provider calls currently in flight", ["provider"])
+
+MEDIA_GENERATION_DURATION = metrics.histogram(
+    "chathdi_media_generation_duration_seconds", "Image/video generation latency", ["kind", "model"])
+DOCUMENT_PARSE_DURATION = metrics.histogram(
+    "chathdi_document_parse_duration_seconds", "Uploaded document parse time by file type", ["file_type"])
+PPTX_RENDER_DURATION = metrics.histogram(
+    "chathdi_pptx_render_duration_seconds", "python-pptx presentation render time")
+
+DEPENDENCY_UP = metrics.gauge(
+    "chathdi_dependency_up", "1 when the last background health probe of a dependency succeeded", ["dependency"])
+DEPENDENCY_PROBE_SECONDS = metrics.gauge(
+    "chathdi_dependency_probe_seconds", "Duration of the last health probe per dependency", ["dependency"])
+
+EVENT_LOOP_LAG = metrics.histogram(
+    "chathdi_event_loop_lag_seconds", "How late the event-loop heartbeat woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+EVENT_LOOP_BLOCKED = metrics.counter(
+    "chathdi_event_loop_blocked", "Event-loop stalls over LOOP_LAG_THRESHOLD_MS by blocking call site", ["site"])
+
+ADMISSION_QUEUE_SECONDS = metrics.histogram(
+    "chathdi_admission_queue_seconds", "Time a provider call waited for an admission slot",
+    ["provider", "priority"])
+ADMISSION_QUEUE_DEPTH = metrics.gauge(
+    "chathdi_admission_queue_depth", "Provider calls waiting for an admission slot", ["provider"])
+ADMISSION_REJECTED = metrics.counter(
+    "chathdi_admission_rejected", "Provider calls rejected because the queue exceeded the deadline",
+    ["provider", "priority", "reason"])
+
+SINGLE_FLIGHT_SHARED = metrics.counter(
+    "chathdi_single_flight_shared", "Requests served by joining an identical in-flight call", ["kind"])
+
+PROVIDER_RETRIES = metrics.counter(
+    "chathdi_provider_retries", "Transient provider errors: retried, or given up (budget exhausted / deadline)",
+    ["provider", "status", "outcome"])
+
+AUTO_ROUTE_DECISIONS = metrics.counter(
+    "chathdi_auto_route_decisions", "Models picked for hdi-auto requests by request tier", ["tier", "model_id"])
+
+PROVIDER_TOKENS = metrics.counter(
+    "chathdi_provider_tokens", "Tokens reported by providers (prompt / completion)", ["provider", "model", "kind"])
+PROVIDER_COST = metrics.counter(
+    "chathdi_provider_cost_usd", "Estimated provider cost from list prices (usage.py)", ["provider", "model"])
+
+IMAGE_PREPROCESS_BYTES = metrics.counter(
+    "chathdi_image_preprocess_bytes", "Bytes of chat input images before and after downscaling", ["stage"])
+IMAGE_PREPROCESS_CACHE = metrics.counter(
+    "chathdi_image_preprocess_cache", "Image preprocessing cache lookups", ["result"])
+IMAGE_PREPROCESS_DURATION = metrics.histogram(
+    "chathdi_image_preprocess_duration_seconds", "Decode, downscale and re-encode time per chat input image")
+
+MEDIA_CACHE_LOOKUPS = metrics.counter(
+    "chathdi_media_cache_lookups", "Generated-image cache lookups by prompt (media_store.py)", ["result"])
+MEDIA_STORE_BYTES = metrics.gauge(
+    "chathdi_media_store_bytes", "Bytes of media blobs kept on disk")
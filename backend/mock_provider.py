@@ -0,0 +1,356 @@
+"""
+Mock LLM/Media Provider for ChatHDI - offline benchmarking and tests
+A local stand-in for the upstream APIs the backend talks to:
+- OpenAI-compatible (AIML, Groq, Vercel, OpenAI): /v1/chat/completions (incl. streaming),
+  /v1/models, /v1/images/generations
+- Gemini REST: /v1beta/models/{model}:generateContent and :streamGenerateContent
+- Hugging Face Inference: POST /models/{model_id} (text-to-image, returns PNG bytes)
+
+Latency, token rate, streaming and 429/5xx injection are configurable and
+outputs are deterministic for a given prompt + seed. Point the backend at it
+with MOCK_PROVIDER_URL=http://127.0.0.1:8090 (see .env.example).
+
+Run:
+    python mock_provider.py --port 8090 --latency-ms 300 --tokens-per-second 80 --error-rate-429 0.05
+"""
+
+import io
+import re
+import json
+import time
+import math
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Vocabulary for deterministic fake completions
+WORDS = (
+    "hidrogen elektrolisis energi terbarukan sel bahan bakar katalis membran efisiensi "
+    "tekanan suhu reaktor penyimpanan produksi analisis data sistem proses material "
+    "hydrogen electrolysis renewable fuel cell catalyst membrane efficiency pressure"
+).split()
+
+
+class MockConfig:
+    """Runtime-adjustable behaviour of the mock (also settable via POST /_mock/config)"""
+
+    def __init__(self, **overrides):
+        self.latency_ms = 200.0            # mean time before the first token
+        self.latency_dist = "lognormal"    # fixed | uniform | normal | lognormal
+        self.latency_jitter = 0.5          # spread (fraction of mean, sigma for lognormal)
+        self.tokens_per_second = 100.0     # completion token rate (0 = instant)
+        self.completion_tokens = 64        # tokens per completion
+        self.error_rate_429 = 0.0
+        self.error_rate_5xx = 0.0
+        self.retry_after = 1               # seconds advertised on 429
+        self.max_concurrency = 0           # concurrent completions before 429s (0 = unlimited)
+        self.image_size = 64               # generated image edge (pixels)
+        self.image_latency_ms = 500.0
+        self.seed = 0
+        self.update(overrides)
+
+    def update(self, values: Dict):
+        for key, value in values.items():
+            if value is not None and hasattr(self, key):
+                setattr(self, key, type(getattr(self, key))(value))
+        self.rng = random.Random(self.seed)
+
+    def to_dict(self) -> Dict:
+        return {k: v for k, v in self.__dict__.items() if k != "rng"}
+
+    def sample_latency(self, mean_ms: float) -> float:
+        """Seconds, drawn from the configured distribution"""
+        if mean_ms <= 0:
+            return 0.0
+        if self.latency_dist == "fixed":
+            value = mean_ms
+        elif self.latency_dist == "uniform":
+            value = self.rng.uniform(mean_ms * (1 - self.latency_jitter), mean_ms * (1 + self.latency_jitter))
+        elif self.latency_dist == "normal":
+            value = self.rng.gauss(mean_ms, mean_ms * self.latency_jitter)
+        else:
+            sigma = self.latency_jitter
+            value = self.rng.lognormvariate(math.log(mean_ms) - sigma ** 2 / 2, sigma)
+        return max(value, 0.0) / 1000
+
+    def injected_error(self) -> Optional[int]:
+        roll = self.rng.random()
+        if roll < self.error_rate_429:
+            return 429
+        if roll < self.error_rate_429 + self.error_rate_5xx:
+            return 503
+        return None
+
+
+class MockStats:
+    def __init__(self):
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def count(self, kind: str, status: Optional[int] = None):
+        self.requests[kind] = self.requests.get(kind, 0) + 1
+        if status:
+            self.errors[str(status)] = self.errors.get(str(status), 0) + 1
+
+
+def _prompt_text(messages: List[Dict]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+        parts.append(f"{message.get('role')}:{content}")
+    return "\n".join(parts)
+
+
+def deterministic_tokens(prompt: str, model: str, count: int, seed: int) -> List[str]:
+    """Same prompt + model + seed always yields the same completion"""
+    digest = hashlib.sha256(f"{seed}|{model}|{prompt}".encode("utf-8")).digest()
+    rng = random.Random(digest)
+    tokens = [f"[mock:{model}]"] + [rng.choice(WORDS) for _ in range(max(count - 1, 0))]
+    return [t if i == 0 else " " + t for i, t in enumerate(tokens)]
+
+
+def deterministic_outline(prompt: str, model: str, slides: int, seed: int) -> List[str]:
+    """Slide outline in the JUDUL:/SLIDE n: format pptx_service asks for"""
+    digest = hashlib.sha256(f"{seed}|{model}|{prompt}".encode("utf-8")).digest()
+    rng = random.Random(digest)
+
+    def phrase(words: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+    lines = [f"JUDUL: [mock:{model}] {phrase(4)}", ""]
+    for number in range(1, slides + 1):
+        lines += [f"SLIDE {number}:", f"Judul: {phrase(3)}"] + [f"- {phrase(8)}" for _ in range(3)] + [""]
+    return re.findall(r"\s*\S+", "\n".join(lines))
+
+
+def deterministic_completion(prompt: str, model: str, count: int, seed: int) -> List[str]:
+    # Presentation outline requests get a parseable outline so /api/generate/pptx renders slides
+    if "SLIDE 1:" in prompt:
+        return deterministic_outline(prompt, model, 5, seed)
+    return deterministic_tokens(prompt, model, count, seed)
+
+
+def deterministic_png(prompt: str, size: int, seed: int) -> bytes:
+    from PIL import Image
+
+    digest = hashlib.sha256(f"{seed}|{prompt}".encode("utf-8")).digest()
+    image = Image.new("RGB", (size, size), tuple(digest[:3]))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    """Build the mock provider app (importable for in-process tests)"""
+    config = config or MockConfig()
+    stats = MockStats()
+    app = FastAPI(title="ChatHDI Mock Provider")
+    app.state.config = config
+    app.state.stats = stats
+    in_flight = {"count": 0}
+
+    def error_response(status: int, style: str = "openai") -> JSONResponse:
+        headers = {"Retry-After": str(config.retry_after)} if status == 429 else {}
+        message = "Rate limit exceeded (mock)" if status == 429 else "Service unavailable (mock)"
+        if style == "gemini":
+            body = {"error": {"code": status, "message": message,
+                              "status": "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE"}}
+        else:
+            body = {"error": {"message": message, "type": "rate_limit_error" if status == 429 else "server_error",
+                              "code": status}}
+        return JSONResponse(body, status_code=status, headers=headers)
+
+    async def wait_first_token():
+        await asyncio.sleep(config.sample_latency(config.latency_ms))
+
+    async def wait_tokens(count: int):
+        if config.tokens_per_second > 0:
+            await asyncio.sleep(count / config.tokens_per_second)
+
+    # ---------- OpenAI-compatible ----------
+
+    @app.get("/v1/models")
+    async def list_models():
+        stats.count("models")
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        status = config.injected_error()
+        if config.max_concurrency and in_flight["count"] >= config.max_concurrency:
+            status = 429
+        stats.count("chat", status)
+        if status:
+            return error_response(status)
+        in_flight["count"] += 1
+        try:
+            return await complete_chat(body)
+        finally:
+            in_flight["count"] -= 1
+
+    async def complete_chat(body: Dict):
+        """Counted against max_concurrency until returned (streams only until they start)"""
+        model = body.get("model", "mock-model")
+        prompt = _prompt_text(body.get("messages", []))
+        n_tokens = int(body.get("max_tokens") or config.completion_tokens)
+        tokens = deterministic_completion(prompt, model, n_tokens, config.seed)
+        completion_id = "chatcmpl-" + hashlib.md5(prompt.encode("utf-8")).hexdigest()[:12]
+        created = int(time.time())
+        usage = {"prompt_tokens": _estimate_tokens(prompt), "completion_tokens": len(tokens),
+                 "total_tokens": _estimate_tokens(prompt) + len(tokens)}
+
+        if body.get("stream"):
+            async def stream():
+                await wait_first_token()
+                for token in tokens:
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                             "model": model, "choices": [{"index": 0, "delta": {"content": token},
+                                                          "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await wait_tokens(1)
+                final = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                         "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    final["usage"] = usage
+                yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        await wait_first_token()
+        await wait_tokens(len(tokens))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                         "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    @app.post("/v1/images/generations")
+    async def images_generations(request: Request):
+        import base64
+
+        body = await request.json()
+        status = config.injected_error()
+        stats.count("image", status)
+        if status:
+            return error_response(status)
+        await asyncio.sleep(config.sample_latency(config.image_latency_ms))
+        images = [
+            {"b64_json": base64.b64encode(deterministic_png(f"{body.get('prompt')}#{i}", config.image_size,
+                                                            config.seed)).decode("ascii")}
+            for i in range(int(body.get("n", 1)))
+        ]
+        return {"created": int(time.time()), "data": images}
+
+    # ---------- Gemini REST ----------
+
+    @app.post("/v1beta/models/{model_action:path}")
+    async def gemini_generate(model_action: str, request: Request):
+        body = await request.json()
+        model, _, action = model_action.partition(":")
+        if action == "countTokens":
+            # Used by warm-up/health probes - no latency, no injected errors
+            stats.count("gemini_count")
+            text = " ".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+            return {"totalTokens": _estimate_tokens(text)}
+        status = config.injected_error()
+        stats.count("gemini", status)
+        if status:
+            return error_response(status, style="gemini")
+
+        prompt = "\n".join(
+            f"{c.get('role')}:" + " ".join(p.get("text", "") for p in c.get("parts", []))
+            for c in body.get("contents", [])
+        )
+        tokens = deterministic_completion(prompt, model, config.completion_tokens, config.seed)
+        usage = {"promptTokenCount": _estimate_tokens(prompt), "candidatesTokenCount": len(tokens),
+                 "totalTokenCount": _estimate_tokens(prompt) + len(tokens)}
+
+        def candidate(text: str, finished: bool) -> Dict:
+            result = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+            if finished:
+                result["finishReason"] = "STOP"
+            return result
+
+        if action == "streamGenerateContent":
+            async def stream():
+                await wait_first_token()
+                for i, token in enumerate(tokens):
+                    chunk = {"candidates": [candidate(token, i == len(tokens) - 1)]}
+                    if i == len(tokens) - 1:
+                        chunk["usageMetadata"] = usage
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await wait_tokens(1)
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        await wait_first_token()
+        await wait_tokens(len(tokens))
+        return {"candidates": [candidate("".join(tokens), True)], "usageMetadata": usage}
+
+    # ---------- Hugging Face Inference ----------
+
+    @app.post("/models/{model_id:path}")
+    async def hf_inference(model_id: str, request: Request):
+        body = await request.json()
+        status = config.injected_error()
+        stats.count("hf", status)
+        if status:
+            return error_response(status)
+        await asyncio.sleep(config.sample_latency(config.image_latency_ms))
+        png = deterministic_png(f"{model_id}|{body.get('inputs')}", config.image_size, config.seed)
+        return Response(content=png, media_type="image/png")
+
+    @app.get("/api/whoami-v2")
+    async def hf_whoami():
+        stats.count("hf_whoami")
+        return {"type": "user", "name": "mock"}
+
+    # ---------- control ----------
+
+    @app.get("/_mock/config")
+    async def get_config():
+        return config.to_dict()
+
+    @app.post("/_mock/config")
+    async def set_config(request: Request):
+        config.update(await request.json())
+        return config.to_dict()
+
+    @app.get("/_mock/stats")
+    async def get_stats():
+        return {"requests": stats.requests, "errors": stats.errors}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ChatHDI mock LLM/media provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    defaults = MockConfig()
+    for key, value in defaults.to_dict().items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=None)
+    args = vars(parser.parse_args())
+    host, port = args.pop("host"), args.pop("port")
+
+    import uvicorn
+    uvicorn.run(create_app(MockConfig(**args)), host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
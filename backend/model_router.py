@@ -0,0 +1,140 @@
+"""
+Model Router for ChatHDI - "hdi-auto" picks a MODEL_MAPPING entry per request
+Classifies the request locally (no extra model call) from the last user
+message, the conversation and the attached/retrieved context:
+- light     short, plain question                         -> hdi-grok-mini
+- standard  everything else                               -> hdi-grok
+- code      code blocks or programming questions           -> hdi-claude
+- complex   long conversations, big documents/RAG context,
+            or long analytical questions                   -> hdi-gpt4o
+- vision    image parts in the message                     -> hdi-gpt4o
+Each tier lists fallbacks (cheapest/fastest first); the first one whose
+provider is configured wins. Override the lists per tier with
+AUTO_ROUTES='{"light": ["hdi-4-mini"], "code": ["hdi-gpt4o"]}'.
+
+Every decision is logged with its reasons and counted in
+chathdi_auto_route_decisions_total; /api/chat returns the chosen model in
+`routed_model`. Picking any other model in the UI bypasses the router.
+"""
+
+import os
+import re
+import json
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+from metrics import AUTO_ROUTE_DECISIONS
+from chat_messages import ChatHistory
+
+logger = logging.getLogger(__name__)
+
+AUTO_MODEL_ID = "hdi-auto"
+
+DEFAULT_ROUTES: Dict[str, List[str]] = {
+    "light": ["hdi-grok-mini", "hdi-gpt4o-mini", "hdi-4-mini"],
+    "standard": ["hdi-grok", "hdi-gpt4o-mini", "hdi-4"],
+    "code": ["hdi-claude", "hdi-gpt4o", "hdi-grok"],
+    "complex": ["hdi-gpt4o", "hdi-claude", "hdi-grok"],
+    "vision": ["hdi-gpt4o", "hdi-vision"],
+}
+
+# Thresholds (characters; ~4 characters per token)
+LIGHT_MAX_CHARS = {"en": 280, "id": 160}
+COMPLEX_MIN_CHARS = 12000        # whole conversation + context
+COMPLEX_MIN_CONTEXT_CHARS = 6000  # documents / R&D records
+COMPLEX_MIN_TURNS = 12
+ANALYTICAL_MIN_CHARS = 300
+
+CODE_PATTERN = re.compile(
+    r"```|^\s*(def |class |import |from \w+ import|function |const |let |SELECT |#include)|"
+    r"\b(python|javascript|typescript|react|fastapi|pandas|numpy|sql|regex|traceback|stack trace|"
+    r"debug|bug|error:|exception|kode|script|coding|program)\b",
+    re.IGNORECASE | re.MULTILINE,
+)
+ANALYTICAL_PATTERN = re.compile(
+    r"\b(analisis|analisa|analyze|analyse|bandingkan|compare|hitung|calculate|derivasi|derive|"
+    r"techno-economic|tekno-ekonomi|evaluasi|evaluate|rancang|design|optimasi|optimi[sz]e)\b",
+    re.IGNORECASE,
+)
+# Attachments and RAG context injected by the frontend
+DOCUMENT_PATTERN = re.compile(r"\[(File|PDF Indexed)[^\]]*\]|\[System: Gunakan informasi", re.IGNORECASE)
+INDONESIAN_WORDS = {"yang", "dan", "apa", "bagaimana", "adalah", "untuk", "dengan", "ini", "itu", "tidak",
+                    "jelaskan", "dari", "pada", "bisa", "saya", "kamu", "tolong", "buatkan", "berapa"}
+
+
+class RouteDecision(NamedTuple):
+    model_id: str
+    tier: str
+    reasons: List[str]
+
+
+def _load_routes() -> Dict[str, List[str]]:
+    routes = {tier: list(models) for tier, models in DEFAULT_ROUTES.items()}
+    raw = os.environ.get('AUTO_ROUTES', '')
+    if raw:
+        try:
+            for tier, models in json.loads(raw).items():
+                routes[tier] = [models] if isinstance(models, str) else list(models)
+        except (ValueError, AttributeError, TypeError) as e:
+            logger.error(f"Invalid AUTO_ROUTES, using defaults: {e}")
+    return routes
+
+
+def detect_language(text: str) -> str:
+    words = re.findall(r"[a-z]+", text.lower())
+    indonesian = sum(1 for word in words if word in INDONESIAN_WORDS)
+    return "id" if words and indonesian / len(words) >= 0.1 else "en"
+
+
+def classify(messages: Union[ChatHistory, List[Dict]], context: Optional[str] = None) -> RouteDecision:
+    """Tier of a request; model_id is left empty (see ModelRouter.route)"""
+    conversation = ChatHistory.of(messages)
+    last = conversation.last_user
+    question = last.text if last else ""
+    total_chars = sum(len(m.text) for m in conversation.messages) + len(context or "")
+    document = DOCUMENT_PATTERN.search(question)
+    # Document text the frontend appended to the question counts as context
+    context_chars = len(context or "") + (len(question) - document.start() if document else 0)
+    typed = question[:document.start()] if document else question
+    language = detect_language(typed)
+
+    if last and last.images:
+        return RouteDecision("", "vision", ["image attached"])
+    if CODE_PATTERN.search(typed):
+        return RouteDecision("", "code", ["code or programming question"])
+    reasons = []
+    if total_chars >= COMPLEX_MIN_CHARS:
+        reasons.append(f"long conversation ({total_chars} chars)")
+    if context_chars >= COMPLEX_MIN_CONTEXT_CHARS:
+        reasons.append(f"large context ({context_chars} chars)")
+    if len(conversation) >= COMPLEX_MIN_TURNS:
+        reasons.append(f"{len(conversation)} turns")
+    if len(typed) >= ANALYTICAL_MIN_CHARS and ANALYTICAL_PATTERN.search(typed):
+        reasons.append("long analytical question")
+    if reasons:
+        return RouteDecision("", "complex", reasons)
+    if document or context:
+        return RouteDecision("", "standard", ["document or R&D context"])
+    if len(typed) <= LIGHT_MAX_CHARS[language]:
+        return RouteDecision("", "light", [f"short {language} question ({len(typed)} chars)"])
+    return RouteDecision("", "standard", [f"{len(typed)} chars"])
+
+
+class ModelRouter:
+    """Maps tiers to the first configured MODEL_MAPPING entry"""
+
+    def __init__(self, routes: Optional[Dict[str, List[str]]] = None):
+        self.routes = routes or _load_routes()
+
+    def route(self, messages: Union[ChatHistory, List[Dict]], context: Optional[str] = None,
+              available: Callable[[str], bool] = lambda model_id: True) -> RouteDecision:
+        decision = classify(messages, context)
+        candidates = self.routes.get(decision.tier) or self.routes["standard"]
+        model_id = next((m for m in candidates if available(m)), candidates[0])
+        decision = decision._replace(model_id=model_id)
+        AUTO_ROUTE_DECISIONS.labels(tier=decision.tier, model_id=model_id).inc()
+        logger.info(f"{AUTO_MODEL_ID} -> {model_id} ({decision.tier}: {', '.join(decision.reasons)})")
+        return decision
+
+
+# Singleton instance
+model_router = ModelRouter()
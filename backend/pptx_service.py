@@ -5,13 +5,19 @@ Creates PowerPoint presentations from AI-generated content
 
 import os
 import io
+import copy
 import base64
+import asyncio
 from typing import List, Dict, Optional
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
 from pptx.enum.shapes import MSO_SHAPE
+from metrics import PPTX_RENDER_DURATION
+from tracing import traced
+from admission import Priority
+from single_flight import SingleFlight, request_key
 
 # HDI Brand Colors
 HDI_GREEN = RGBColor(16, 185, 129)  # Emerald
@@ -23,7 +29,7 @@ class PPTXService:
     """Service for generating PowerPoint presentations"""
     
     def __init__(self):
-        pass
+        self._flight = SingleFlight("pptx")
     
     def detect_pptx_request(self, message: str) -> bool:
         """Detect if user is requesting PPTX generation"""
@@ -35,6 +41,7 @@ class PPTXService:
         ]
         return any(keyword in message_lower for keyword in keywords)
     
+    @traced("PPTXService.create_presentation")
     def create_presentation(self, title: str, slides_content: List[Dict]) -> bytes:
         """
         Create a PowerPoint presentation
@@ -46,6 +53,11 @@ class PPTXService:
         Returns:
             Bytes of the PPTX file
         """
+        with PPTX_RENDER_DURATION.time():
+            return self._render_presentation(title, slides_content)
+    
+    def _render_presentation(self, title: str, slides_content: List[Dict]) -> bytes:
+        """Build the slides and serialise the presentation"""
         prs = Presentation()
         prs.slide_width = Inches(13.333)  # 16:9 aspect ratio
         prs.slide_height = Inches(7.5)
@@ -251,6 +263,16 @@ class PPTXService:
         p.font.color.rgb = RGBColor(107, 114, 128)
         p.alignment = PP_ALIGN.CENTER
     
+    async def warm_up(self, timeout: float = 10.0) -> Dict[str, str]:
+        """Render a throwaway deck so the default template and XML parts are loaded"""
+        slides = [{'title': 'Warm-up', 'type': 'section'}, {'title': 'Warm-up', 'content': ['-'], 'type': 'content'}]
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self._render_presentation, "Warm-up", slides), timeout)
+            return {"template": "ok"}
+        except Exception as e:
+            return {"template": f"error: {e}"}
+    
+    @traced("PPTXService.generate_from_topic")
     async def generate_from_topic(self, topic: str, ai_service) -> Dict:
         """
         Generate a complete presentation from a topic using AI
@@ -262,6 +284,12 @@ class PPTXService:
         Returns:
             Dict with 'success', 'pptx_base64', 'filename', 'error'
         """
+        # Requests for the same topic while one is being generated share its deck
+        result = await self._flight.do(request_key(topic.strip()),
+                                       lambda: self._generate_from_topic(topic, ai_service))
+        return copy.deepcopy(result)
+    
+    async def _generate_from_topic(self, topic: str, ai_service) -> Dict:
         try:
             # Ask AI to generate slide content
             prompt = f"""Buatkan outline presentasi tentang: {topic}
@@ -286,7 +314,8 @@ Judul: [Judul slide]
 Fokus pada konten yang informatif dan terstruktur."""
 
             messages = [{"role": "user", "content": prompt}]
-            response = await ai_service.chat(messages, "hdi-4")
+            # Queued behind interactive chats (admission.py)
+            response = await ai_service.chat(messages, "hdi-4", priority=Priority.BACKGROUND, feature="pptx")
             
             # Parse the response to extract slides
             slides_content = self._parse_ai_response(response)
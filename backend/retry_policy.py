@@ -0,0 +1,162 @@
+"""
+Retry Policy for ChatHDI - budgeted retries of transient provider errors
+Every provider call in ai_service.py and media_service.py goes through
+`retry_policy.call(provider, fn)`. Transient failures are retried with
+full-jitter exponential backoff (or after the provider's Retry-After) up to
+RETRY_MAX_ATTEMPTS, and never past RETRY_DEADLINE seconds from the first
+attempt.
+
+Only errors where the provider did not process the request are retried
+(429, 502/503/504, 408, connection failures), so a retry cannot produce a
+second billed completion. Retries are budgeted per provider: each success
+adds RETRY_BUDGET_RATIO tokens (capped at RETRY_BUDGET_MAX), each retry
+takes one. When a provider is failing hard the budget runs dry and calls
+fail fast instead of multiplying the load (retry storm).
+
+The SDK clients are created with their own retries disabled, so this is
+the only retry layer. The admission slot of the call is released during the
+backoff and taken again for the next attempt.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+from admission import AdmissionRejected, current_slot
+from metrics import PROVIDER_RETRIES, error_status
+
+logger = logging.getLogger(__name__)
+
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '3'))
+RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', '0.5'))
+RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', '8'))
+RETRY_DEADLINE = float(os.environ.get('RETRY_DEADLINE', '30'))
+RETRY_BUDGET_RATIO = float(os.environ.get('RETRY_BUDGET_RATIO', '0.2'))
+RETRY_BUDGET_MAX = float(os.environ.get('RETRY_BUDGET_MAX', '10'))
+
+# The provider rejected the request without processing it
+RETRYABLE_STATUSES = {"408", "429", "502", "503", "504"}
+RETRYABLE_ERRORS = {
+    "APIConnectionError", "ConnectError", "ConnectTimeout",  # openai / httpx
+    "ConnectionError", "ConnectionRefusedError",  # requests / sockets
+    "ResourceExhausted", "ServiceUnavailable", "TooManyRequests",  # google.api_core
+}
+
+
+def _status(exc: Exception) -> str:
+    code = getattr(exc, "code", None)  # google.api_core exceptions carry the HTTP status here
+    if isinstance(code, int):
+        return str(code)
+    return error_status(exc)
+
+
+def is_retryable(exc: Exception) -> bool:
+    return _status(exc) in RETRYABLE_STATUSES or type(exc).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Seconds from a Retry-After (or retry-after-ms) response header, if any"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """Token bucket filled by successes and drained by retries"""
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, maximum: float = RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = maximum
+
+    def deposit(self):
+        self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RetryPolicy:
+    """Retries transient provider errors within a per-provider budget and a deadline"""
+
+    def __init__(self, attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, deadline: float = RETRY_DEADLINE,
+                 budget_ratio: float = RETRY_BUDGET_RATIO, budget_max: float = RETRY_BUDGET_MAX):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self.budgets: Dict[str, RetryBudget] = {}
+        self.rng = random.Random()
+
+    def budget(self, provider: str) -> RetryBudget:
+        budget = self.budgets.get(provider)
+        if budget is None:
+            budget = self.budgets[provider] = RetryBudget(self.budget_ratio, self.budget_max)
+        return budget
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform between 0 and the exponential step"""
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, provider: str, fn: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+        """Await fn(), calling it again on transient errors; the last error is re-raised"""
+        budget = self.budget(provider)
+        give_up_at = time.monotonic() + (deadline if deadline is not None else self.deadline)
+        attempt = 0
+        while True:
+            try:
+                result = await fn()
+                budget.deposit()
+                return result
+            except Exception as e:
+                attempt += 1
+                if not is_retryable(e) or attempt >= self.attempts:
+                    raise
+                status = _status(e)
+                delay = retry_after(e)
+                delay = self.backoff(attempt) if delay is None else delay + self.rng.uniform(0, self.base_delay)
+                if time.monotonic() + delay > give_up_at:
+                    PROVIDER_RETRIES.labels(provider=provider, status=status, outcome="deadline").inc()
+                    raise
+                if not budget.withdraw():
+                    PROVIDER_RETRIES.labels(provider=provider, status=status, outcome="budget_exhausted").inc()
+                    logger.warning(f"{provider}: retry budget exhausted, not retrying {status}")
+                    raise
+                PROVIDER_RETRIES.labels(provider=provider, status=status, outcome="retried").inc()
+                logger.info(f"{provider}: {status}, retry {attempt} in {delay:.2f}s")
+                # Other callers may use the provider slot while this one waits
+                slot = current_slot.get()
+                if slot is not None:
+                    slot.release()
+                await asyncio.sleep(delay)
+                if slot is not None:
+                    try:
+                        await slot.acquire()
+                    except AdmissionRejected as rejected:
+                        logger.warning(f"{provider}: not retrying {status}, {rejected}")
+                        raise e from None
+
+
+# Singleton instance
+retry_policy = RetryPolicy()
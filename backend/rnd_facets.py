@@ -0,0 +1,154 @@
+"""
+R&D Facet Counters for ChatHDI
+Keeps per-category / per-country (and friends) breakdowns of the R&D database
+so the UI does not have to iterate the full payload to draw its filters.
+
+- Demo mode: counters are maintained incrementally on insert/delete
+- MongoDB mode: one `$facet` aggregation per collection, cached per data version
+"""
+
+import time
+import logging
+from collections import Counter
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# collection -> {facet name: document field}
+# Facets whose field holds a list (e.g. material hazards) count every element.
+FACET_FIELDS = {
+    "rnd_papers": {"category": "category", "country": "country", "year": "year"},
+    "rnd_equipment": {"category": "category", "country": "country", "status": "status"},
+    "rnd_materials": {"category": "category", "country": "country", "hazards": "hazards"},
+    "rnd_institutions": {"category": "type", "country": "country"},
+}
+
+# Public names used in the API response (matches /api/rnd/all keys)
+COLLECTION_KEYS = {
+    "rnd_papers": "papers",
+    "rnd_equipment": "equipment",
+    "rnd_materials": "materials",
+    "rnd_institutions": "institutions",
+}
+
+# How long a MongoDB aggregation result is trusted when nothing was written
+# through this process (other writers may touch the database directly)
+MONGO_CACHE_TTL = 60.0
+
+
+def _facet_values(doc: Dict, field: str) -> List:
+    """Return the facet values a document contributes for one field"""
+    value = doc.get(field)
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [v for v in value if v is not None]
+    return [value]
+
+
+class FacetIndex:
+    """Incrementally maintained facet counters for the R&D collections"""
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[str, Counter]] = {
+            collection: {facet: Counter() for facet in fields}
+            for collection, fields in FACET_FIELDS.items()
+        }
+        self.totals: Dict[str, int] = {collection: 0 for collection in FACET_FIELDS}
+        self.version = 0
+        self._mongo_cache: Optional[Dict] = None
+        self._mongo_cache_version = -1
+        self._mongo_cache_time = 0.0
+
+    def rebuild(self, collections: Dict[str, List[Dict]]):
+        """Recount everything from scratch (startup / bulk load)"""
+        for collection in FACET_FIELDS:
+            for counter in self.counters[collection].values():
+                counter.clear()
+            self.totals[collection] = 0
+            for doc in collections.get(collection, []):
+                self._apply(collection, doc, 1)
+        self.version += 1
+
+    def record_insert(self, collection: str, doc: Dict):
+        """Count a newly inserted document"""
+        if collection in FACET_FIELDS:
+            self._apply(collection, doc, 1)
+            self.version += 1
+
+    def record_delete(self, collection: str, doc: Dict):
+        """Uncount a deleted document"""
+        if collection in FACET_FIELDS:
+            self._apply(collection, doc, -1)
+            self.version += 1
+
+    def record_update(self, collection: str, old_doc: Dict, new_doc: Dict):
+        """Move counts from the old version of a document to the new one"""
+        if collection in FACET_FIELDS:
+            self._apply(collection, old_doc, -1)
+            self._apply(collection, new_doc, 1)
+            self.version += 1
+
+    def _apply(self, collection: str, doc: Dict, delta: int):
+        for facet, field in FACET_FIELDS[collection].items():
+            counter = self.counters[collection][facet]
+            for value in _facet_values(doc, field):
+                counter[value] += delta
+                if counter[value] <= 0:
+                    del counter[value]
+        self.totals[collection] += delta
+
+    def snapshot(self) -> Dict:
+        """Return the current counts; cost is proportional to the number of facet values"""
+        result = {}
+        for collection, facets in self.counters.items():
+            key = COLLECTION_KEYS[collection]
+            result[key] = {"total": self.totals[collection]}
+            for facet, counter in facets.items():
+                result[key][facet] = dict(counter.most_common())
+        result["version"] = self.version
+        return result
+
+    async def mongo_snapshot(self, db) -> Dict:
+        """Facet counts computed by MongoDB, cached per data version"""
+        now = time.monotonic()
+        if (
+            self._mongo_cache is not None
+            and self._mongo_cache_version == self.version
+            and now - self._mongo_cache_time < MONGO_CACHE_TTL
+        ):
+            return self._mongo_cache
+
+        result = {}
+        for collection, fields in FACET_FIELDS.items():
+            pipeline = [{"$facet": self._facet_stages(fields)}]
+            docs = await db[collection].aggregate(pipeline).to_list(1)
+            facets = docs[0] if docs else {}
+            key = COLLECTION_KEYS[collection]
+            total = facets.pop("total", [])
+            result[key] = {"total": total[0]["count"] if total else 0}
+            for facet in fields:
+                result[key][facet] = {
+                    row["_id"]: row["count"] for row in facets.get(facet, []) if row["_id"] is not None
+                }
+        result["version"] = self.version
+
+        self._mongo_cache = result
+        self._mongo_cache_version = self.version
+        self._mongo_cache_time = now
+        return result
+
+    @staticmethod
+    def _facet_stages(fields: Dict[str, str]) -> Dict:
+        stages = {"total": [{"$count": "count"}]}
+        for facet, field in fields.items():
+            stages[facet] = [
+                {"$unwind": {"path": f"${field}", "preserveNullAndEmptyArrays": False}},
+                {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+            ]
+        return stages
+
+
+# Singleton instance
+facet_index = FacetIndex()
@@ -0,0 +1,123 @@
+"""
+R&D Retrieval for ChatHDI - grounds chat answers in the R&D Database
+Finds the top-k papers / equipment / materials / institutions relevant to
+the user's message and renders them as a compact, token-budgeted context
+block for the system prompt (instead of pasting whole collections).
+"""
+
+import os
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from rnd_similarity import TfidfIndex, PAPER_FIELDS, paper_index
+
+logger = logging.getLogger(__name__)
+
+# Indexed fields per collection (field -> weight)
+RETRIEVAL_FIELDS = {
+    "rnd_papers": PAPER_FIELDS,
+    "rnd_equipment": {"name": 2.0, "category": 1.5, "manufacturer": 1.0, "model": 1.0, "applications": 1.5},
+    "rnd_materials": {"name": 2.0, "formula": 2.0, "category": 1.5, "supplier": 1.0, "casNumber": 1.0},
+    "rnd_institutions": {"name": 2.0, "type": 1.0, "city": 1.0, "focus": 1.5, "facilities": 1.0},
+}
+
+# Approximate token budget of the injected block (~4 characters per token)
+RND_CONTEXT_TOKENS = int(os.environ.get('RND_CONTEXT_TOKENS', '800'))
+RND_CONTEXT_TOP_K = int(os.environ.get('RND_CONTEXT_TOP_K', '6'))
+CHARS_PER_TOKEN = 4
+
+# Records scoring below this cosine are noise for grounding
+MIN_SCORE = 0.05
+
+
+def _join(values, limit: int = 4) -> str:
+    return ", ".join(str(v) for v in list(values or [])[:limit])
+
+
+def format_record(collection: str, doc: Dict) -> str:
+    """One compact line per record"""
+    if collection == "rnd_papers":
+        abstract = (doc.get("abstract") or "")[:240]
+        return (f"[Paper {doc.get('id')}] {doc.get('title')} ({doc.get('year')}, {doc.get('journal')}; "
+                f"{doc.get('institution')}, {doc.get('country')}) - keywords: {_join(doc.get('keywords'))}; "
+                f"citations: {doc.get('citations')}. {abstract}")
+    if collection == "rnd_equipment":
+        specs = _join(f"{k}={v}" for k, v in (doc.get("specifications") or {}).items())
+        return (f"[Equipment {doc.get('id')}] {doc.get('name')} - {doc.get('manufacturer')} {doc.get('model')}, "
+                f"{doc.get('category')}, status: {doc.get('status')}, {doc.get('location')}; {specs}")
+    if collection == "rnd_materials":
+        return (f"[Material {doc.get('id')}] {doc.get('name')} ({doc.get('formula')}, CAS {doc.get('casNumber')}), "
+                f"purity {doc.get('purity')}, stock {doc.get('stock')} {doc.get('unit')}, "
+                f"supplier {doc.get('supplier')}; hazards: {_join(doc.get('hazards')) or '-'}")
+    return (f"[Institution {doc.get('id')}] {doc.get('name')} - {doc.get('type')}, {doc.get('city')}, "
+            f"{doc.get('country')}; focus: {_join(doc.get('focus'))}; publications: {doc.get('publications')}")
+
+
+class RnDRetrievalService:
+    """Top-k retrieval over the R&D collections for chat grounding"""
+
+    def __init__(self):
+        self.indexes: Dict[str, TfidfIndex] = {
+            collection: (paper_index if collection == "rnd_papers" else TfidfIndex(fields))
+            for collection, fields in RETRIEVAL_FIELDS.items()
+        }
+        self.loaded = set()
+
+    def rebuild(self, collections: Dict[str, List[Dict]]):
+        """Index every collection (startup, or after another worker changed shared data)"""
+        for collection, index in self.indexes.items():
+            index.rebuild(collections.get(collection, []))
+            self.loaded.add(collection)
+
+    def record_upsert(self, collection: str, doc: Dict):
+        """Keep an already loaded index in sync with an insert/update"""
+        if collection in self.loaded:
+            self.indexes[collection].add(doc)
+
+    def record_delete(self, collection: str, doc_id: str):
+        """Keep an already loaded index in sync with a delete"""
+        if collection in self.loaded:
+            self.indexes[collection].remove(doc_id)
+
+    def retrieve(self, query: str, k: int = RND_CONTEXT_TOP_K) -> List[Tuple[str, Dict, float]]:
+        """Best-scoring records across all collections"""
+        hits = []
+        for collection, index in self.indexes.items():
+            for doc, score in index.search(query, k):
+                if score >= MIN_SCORE:
+                    hits.append((collection, doc, score))
+        hits.sort(key=lambda hit: hit[2], reverse=True)
+        return hits[:k]
+
+    def build_context(self, query: str, max_tokens: int = RND_CONTEXT_TOKENS) -> Tuple[Optional[str], List[str]]:
+        """
+        Render the relevant records as a context block within a token budget
+
+        Returns:
+            (context block or None, list of record ids used)
+        """
+        budget = max_tokens * CHARS_PER_TOKEN
+        lines, ids = [], []
+        for collection, doc, _ in self.retrieve(query):
+            line = format_record(collection, doc)
+            if len(line) > budget:
+                if lines:
+                    break
+                line = line[:budget]
+            lines.append(f"- {line}")
+            ids.append(doc.get("id"))
+            budget -= len(line) + 3
+        if not lines:
+            return None, []
+
+        logger.info(f"R&D retrieval: {len(lines)} records for query '{query[:50]}'")
+        context = "\n".join(lines)
+        return f"""**Konteks dari R&D Database ChatHDI:**
+Data berikut diambil dari R&D Database internal dan relevan dengan pertanyaan user.
+Gunakan data ini sebagai dasar jawaban jika relevan, dan sebutkan ID record (misalnya paper-1) sebagai referensi.
+
+{context}""", ids
+
+
+# Singleton instance
+rnd_retrieval = RnDRetrievalService()
@@ -0,0 +1,338 @@
+"""
+Columnar in-memory store for the ChatHDI R&D Database (demo/desktop mode)
+
+Instead of one dict per record, every field lives in its own column:
+- int/float fields -> `array.array` (8 bytes per value); float fields keep
+  a 1-byte flag per row so integral values (e.g. stock 500) read back as int
+- low-cardinality strings (category, country, status, ...) -> int32 codes
+  into a per-column table of interned strings
+- list fields -> tuples of interned strings, other values kept as-is
+
+Rows are exposed through `RowView` objects (`__slots__`, read-only Mapping)
+so existing code that does `doc["category"]`, `doc.get(...)` or `{**doc}`
+keeps working, and filters run as NumPy vector ops over the columns.
+
+Deletes (and inserts that replace an id) tombstone rows; once tombstones
+pass COMPACT_RATIO of the rows the columns are rebuilt from the live rows,
+so a long-running worker taking CRUD writes does not grow without bound.
+RowViews are only valid until the next write.
+"""
+
+import sys
+import logging
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+import numpy as np
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# String fields worth dictionary-encoding (few distinct values, many rows)
+CATEGORICAL_FIELDS = frozenset({
+    "category", "country", "status", "type", "unit", "journal", "institution",
+    "supplier", "manufacturer", "location", "city", "priceRange", "purity", "budget",
+})
+
+# Sentinels for absent numeric values
+MISSING_INT = -(2 ** 63)
+MISSING_CODE = -1
+
+# Compact once this share of rows are tombstones (and at least COMPACT_MIN_ROWS)
+COMPACT_RATIO = 0.25
+COMPACT_MIN_ROWS = 64
+
+
+def _intern(value):
+    """Intern strings (and strings inside lists) so repeated values share memory"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return tuple(sys.intern(v) if isinstance(v, str) else v for v in value)
+    if isinstance(value, dict):
+        return {sys.intern(k): (sys.intern(v) if isinstance(v, str) else v) for k, v in value.items()}
+    return value
+
+
+def _is_int(value) -> int:
+    return 1 if isinstance(value, int) and not isinstance(value, bool) else 0
+
+
+def _column_kind(field: str, annotation) -> str:
+    if annotation is int:
+        return "int"
+    if annotation is float:
+        return "float"
+    if annotation is str and field in CATEGORICAL_FIELDS:
+        return "code"
+    return "object"
+
+
+class RowView(Mapping):
+    """Read-only dict-like view of one row of a ColumnarCollection"""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "ColumnarCollection", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key):
+        value = self._store._value(self._row, key)
+        if value is None and not self._store._has(self._row, key):
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return iter(self._store._keys(self._row))
+
+    def __len__(self):
+        return len(self._store._keys(self._row))
+
+    def __repr__(self):
+        return f"RowView({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict:
+        return {key: self._store._value(self._row, key) for key in self._store._keys(self._row)}
+
+
+class ColumnarCollection:
+    """Column-oriented collection with the read API the R&D endpoints use"""
+
+    def __init__(self, model: Optional[Type[BaseModel]], docs: Optional[List[Dict]] = None):
+        fields = model.model_fields.items() if model else ()
+        self.kinds: Dict[str, str] = {name: _column_kind(name, field.annotation) for name, field in fields}
+        self.columns: Dict[str, Any] = {}
+        self.code_tables: Dict[str, List[str]] = {}
+        self.code_lookup: Dict[str, Dict[str, int]] = {}
+        self.int_flags: Dict[str, array] = {}  # float columns: 1 where the source value was an int
+        for name, kind in self.kinds.items():
+            if kind == "int":
+                self.columns[name] = array("q")
+            elif kind == "float":
+                self.columns[name] = array("d")
+                self.int_flags[name] = array("b")
+            elif kind == "code":
+                self.columns[name] = array("i")
+                self.code_tables[name] = []
+                self.code_lookup[name] = {}
+            else:
+                self.columns[name] = []
+        self.extras: List[Optional[Dict]] = []  # fields outside the model schema
+        self.alive = array("b")
+        self.row_of: Dict[str, int] = {}
+        self._positions: Optional[np.ndarray] = None  # alive row numbers, rebuilt after writes
+        for doc in docs or []:
+            self.insert(doc)
+
+    # ---------- list-like read API ----------
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def __iter__(self) -> Iterator[RowView]:
+        alive = self.alive
+        for row in range(len(alive)):
+            if alive[row]:
+                yield RowView(self, row)
+
+    def _alive_rows(self) -> np.ndarray:
+        if self._positions is None:
+            self._positions = np.flatnonzero(np.frombuffer(self.alive, dtype=np.int8)) if len(self.alive) \
+                else np.empty(0, dtype=np.int64)
+        return self._positions
+
+    def __getitem__(self, index):
+        rows = self._alive_rows()
+        if isinstance(index, slice):
+            return [RowView(self, int(row)) for row in rows[index]]
+        return RowView(self, int(rows[index]))
+
+    def to_rows(self) -> List[RowView]:
+        return list(self)
+
+    def to_list(self, rows: Optional[np.ndarray] = None) -> List[Dict]:
+        """Materialise rows as plain dicts (for JSON responses)"""
+        if rows is None:
+            return [view.to_dict() for view in self]
+        return [RowView(self, int(row)).to_dict() for row in rows]
+
+    def get(self, doc_id: str) -> Optional[RowView]:
+        row = self.row_of.get(doc_id)
+        return RowView(self, row) if row is not None else None
+
+    # ---------- writes ----------
+
+    def insert(self, doc: Dict):
+        """Append a document (replaces an existing one with the same id)"""
+        if doc.get("id") in self.row_of:
+            self.delete(doc["id"])
+        row = len(self.alive)
+        for name, kind in self.kinds.items():
+            value = doc.get(name)
+            column = self.columns[name]
+            if kind == "int":
+                column.append(MISSING_INT if value is None else int(value))
+            elif kind == "float":
+                column.append(float("nan") if value is None else float(value))
+                self.int_flags[name].append(_is_int(value))
+            elif kind == "code":
+                column.append(self._encode(name, value))
+            else:
+                column.append(_intern(value))
+        extra = {k: _intern(v) for k, v in doc.items() if k not in self.kinds}
+        self.extras.append(extra or None)
+        self.alive.append(1)
+        self.row_of[doc["id"]] = row
+        self._positions = None
+
+    def delete(self, doc_id: str) -> Optional[Dict]:
+        """Tombstone a row; returns the deleted document"""
+        row = self.row_of.pop(doc_id, None)
+        if row is None:
+            return None
+        doc = RowView(self, row).to_dict()
+        self.alive[row] = 0
+        self._positions = None
+        for name, kind in self.kinds.items():
+            if kind == "object":
+                self.columns[name][row] = None
+        self.extras[row] = None
+        dead = len(self.alive) - len(self.row_of)
+        if dead >= COMPACT_MIN_ROWS and dead > COMPACT_RATIO * len(self.alive):
+            self.compact()
+        return doc
+
+    def compact(self):
+        """Drop tombstoned rows (row numbers change, document order does not)"""
+        rows = self._alive_rows()
+        for name, column in list(self.columns.items()):
+            if isinstance(column, array):
+                values = np.frombuffer(column, dtype=column.typecode)[rows]
+                self.columns[name] = array(column.typecode, values.tobytes())
+            else:
+                self.columns[name] = [column[row] for row in rows]
+        for name, flags in self.int_flags.items():
+            self.int_flags[name] = array("b", np.frombuffer(flags, dtype=np.int8)[rows].tobytes())
+        self.extras = [self.extras[row] for row in rows]
+        # Forget strings only the dropped rows used
+        for name, table in self.code_tables.items():
+            codes = np.frombuffer(self.columns[name], dtype=np.int32)
+            used = np.unique(codes[codes != MISSING_CODE])
+            remap = np.full(len(table), MISSING_CODE, dtype=np.int32)
+            remap[used] = np.arange(len(used), dtype=np.int32)
+            codes = np.where(codes == MISSING_CODE, MISSING_CODE, remap[np.maximum(codes, 0)]).astype(np.int32)
+            self.columns[name] = array("i", codes.tobytes())
+            self.code_tables[name] = [table[code] for code in used]
+            self.code_lookup[name] = {value: code for code, value in enumerate(self.code_tables[name])}
+        new_row = {int(row): position for position, row in enumerate(rows)}
+        self.row_of = {doc_id: new_row[row] for doc_id, row in self.row_of.items()}
+        self.alive = array("b", [1]) * len(rows)
+        self._positions = None
+
+    def update(self, doc_id: str, changes: Dict) -> Optional[Tuple[Dict, Dict]]:
+        """Apply a partial update; returns (old_doc, new_doc)"""
+        row = self.row_of.get(doc_id)
+        if row is None:
+            return None
+        old_doc = RowView(self, row).to_dict()
+        for key, value in changes.items():
+            kind = self.kinds.get(key)
+            if kind is None:
+                extra = self.extras[row] or {}
+                extra[key] = _intern(value)
+                self.extras[row] = extra
+            elif kind == "int":
+                self.columns[key][row] = MISSING_INT if value is None else int(value)
+            elif kind == "float":
+                self.columns[key][row] = float("nan") if value is None else float(value)
+                self.int_flags[key][row] = _is_int(value)
+            elif kind == "code":
+                self.columns[key][row] = self._encode(key, value)
+            else:
+                self.columns[key][row] = _intern(value)
+        return old_doc, RowView(self, row).to_dict()
+
+    def _encode(self, name: str, value) -> int:
+        if value is None:
+            return MISSING_CODE
+        lookup = self.code_lookup[name]
+        code = lookup.get(value)
+        if code is None:
+            code = len(self.code_tables[name])
+            self.code_tables[name].append(sys.intern(str(value)))
+            lookup[value] = code
+        return code
+
+    # ---------- row access ----------
+
+    def _has(self, row: int, key: str) -> bool:
+        if key in self.kinds:
+            return self._value(row, key) is not None
+        extra = self.extras[row]
+        return bool(extra) and key in extra
+
+    def _keys(self, row: int) -> List[str]:
+        keys = [name for name in self.kinds if self._value(row, name) is not None]
+        if self.extras[row]:
+            keys.extend(self.extras[row])
+        return keys
+
+    def _value(self, row: int, key: str):
+        kind = self.kinds.get(key)
+        if kind is None:
+            extra = self.extras[row]
+            return extra.get(key) if extra else None
+        value = self.columns[key][row]
+        if kind == "int":
+            return None if value == MISSING_INT else value
+        if kind == "float":
+            if value != value:
+                return None
+            return int(value) if self.int_flags[key][row] else value
+        if kind == "code":
+            return None if value == MISSING_CODE else self.code_tables[key][value]
+        if isinstance(value, tuple):
+            return list(value)
+        return value
+
+    # ---------- vectorised filters ----------
+
+    def _vector(self, name: str) -> np.ndarray:
+        """Zero-copy NumPy view over a numeric/code column"""
+        column = self.columns[name]
+        dtype = {"int": np.int64, "float": np.float64, "code": np.int32}[self.kinds[name]]
+        return np.frombuffer(column, dtype=dtype, count=len(column)) if len(column) else np.empty(0, dtype)
+
+    def mask(self, equals: Optional[Dict[str, Any]] = None,
+             ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None) -> np.ndarray:
+        """Boolean row mask; `equals` values may be a scalar or a list of allowed values"""
+        result = np.frombuffer(self.alive, dtype=np.int8).astype(bool) if len(self.alive) else np.empty(0, bool)
+        for name, wanted in (equals or {}).items():
+            if wanted is None:
+                continue
+            allowed = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            kind = self.kinds.get(name)
+            if kind == "code":
+                codes = [self.code_lookup[name][v] for v in allowed if v in self.code_lookup[name]]
+                result &= np.isin(self._vector(name), codes)
+            elif kind in ("int", "float"):
+                result &= np.isin(self._vector(name), [float(v) if kind == "float" else int(v) for v in allowed])
+            else:
+                values = self.columns[name] if kind else [(e or {}).get(name) for e in self.extras]
+                result &= np.fromiter((v in allowed for v in values), dtype=bool, count=len(result))
+        for name, (low, high) in (ranges or {}).items():
+            vector = self._vector(name)
+            if low is not None:
+                result &= vector >= low
+            if high is not None:
+                result &= vector <= high
+            if self.kinds[name] == "int":
+                result &= vector != MISSING_INT
+        return result
+
+    def find(self, equals: Optional[Dict[str, Any]] = None,
+             ranges: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None) -> List[Dict]:
+        """Documents matching all filters, as plain dicts"""
+        return self.to_list(np.flatnonzero(self.mask(equals, ranges)))
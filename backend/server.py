@@ -1,5 +1,8 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Header
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
@@ -7,7 +10,7 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Union, Any
+from typing import List, Optional, Dict, Union, Any, Tuple
 import uuid
 import platform
 from datetime import datetime, timezone
@@ -39,24 +42,26 @@ else:
     logger.info(f".env not found at {env_path}, trying default load")
 
 # Import services after loading env
-from ai_service import ai_service
-from media_service import media_service
-from document_service import document_service
+from metrics import metrics, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from tracing import tracer, traced, TRACING_ENABLED, TRACE_EXPORT_DIR
+# ai/media/document/pptx services import heavy SDKs - loaded on first use or by warm-up
+from service_loader import services, SERVICE_WARMUP
+from health_probe import health_prober
+from loop_monitor import loop_monitor, LOOP_MONITOR_ENABLED
+from admission import admission, Priority
+from chat_batch import chat_batches, parse_batch, BATCH_ID_PATTERN, BATCH_MAX_ITEMS
+from model_router import AUTO_MODEL_ID
+from chat_messages import ChatHistory
+from usage import usage_meter, GROUPS as USAGE_GROUPS
+from media_store import media_store, media_url, upload_media_type, PinnedStoreFull, MEDIA_DIR, MEDIA_UPLOAD_MB
 from fastapi import UploadFile, File
 
-# Try to import pptx_service (may fail without all dependencies)
-try:
-    from pptx_service import pptx_service
-    PPTX_AVAILABLE = True
-except ImportError:
-    PPTX_AVAILABLE = False
-    logger.warning("PPTX service not available")
-
 # Try to import rnd_models
 try:
     from rnd_models import (
         INITIAL_PAPERS, INITIAL_EQUIPMENT, INITIAL_MATERIALS, INITIAL_INSTITUTIONS,
-        CATEGORIES, COUNTRIES
+        CATEGORIES, COUNTRIES,
+        ResearchPaper, LabEquipment, Material, Institution
     )
 except ImportError:
     INITIAL_PAPERS = []
@@ -65,6 +70,16 @@ except ImportError:
     INITIAL_INSTITUTIONS = []
     CATEGORIES = []
     COUNTRIES = []
+    ResearchPaper = LabEquipment = Material = Institution = None
+
+from rnd_facets import facet_index
+from rnd_similarity import paper_index
+from rnd_retrieval import rnd_retrieval
+from rnd_facets import COLLECTION_KEYS
+from change_feed import change_feed, format_sse
+from rnd_store import ColumnarCollection
+from state_store import create_state_store, DuplicateRecord, STATE_BACKEND, RND_VERSION_TTL
+import asyncio
 
 # MongoDB connection - OPTIONAL for demo mode
 mongo_url = os.environ.get('MONGO_URL', '')
@@ -98,43 +113,99 @@ if USE_MONGODB:
 else:
     logger.info("Running in demo mode (no MongoDB)")
 
-# In-memory storage for demo mode
+# In-memory storage for demo mode (R&D collections are columnar, see rnd_store.py)
 in_memory_db = {
     "status_checks": [],
-    "rnd_papers": list(INITIAL_PAPERS),
-    "rnd_equipment": list(INITIAL_EQUIPMENT),
-    "rnd_materials": list(INITIAL_MATERIALS),
-    "rnd_institutions": list(INITIAL_INSTITUTIONS),
+    "rnd_papers": ColumnarCollection(ResearchPaper, INITIAL_PAPERS),
+    "rnd_equipment": ColumnarCollection(LabEquipment, INITIAL_EQUIPMENT),
+    "rnd_materials": ColumnarCollection(Material, INITIAL_MATERIALS),
+    "rnd_institutions": ColumnarCollection(Institution, INITIAL_INSTITUTIONS),
     "master_prompts": []
 }
 
+# Facet counters for demo mode (kept up to date on insert/delete;
+# shared state stores rebuild them in sync_rnd_indexes)
+facet_index.rebuild(in_memory_db)
+# Search indexes for similar papers and chat retrieval
+rnd_retrieval.rebuild(in_memory_db)
+
 
 # Lifespan context manager
+def dependency_checks() -> dict:
+    """Checks for the health prober: database plus the providers of loaded services"""
+    checks = {}
+    if USE_MONGODB and db:
+        checks["database"] = lambda: db.command("ping")
+    for name in ("ai_service", "media_service"):
+        service = services.services.get(name)
+        if service:
+            checks.update(service.provider_checks())
+    return checks
+
+async def probe_dependencies(warmup_task: Optional[asyncio.Task]):
+    """Background health probes; waits for the warm-up so the providers are included"""
+    if warmup_task:
+        await asyncio.wait([warmup_task])
+    await health_prober.run(dependency_checks)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
     ensure_data_dir()
+    await state_store.open()
+    await sync_rnd_indexes()
+    # First probe round: only the database, the services are not loaded yet
+    await health_prober.probe(dependency_checks())
     if USE_MONGODB and db:
-        try:
-            await db.command("ping")
+        database = health_prober.results["database"]
+        if database["status"] == "up":
             logger.info("MongoDB connection established successfully")
-        except Exception as e:
-            logger.error(f"MongoDB connection failed: {e}")
+        else:
+            logger.error(f"MongoDB connection failed: {database['error']}")
     else:
         logger.info("Running in local file mode (JSON persistence)")
+    # Import the heavy services once the server is already answering requests
+    warmup_task = None
+    if SERVICE_WARMUP:
+        warmup_task = asyncio.create_task(services.warm_up())
+    else:
+        services.warmed_up = True
+    probe_task = asyncio.create_task(probe_dependencies(warmup_task))
+    usage_task = asyncio.create_task(usage_meter.run(state_store))
     yield
     # Shutdown
+    loop_monitor.stop()
+    probe_task.cancel()
+    if warmup_task:
+        warmup_task.cancel()
+    usage_task.cancel()
+    await usage_meter.flush()
+    await asyncio.to_thread(tracer.flush)
+    await state_store.close()
     if client:
         client.close()
         logger.info("MongoDB connection closed")
 
 
+class TracedJSONResponse(JSONResponse):
+    """JSON response whose body encoding is a span of the request trace"""
+
+    def render(self, content: Any) -> bytes:
+        with tracer.span("http.serialize_response") as span:
+            body = super().render(content)
+            span.set_attribute("bytes", len(body))
+            return body
+
+
 # Create the main app with lifespan
 app = FastAPI(
     title="ChatHDI API", 
     description="AI-powered chat for R&D Engineering",
     version="2.3.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=TracedJSONResponse
 )
 
 # CORS middleware - allow all origins for development
@@ -146,6 +217,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Per-route latency histogram, in-flight gauge and root tracing span"""
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    with tracer.span("http.request", method=request.method, path=request.url.path) as span:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            # Use the route template (e.g. /api/rnd/{kind}) to keep label cardinality bounded
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            span.set_attribute("route", route)
+            span.set_attribute("status", status)
+            HTTP_REQUEST_DURATION.labels(
+                method=request.method,
+                route=route,
+                status=status
+            ).observe(time.perf_counter() - start)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics (text exposition format)"""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -169,6 +271,12 @@ def get_data_dir():
 DATA_DIR = get_data_dir()
 CONVERSATIONS_FILE = DATA_DIR / "conversations.json"
 
+# Offline trace export (see tracing.py)
+tracer.configure(TRACING_ENABLED, Path(TRACE_EXPORT_DIR) if TRACE_EXPORT_DIR else DATA_DIR / "traces")
+chat_batches.results_dir = DATA_DIR / "batches"
+# Holds the media that conversations refer to: on a Hugging Face Space point MEDIA_DIR at persistent storage
+media_store.directory = Path(MEDIA_DIR) if MEDIA_DIR else DATA_DIR / "media"
+
 def ensure_data_dir():
     """Ensure data directory exists"""
     try:
@@ -180,26 +288,8 @@ def ensure_data_dir():
     except Exception as e:
         logger.error(f"Failed to create data directory: {e}")
 
-def load_conversations_from_file():
-    """Load conversations from JSON file"""
-    try:
-        if CONVERSATIONS_FILE.exists():
-            with open(CONVERSATIONS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
-    except Exception as e:
-        logger.error(f"Error loading conversations: {e}")
-        return []
-
-def save_conversations_to_file(conversations):
-    """Save conversations to JSON file"""
-    try:
-        with open(CONVERSATIONS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(conversations, f, default=str)
-        return True
-    except Exception as e:
-        logger.error(f"Error saving conversations: {e}")
-        return False
+# Conversations, status checks and R&D data (memory, sqlite or mongo - see state_store.py)
+state_store = create_state_store(STATE_BACKEND, in_memory_db, DATA_DIR, db if USE_MONGODB else None)
 
 
 # Define Models
@@ -230,12 +320,15 @@ class Conversation(BaseModel):
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     model: str = "hdi-4"  # hdi-4, hdi-4-mini, hdi-vision, hdi-code
+    use_rnd_context: bool = False  # ground the answer in the R&D Database
 
 class ChatResponse(BaseModel):
     response: str
     model: str
     media_type: Optional[str] = None  # 'image', 'video', or None
-    media_data: Optional[List[str]] = None  # base64 encoded media
+    media_data: Optional[List[str]] = None  # media URLs (/api/media/<hash>)
+    rnd_sources: Optional[List[str]] = None  # R&D record ids used as context
+    routed_model: Optional[str] = None  # model hdi-auto picked for this request
 
 class ImageGenRequest(BaseModel):
     prompt: str
@@ -254,6 +347,7 @@ class PPTXRequest(BaseModel):
 async def upload_document(file: UploadFile = File(...)):
     """Upload and parse a document (PDF, DOCX, CSV, Excel, TXT)"""
     try:
+        document_service = await services.aget("document_service")
         parsed_text = await document_service.parse_document(file)
         return {"success": True, "filename": file.filename, "content": parsed_text}
     except Exception as e:
@@ -266,46 +360,76 @@ async def root():
 
 @api_router.get("/health")
 async def health_check():
-    """Health check endpoint for deployment"""
+    """Health check endpoint for deployment (cached probe results, no live checks)"""
     health_status = {
         "status": "healthy",
         "version": "2.3.0",
-        "mode": "mongodb" if USE_MONGODB else "demo"
+        "mode": "mongodb" if USE_MONGODB else "demo",
+        "state": state_store.name
     }
     
+    probes = health_prober.snapshot()
     if USE_MONGODB and db:
-        try:
-            await db.command("ping")
+        database = probes["dependencies"].get("database")
+        if database is None:
+            health_status["database"] = "unknown"
+        elif database["status"] == "up":
             health_status["database"] = "connected"
-        except Exception as e:
+        else:
+            health_status["status"] = "degraded"
             health_status["database"] = "disconnected"
-            health_status["db_error"] = str(e)
+            health_status["db_error"] = database["error"]
     else:
-        health_status["database"] = "in-memory"
+        health_status["database"] = "sqlite" if state_store.name == "sqlite" else "in-memory"
     
+    health_status.update(probes)
     return health_status
 
+@api_router.get("/ready")
+async def readiness_check():
+    """Readiness probe for load balancers: 503 until the warm-up has finished and while a service cannot load"""
+    ready = {
+        "ready": services.ready,
+        "warmup_seconds": services.warmup_seconds,
+        "import_failures": services.import_failures,
+        "warmup_failures": services.warmup_failures,
+    }
+    return JSONResponse(ready, status_code=200 if services.ready else 503)
+
+@api_router.get("/startup")
+async def startup_report():
+    """Import time of the app and of each lazily loaded service"""
+    return services.report()
+
+@api_router.get("/admin/event-loop")
+async def event_loop_report(recent: int = 20):
+    """Event-loop lag and the call sites that blocked it (see loop_monitor.py)"""
+    return loop_monitor.report(recent)
+
+@api_router.get("/admin/admission")
+async def admission_report():
+    """Provider limiters: limits, calls in flight and queued (see admission.py)"""
+    return admission.report()
+
+@api_router.get("/usage")
+async def usage_summary(group_by: str = "model", days: int = 7):
+    """Tokens, latency and estimated cost of AI calls by model, provider, day or feature (see usage.py)"""
+    if group_by not in USAGE_GROUPS:
+        raise HTTPException(status_code=422, detail=f"group_by must be one of: {', '.join(USAGE_GROUPS)}")
+    return await usage_meter.summary(group_by, days)
+
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
     doc = status_obj.model_dump()
     doc['timestamp'] = doc['timestamp'].isoformat()
-    
-    if USE_MONGODB and db:
-        await db.status_checks.insert_one(doc)
-    else:
-        in_memory_db["status_checks"].append(doc)
-    
+    await state_store.add_status_check(doc)
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    if USE_MONGODB and db:
-        status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-    else:
-        status_checks = in_memory_db["status_checks"]
-    
+    status_checks = await state_store.list_status_checks()
     for check in status_checks:
         if isinstance(check['timestamp'], str):
             check['timestamp'] = datetime.fromisoformat(check['timestamp'])
@@ -317,40 +441,60 @@ async def get_status_checks():
 @api_router.get("/conversations", response_model=List[Dict])
 async def get_conversations():
     """Get all saved conversations"""
-    return load_conversations_from_file()
+    return await state_store.list_conversations()
 
 @api_router.post("/conversations")
 async def save_conversation(conversation: Conversation):
     """Save or update a conversation"""
-    conversations = load_conversations_from_file()
-    
-    # Check if exists, update if so, else append
-    existing_idx = next((i for i, c in enumerate(conversations) if c['id'] == conversation.id), -1)
-    
     conv_data = conversation.model_dump()
     # Ensure timestamp is string
     if isinstance(conv_data.get('timestamp'), datetime):
         conv_data['timestamp'] = conv_data['timestamp'].isoformat()
+    # Inline base64 media goes to the media store (pinned); only references are saved
+    for message in conv_data['messages']:
+        if isinstance(message.get('mediaData'), list):
+            message['mediaData'] = await media_store.references(message['mediaData'])
     
-    if existing_idx >= 0:
-        conversations[existing_idx] = conv_data
-    else:
-        conversations.insert(0, conv_data)  # Add to top
-        
-    save_conversations_to_file(conversations)
-    return conv_data
+    # Updates keep their position, new conversations go to the top
+    return await state_store.save_conversation(conv_data)
 
 @api_router.delete("/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a conversation"""
-    conversations = load_conversations_from_file()
-    conversations = [c for c in conversations if c['id'] != conversation_id]
-    save_conversations_to_file(conversations)
+    await state_store.delete_conversation(conversation_id)
     return {"success": True, "id": conversation_id}
 
 
+async def text_chat(conversation: ChatHistory, model: str, use_rnd_context: bool = False,
+                    priority: Priority = Priority.INTERACTIVE, feature: Optional[str] = None
+                    ) -> Tuple[str, Optional[str], Optional[List[str]]]:
+    """R&D retrieval, hdi-auto routing and the AI call: (response, routed model, R&D sources)"""
+    # Optional retrieval stage: inject the most relevant R&D records
+    context, rnd_sources = None, None
+    last_message = conversation.last_text
+    if use_rnd_context and last_message:
+        with tracer.span("chat.retrieval") as span:
+            try:
+                await sync_rnd_indexes()
+                context, rnd_sources = rnd_retrieval.build_context(last_message)
+                span.set_attribute("records", len(rnd_sources))
+            except Exception as e:
+                logger.warning(f"R&D retrieval failed, continuing without context: {e}")
+    
+    ai_service = await services.aget("ai_service")
+    model_id, routed_model = model, None
+    if model_id == AUTO_MODEL_ID:
+        # Classified locally: cheapest adequate model for this request
+        decision = ai_service.auto_route(conversation, context)
+        model_id = routed_model = decision.model_id
+        tracer.current_span().set_attribute("chat.routed_model", routed_model)
+    response = await ai_service.chat(conversation, model_id, context=context, priority=priority,
+                                     feature=feature or ("rnd-chat" if context else "chat"))
+    return response, routed_model, rnd_sources
+
 # Chat endpoint - Main AI functionality
 @api_router.post("/chat", response_model=ChatResponse)
+@traced("server.chat")
 async def chat(request: ChatRequest):
     """
     Send a message to ChatHDI and get AI-powered response
@@ -361,30 +505,23 @@ async def chat(request: ChatRequest):
     - hdi-4-mini: GPT-4o-mini (faster)
     - hdi-vision: Claude (best analysis)
     - hdi-code: Claude (best for code)
+    - hdi-auto: picks one of the above per request (model_router.py)
     """
+    tracer.current_span().set_attribute("chat.model", request.model)
     try:
-        # Convert messages to dict format
-        messages = [{"role": msg.role, "content": msg.content} for msg in request.messages]
-        
-        # Get last user message
-        last_message = ""
-        if messages:
-            raw_content = messages[-1]["content"]
-            if isinstance(raw_content, str):
-                last_message = raw_content
-            elif isinstance(raw_content, list):
-                # Extract text from multimodal content
-                for part in raw_content:
-                    if isinstance(part, dict) and part.get("type") == "text":
-                        last_message += part.get("text", "") + " "
-                last_message = last_message.strip()
+        media_service = await services.aget("media_service")
+        with tracer.span("chat.convert_messages", count=len(request.messages)):
+            # Normalised once; providers encode it on demand (chat_messages.py)
+            conversation = ChatHistory.of(request.messages)
+            last_message = conversation.last_text
         
         # Check if user is requesting media generation
         # Skip detection if message is very long (likely contains RAG context) to prevent false positives
-        if len(last_message) > 500:
-             media_type, media_prompt = None, None
-        else:
-             media_type, media_prompt = media_service.detect_media_request(last_message)
+        with tracer.span("chat.detect_media"):
+            if len(last_message) > 500:
+                 media_type, media_prompt = None, None
+            else:
+                 media_type, media_prompt = media_service.detect_media_request(last_message)
         
         # Override detection if specific media model is selected
         logger.info(f"[CHAT] Received model: {request.model}")
@@ -400,6 +537,12 @@ async def chat(request: ChatRequest):
             # Generate image using Hugging Face
             result = await media_service.generate_image(media_prompt, request.model)
             if result['success']:
+                # The frontend saves the references with the conversation: keep them out of the LRU cache
+                if result.get('media'):
+                    try:
+                        await media_store.pin(result['media'])
+                    except PinnedStoreFull as e:
+                        logger.warning(f"Generated image stays in the media cache only: {e}")
                 return ChatResponse(
                     response=f"🎨 Gambar berhasil dibuat!\n\nPrompt: \"{media_prompt[:100]}{'...' if len(media_prompt) > 100 else ''}\"",
                     model=result['model'],
@@ -421,7 +564,7 @@ async def chat(request: ChatRequest):
                     response=f"Saya telah membuat video berdasarkan permintaan: \"{media_prompt}\"",
                     model=result['model'],
                     media_type="video",
-                    media_data=[result['video_base64']]
+                    media_data=await media_store.references([result['video_base64']])
                 )
             else:
                 # Fallback to text response
@@ -433,8 +576,9 @@ async def chat(request: ChatRequest):
                 )
         
         # Regular text chat
-        response = await ai_service.chat(messages, request.model)
-        return ChatResponse(response=response, model=request.model)
+        response, routed_model, rnd_sources = await text_chat(conversation, request.model, request.use_rnd_context)
+        return ChatResponse(response=response, model=request.model, rnd_sources=rnd_sources or None,
+                            routed_model=routed_model)
         
     except Exception as e:
         logger.error(f"Chat error: {e}")
@@ -444,11 +588,58 @@ async def chat(request: ChatRequest):
         )
 
 
+# Batch chat - evaluation sets of questions (see chat_batch.py)
+@api_router.post("/chat/batch")
+async def chat_batch(request: Request, batch_id: Optional[str] = None, models: Optional[str] = None):
+    """
+    Answer a JSONL body of questions concurrently, streaming JSONL results as they complete
+    
+    batch_id: repeat it (X-Batch-Id response header) to resume - stored answers are replayed
+    models: comma-separated MODEL_MAPPING ids, each line is asked every model
+    """
+    batch_id = batch_id or uuid.uuid4().hex
+    if not BATCH_ID_PATTERN.match(batch_id):
+        raise HTTPException(status_code=422, detail="batch_id may only contain letters, digits, '-' and '_'")
+    model_list = [m.strip() for m in models.split(",") if m.strip()] if models else None
+    items, errors = parse_batch((await request.body()).decode("utf-8"), model_list)
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch may have at most {BATCH_MAX_ITEMS} questions")
+    
+    async def answer(messages, model, use_rnd_context):
+        response, routed_model, rnd_sources = await text_chat(
+            ChatHistory.of(messages), model, use_rnd_context, Priority.BATCH, "batch")
+        extra = {"routed_model": routed_model} if routed_model else {}
+        if rnd_sources:
+            extra["rnd_sources"] = rnd_sources
+        return response, extra
+    
+    async def results():
+        for error in errors:
+            yield json.dumps(error, ensure_ascii=False) + "\n"
+        async for result in chat_batches.run(batch_id, items, answer):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    logger.info(f"Batch {batch_id}: {len(items)} questions")
+    return StreamingResponse(results(), media_type="application/x-ndjson",
+                             headers={"X-Batch-Id": batch_id, "X-Accel-Buffering": "no"})
+
+@api_router.get("/chat/batch/{batch_id}")
+async def chat_batch_results(batch_id: str):
+    """Answers stored so far for a batch (JSONL)"""
+    if not BATCH_ID_PATTERN.match(batch_id):
+        raise HTTPException(status_code=422, detail="Invalid batch_id")
+    stored = await asyncio.to_thread(chat_batches.stored, batch_id)
+    if not stored:
+        raise HTTPException(status_code=404, detail=f"Batch {batch_id} not found")
+    return Response("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in stored.values()),
+                    media_type="application/x-ndjson")
+
 # Dedicated Image Generation Endpoint
 @api_router.post("/generate/image")
 async def generate_image(request: ImageGenRequest):
     """Generate image using DALL-E"""
     try:
+        media_service = await services.aget("media_service")
         result = await media_service.generate_image(request.prompt, request.model)
         return result
     except Exception as e:
@@ -461,6 +652,7 @@ async def generate_image(request: ImageGenRequest):
 async def generate_video(request: VideoGenRequest):
     """Generate video (requires special API access)"""
     try:
+        media_service = await services.aget("media_service")
         result = await media_service.generate_video(request.prompt, request.model)
         return result
     except Exception as e:
@@ -468,13 +660,45 @@ async def generate_video(request: VideoGenRequest):
         return {"success": False, "error": str(e)}
 
 
+# Generated media by content hash (media_store.py); the hash is the ETag, so the bytes never change
+@api_router.get("/media/{media_hash}")
+async def get_media(media_hash: str, request: Request):
+    path = await media_store.open_blob(media_hash)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Media tidak ditemukan")
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{media_hash}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=await media_store.media_type(path), headers=headers)
+
+
+# Files built in the browser (PPTX) are uploaded once; the conversation saves only the returned reference
+@api_router.post("/media")
+async def upload_media(file: UploadFile = File(...)):
+    data = await file.read(int(MEDIA_UPLOAD_MB * 1024 * 1024) + 1)
+    if len(data) > MEDIA_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"File melebihi batas {MEDIA_UPLOAD_MB:g} MB")
+    if upload_media_type(data) is None:
+        raise HTTPException(status_code=415, detail="Hanya gambar atau file PPTX yang didukung")
+    try:
+        (media_hash,) = await media_store.store([data])
+    except PinnedStoreFull as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    return {"id": media_hash, "url": media_url(media_hash)}
+
+
 # PPTX Generation Endpoint
 @api_router.post("/generate/pptx")
 async def generate_pptx(request: PPTXRequest):
     """Generate PowerPoint presentation from topic using AI"""
-    if not PPTX_AVAILABLE:
+    try:
+        pptx_service = await services.aget("pptx_service")
+    except ImportError:
+        # python-pptx missing
+        logger.warning("PPTX service not available")
         return {"success": False, "error": "PPTX service not available"}
     try:
+        ai_service = await services.aget("ai_service")
         result = await pptx_service.generate_from_topic(request.topic, ai_service)
         return result
     except Exception as e:
@@ -484,20 +708,87 @@ async def generate_pptx(request: PPTXRequest):
 
 # ============ R&D DATABASE ENDPOINTS ============
 
+async def find_rnd(collection: str, equals: Optional[Dict] = None, ranges: Optional[Dict] = None) -> List[Dict]:
+    """Query an R&D collection from the state store, skipping unset filters"""
+    equals = {k: v for k, v in (equals or {}).items() if v is not None}
+    ranges = {k: r for k, r in (ranges or {}).items() if r != (None, None)}
+    return await state_store.rnd_find(collection, equals, ranges)
+
+
+# Data version the facet/search indexes reflect (shared state stores only)
+rnd_index_version: Optional[int] = None
+rnd_index_lock = asyncio.Lock()
+# When the shared data version was last read; reads within RND_VERSION_TTL skip the round trip
+rnd_version_checked = float("-inf")
+
+
+async def sync_rnd_indexes():
+    """Rebuild facet and search indexes if another worker changed the shared R&D data"""
+    global rnd_index_version, rnd_version_checked
+    if not state_store.shared or time.monotonic() - rnd_version_checked < RND_VERSION_TTL:
+        return
+    async with rnd_index_lock:
+        if time.monotonic() - rnd_version_checked < RND_VERSION_TTL:
+            return
+        version = await state_store.rnd_version()
+        rnd_version_checked = time.monotonic()
+        if version == rnd_index_version:
+            return
+        collections = {name: await state_store.rnd_find(name, limit=None) for name in COLLECTION_KEYS}
+        facet_index.rebuild(collections)
+        rnd_retrieval.rebuild(collections)
+        rnd_index_version = version
+        logger.info(f"R&D indexes rebuilt at data version {version}")
+
+
+# Public collection name -> (storage collection, model)
+RND_COLLECTIONS = {
+    "papers": ("rnd_papers", ResearchPaper),
+    "equipment": ("rnd_equipment", LabEquipment),
+    "materials": ("rnd_materials", Material),
+    "institutions": ("rnd_institutions", Institution),
+}
+
+
+def resolve_rnd_collection(kind: str):
+    if kind not in RND_COLLECTIONS or RND_COLLECTIONS[kind][1] is None:
+        raise HTTPException(status_code=404, detail=f"Unknown R&D collection: {kind}")
+    return RND_COLLECTIONS[kind]
+
+
+def record_rnd_change(collection: str, op: str, doc_id: str, version: int,
+                      old_doc: Optional[Dict] = None, new_doc: Optional[Dict] = None):
+    """Keep facets and search indexes in sync and publish to the change feed"""
+    global rnd_index_version, rnd_version_checked
+    if state_store.shared:
+        if rnd_index_version is None or version != rnd_index_version + 1:
+            # Another worker wrote in between - sync_rnd_indexes rebuilds on the next read
+            rnd_version_checked = float("-inf")
+            return
+        rnd_index_version = version
+    
+    if op == "insert":
+        facet_index.record_insert(collection, new_doc)
+        rnd_retrieval.record_upsert(collection, new_doc)
+    elif op == "update":
+        facet_index.record_update(collection, old_doc, new_doc)
+        rnd_retrieval.record_upsert(collection, new_doc)
+    elif op == "delete":
+        facet_index.record_delete(collection, old_doc)
+        rnd_retrieval.record_delete(collection, doc_id)
+    # Shared stores feed /rnd/changes from the database (change log / change streams)
+    if not state_store.shared:
+        change_feed.publish(collection, op, doc_id, new_doc)
+
+
 @api_router.get("/rnd/all")
 async def get_all_rnd_data():
     """Get all R&D database data"""
     try:
-        if USE_MONGODB and db:
-            papers = await db.rnd_papers.find({}, {"_id": 0}).to_list(1000)
-            equipment = await db.rnd_equipment.find({}, {"_id": 0}).to_list(1000)
-            materials = await db.rnd_materials.find({}, {"_id": 0}).to_list(1000)
-            institutions = await db.rnd_institutions.find({}, {"_id": 0}).to_list(1000)
-        else:
-            papers = in_memory_db["rnd_papers"]
-            equipment = in_memory_db["rnd_equipment"]
-            materials = in_memory_db["rnd_materials"]
-            institutions = in_memory_db["rnd_institutions"]
+        papers = await find_rnd("rnd_papers")
+        equipment = await find_rnd("rnd_equipment")
+        materials = await find_rnd("rnd_materials")
+        institutions = await find_rnd("rnd_institutions")
         
         return {
             "papers": papers,
@@ -513,43 +804,179 @@ async def get_all_rnd_data():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@api_router.get("/rnd/papers")
-async def get_papers():
-    """Get all research papers"""
-    if USE_MONGODB and db:
-        papers = await db.rnd_papers.find({}, {"_id": 0}).to_list(1000)
+@api_router.get("/rnd/facets")
+async def get_rnd_facets():
+    """Get per-category, country, year, status and hazard counts for the R&D database"""
+    try:
+        if state_store.name == "mongo":
+            facets = await facet_index.mongo_snapshot(db)
+        else:
+            await sync_rnd_indexes()
+            facets = facet_index.snapshot()
+        return {
+            **facets,
+            "categories": CATEGORIES,
+            "countries": COUNTRIES,
+        }
+    except Exception as e:
+        logger.error(f"Get RnD facets error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@api_router.get("/rnd/changes")
+async def get_rnd_changes(
+    request: Request,
+    collections: Optional[str] = None,
+    resume_token: Optional[str] = None,
+    last_event_id: Optional[str] = Header(default=None)
+):
+    """
+    Live feed of R&D Database inserts/updates/deletes (Server-Sent Events)
+    
+    collections: comma-separated list (papers, equipment, materials, institutions), default all
+    resume_token / Last-Event-ID: resume after the last event received
+    """
+    kinds = [k.strip() for k in collections.split(",")] if collections else list(RND_COLLECTIONS)
+    names = [resolve_rnd_collection(kind)[0] for kind in kinds]
+    token = resume_token or last_event_id
+    
+    if state_store.name == "mongo":
+        events = change_feed.watch_mongo(db, names, token)
+    elif state_store.shared:
+        events = change_feed.watch_store(state_store, names, token)
     else:
-        papers = in_memory_db["rnd_papers"]
+        events = change_feed.subscribe(names, token)
+    
+    async def event_stream():
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    break
+                if event is not None and event.get("collection"):
+                    event = {**event, "collection": COLLECTION_KEYS[event["collection"]]}
+                yield format_sse(event)
+        except Exception as e:
+            logger.error(f"R&D change feed error: {e}")
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@api_router.post("/rnd/{kind}")
+async def create_rnd_item(kind: str, item: Dict[str, Any]):
+    """Add a record to an R&D collection (papers, equipment, materials, institutions)"""
+    collection, model = resolve_rnd_collection(kind)
+    try:
+        doc = model(**item).model_dump(mode="json")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    # Replacing a record is a PATCH; a POST never overwrites (facets would count it twice)
+    try:
+        version = await state_store.rnd_insert(collection, doc)
+    except DuplicateRecord:
+        raise HTTPException(status_code=409, detail=f"{kind} item {doc['id']} already exists")
+    record_rnd_change(collection, "insert", doc["id"], version, new_doc=doc)
+    return doc
+
+
+@api_router.patch("/rnd/{kind}/{item_id}")
+async def update_rnd_item(kind: str, item_id: str, changes: Dict[str, Any]):
+    """Update fields of an R&D record, e.g. {"status": "Maintenance"} for lab equipment"""
+    collection, model = resolve_rnd_collection(kind)
+    changes = {k: v for k, v in changes.items() if k not in ("id", "_id", "created_at")}
+    
+    old_doc = await state_store.rnd_get(collection, item_id)
+    if old_doc is None:
+        raise HTTPException(status_code=404, detail=f"{kind} item {item_id} not found")
+    
+    changes["updated_at"] = datetime.now(timezone.utc).isoformat()
+    try:
+        new_doc = model(**{**old_doc, **changes}).model_dump(mode="json")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    changes = {k: new_doc[k] for k in changes if k in new_doc}
+    
+    result = await state_store.rnd_update(collection, item_id, changes)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"{kind} item {item_id} not found")
+    old_doc, new_doc, version = result
+    record_rnd_change(collection, "update", item_id, version, old_doc=old_doc, new_doc=new_doc)
+    return new_doc
+
+
+@api_router.delete("/rnd/{kind}/{item_id}")
+async def delete_rnd_item(kind: str, item_id: str):
+    """Delete an R&D record"""
+    collection, _ = resolve_rnd_collection(kind)
+    result = await state_store.rnd_delete(collection, item_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"{kind} item {item_id} not found")
+    old_doc, version = result
+    record_rnd_change(collection, "delete", item_id, version, old_doc=old_doc)
+    return {"success": True, "id": item_id}
+
+
+@api_router.get("/rnd/papers")
+async def get_papers(
+    category: Optional[str] = None,
+    country: Optional[str] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None
+):
+    """Get research papers, optionally filtered by category, country and year range"""
+    papers = await find_rnd(
+        "rnd_papers",
+        {"category": category, "country": country},
+        {"year": (year_from, year_to)}
+    )
     return {"papers": papers, "count": len(papers)}
 
 
+@api_router.get("/rnd/papers/{paper_id}/similar")
+async def get_similar_papers(paper_id: str, limit: int = 5):
+    """Get research papers related to a paper (TF-IDF over title, abstract and keywords)"""
+    limit = max(1, min(limit, 50))
+    await sync_rnd_indexes()
+    
+    results = paper_index.similar(paper_id, limit)
+    if results is None:
+        raise HTTPException(status_code=404, detail=f"Paper {paper_id} not found")
+    
+    similar = [{**paper, "score": score} for paper, score in results]
+    return {"paper_id": paper_id, "similar": similar, "count": len(similar)}
+
+
 @api_router.get("/rnd/equipment")
-async def get_equipment():
-    """Get all lab equipment"""
-    if USE_MONGODB and db:
-        equipment = await db.rnd_equipment.find({}, {"_id": 0}).to_list(1000)
-    else:
-        equipment = in_memory_db["rnd_equipment"]
+async def get_equipment(
+    category: Optional[str] = None,
+    country: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Get lab equipment, optionally filtered by category, country and status"""
+    equipment = await find_rnd(
+        "rnd_equipment",
+        {"category": category, "country": country, "status": status}
+    )
     return {"equipment": equipment, "count": len(equipment)}
 
 
 @api_router.get("/rnd/materials")
-async def get_materials():
-    """Get all materials"""
-    if USE_MONGODB and db:
-        materials = await db.rnd_materials.find({}, {"_id": 0}).to_list(1000)
-    else:
-        materials = in_memory_db["rnd_materials"]
+async def get_materials(category: Optional[str] = None, country: Optional[str] = None):
+    """Get materials, optionally filtered by category and country"""
+    materials = await find_rnd("rnd_materials", {"category": category, "country": country})
     return {"materials": materials, "count": len(materials)}
 
 
 @api_router.get("/rnd/institutions")
-async def get_institutions():
-    """Get all institutions"""
-    if USE_MONGODB and db:
-        institutions = await db.rnd_institutions.find({}, {"_id": 0}).to_list(1000)
-    else:
-        institutions = in_memory_db["rnd_institutions"]
+async def get_institutions(type: Optional[str] = None, country: Optional[str] = None):
+    """Get institutions, optionally filtered by type and country"""
+    institutions = await find_rnd("rnd_institutions", {"type": type, "country": country})
     return {"institutions": institutions, "count": len(institutions)}
 
 
@@ -559,6 +986,7 @@ async def get_institutions():
 async def get_master_prompts():
     """Get all master prompt engineering templates"""
     try:
+        media_service = await services.aget("media_service")
         default_prompts = media_service.get_master_prompts()
         return {"prompts": list(default_prompts.values()), "source": "default"}
     except Exception as e:
@@ -570,6 +998,8 @@ async def get_master_prompts():
 # Include the router in the main app
 app.include_router(api_router)
 
+services.app_import_seconds = round(time.perf_counter() - IMPORT_STARTED, 4)
+
 if __name__ == "__main__":
     import uvicorn
     # Use 0.0.0.0 to allow access from other machines if needed, or 127.0.0.1 for local only
@@ -0,0 +1,197 @@
+"""
+Service Loader for ChatHDI - heavy services are imported on first use
+ai_service (google.generativeai, openai), media_service (huggingface_hub),
+document_service (PyPDF2, python-docx, pandas) and pptx_service (python-pptx)
+take seconds to import, which used to delay the desktop exe's first
+response. server.py now asks this loader for them instead: imports run in a
+worker thread (so the event loop keeps answering /api/health), either when
+an endpoint first needs a service or in the background warm-up started from
+`lifespan`. After importing a service the warm-up also calls its
+`warm_up()` (provider connections, Gemini models, PPTX template, parser
+libraries); /api/ready reports 503 until all of that has finished, and
+keeps reporting 503 while a service failed to import. Warm-up steps that
+failed (e.g. a provider that is down) are listed by /api/ready but do not
+block readiness. Import and warm-up times are kept for the /api/startup
+report.
+
+The loaders use plain `from x import y` statements so PyInstaller still
+finds the modules. Print a report with:
+    python service_loader.py
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Import every service in the background once the server is accepting requests
+SERVICE_WARMUP = os.environ.get('SERVICE_WARMUP', 'true').lower() in ('1', 'true', 'yes')
+# Upper bound for each network step of the warm-up (provider connections)
+WARMUP_TIMEOUT = float(os.environ.get('WARMUP_TIMEOUT', '10'))
+
+
+def _load_ai_service():
+    from ai_service import ai_service
+    return ai_service
+
+
+def _load_media_service():
+    from media_service import media_service
+    return media_service
+
+
+def _load_document_service():
+    from document_service import document_service
+    return document_service
+
+
+def _load_pptx_service():
+    from pptx_service import pptx_service
+    return pptx_service
+
+
+# Warm-up order: chat first, then what the chat page uses next
+LOADERS: Dict[str, Callable[[], Any]] = {
+    "ai_service": _load_ai_service,
+    "media_service": _load_media_service,
+    "document_service": _load_document_service,
+    "pptx_service": _load_pptx_service,
+}
+
+
+class ServiceLoader:
+    """Imports services once, off the event loop, and records how long it took"""
+
+    def __init__(self, loaders: Dict[str, Callable[[], Any]]):
+        self.loaders = loaders
+        self.services: Dict[str, Any] = {}
+        self.imports: Dict[str, Dict] = {}
+        self.app_import_seconds: Optional[float] = None
+        # Flipped once the warm-up has finished (or at startup when it is disabled)
+        self.warmed_up = False
+        self.warmup_seconds: Optional[float] = None
+        # Service -> import error; service.step -> failed warm-up step status
+        self.import_failures: Dict[str, str] = {}
+        self.warmup_failures: Dict[str, str] = {}
+        self._locks = {name: threading.Lock() for name in loaders}
+
+    def loaded(self, name: str) -> bool:
+        return name in self.services
+
+    @property
+    def ready(self) -> bool:
+        """Warm-up finished and every service imported"""
+        return self.warmed_up and not self.import_failures
+
+    def get(self, name: str, trigger: str = "first use") -> Any:
+        """Return a service, importing it in the calling thread if needed"""
+        service = self.services.get(name)
+        if service is not None:
+            return service
+        with self._locks[name]:
+            if name in self.services:
+                return self.services[name]
+            modules_before = len(sys.modules)
+            start = time.perf_counter()
+            try:
+                service = self.loaders[name]()
+            except Exception as e:
+                self.imports[name] = {"loaded": False, "error": str(e), "trigger": trigger,
+                                      "seconds": round(time.perf_counter() - start, 4)}
+                self.import_failures[name] = str(e)
+                raise
+            seconds = time.perf_counter() - start
+            self.imports[name] = {
+                "loaded": True,
+                "trigger": trigger,
+                "seconds": round(seconds, 4),
+                "modules": len(sys.modules) - modules_before,
+            }
+            self.services[name] = service
+            self.import_failures.pop(name, None)
+            logger.info(f"Loaded {name} in {seconds:.2f}s ({trigger})")
+            return service
+
+    async def aget(self, name: str) -> Any:
+        """Return a service, importing it in a worker thread if needed"""
+        service = self.services.get(name)
+        if service is not None:
+            return service
+        return await asyncio.to_thread(self.get, name)
+
+    async def warm_up(self, names: Optional[List[str]] = None, timeout: float = WARMUP_TIMEOUT):
+        """Import and warm services one by one in the background; failures are recorded"""
+        start = time.perf_counter()
+        for name in names or list(self.loaders):
+            try:
+                service = self.services.get(name) or await asyncio.to_thread(self.get, name, "warm-up")
+            except Exception as e:
+                logger.warning(f"Warm-up could not load {name}: {e}")
+                continue
+            if hasattr(service, "warm_up"):
+                await self._warm_service(name, service, timeout)
+        self.warmup_seconds = round(time.perf_counter() - start, 4)
+        self.warmed_up = True
+        if self.import_failures:
+            logger.error(f"Service warm-up finished in {self.warmup_seconds:.2f}s, "
+                         f"not ready: {', '.join(self.import_failures)} failed to import")
+        else:
+            logger.info(f"Service warm-up finished in {self.warmup_seconds:.2f}s")
+
+    async def _warm_service(self, name: str, service: Any, timeout: float):
+        start = time.perf_counter()
+        try:
+            steps = await service.warm_up(timeout)
+        except Exception as e:
+            steps = {"warm_up": f"error: {e}"}
+        for step, status in steps.items():
+            if status != "ok":
+                self.warmup_failures[f"{name}.{step}"] = status
+                logger.warning(f"Warm-up of {name}: {step} {status}")
+        self.imports[name]["warm_up"] = {"seconds": round(time.perf_counter() - start, 4), "steps": steps}
+
+    def report(self) -> Dict:
+        return {
+            "app_import_seconds": self.app_import_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "ready": self.ready,
+            "failures": {**self.import_failures, **self.warmup_failures},
+            "services": {
+                name: self.imports.get(name, {"loaded": False}) for name in self.loaders
+            },
+        }
+
+
+# Singleton instance
+services = ServiceLoader(LOADERS)
+
+
+def main():
+    """Time a cold server import followed by every service import and warm-up"""
+    logging.disable(logging.WARNING)
+    start = time.perf_counter()
+    import server  # noqa: F401
+    services.app_import_seconds = services.app_import_seconds or time.perf_counter() - start
+    for name in LOADERS:
+        try:
+            services.get(name, "report")
+        except Exception as e:
+            print(f"{name}: failed to import ({e})")
+    asyncio.run(services.warm_up())
+
+    report = services.report()
+    print(f"{'server (app import)':<22} {report['app_import_seconds']:>7.3f}s")
+    for name, entry in report["services"].items():
+        if entry.get("loaded"):
+            warm = entry.get("warm_up", {})
+            print(f"{name:<22} {entry['seconds']:>7.3f}s  {entry['modules']:>5} modules"
+                  + (f"  warm-up {warm['seconds']:.3f}s {warm['steps']}" if warm else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Single-flight for ChatHDI - identical in-flight requests share one upstream call
+When many users click the same WelcomeScreen suggestion at once, every click
+used to become its own provider call. A SingleFlight group runs the first
+call for a key and lets every identical call that arrives while it is still
+running wait for the same result. Nothing is cached: once the call has
+finished the next request for that key goes upstream again.
+
+Used by AIService.chat, MediaService.generate_image and
+PPTXService.generate_from_topic. Disable with SINGLE_FLIGHT=false.
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict
+from metrics import SINGLE_FLIGHT_SHARED
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT = os.environ.get('SINGLE_FLIGHT', 'true').lower() in ('1', 'true', 'yes')
+
+
+def request_key(*parts: Any) -> str:
+    """Stable hash of a request's parameters (messages, model, prompt ...)"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one"""
+
+    def __init__(self, kind: str, enabled: bool = SINGLE_FLIGHT):
+        self.kind = kind
+        self.enabled = enabled
+        self.calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await call()
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            SINGLE_FLIGHT_SHARED.labels(kind=self.kind).inc()
+            logger.info(f"Joined in-flight {self.kind} call")
+        # A waiter that goes away must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
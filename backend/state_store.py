@@ -0,0 +1,650 @@
+"""
+State Store for ChatHDI - where conversations, status checks and R&D data live
+- memory: per-process (R&D in ColumnarCollection, conversations in a JSON file);
+          the desktop app and single-worker default
+- sqlite: one WAL-mode database file shared by every worker on the host,
+          e.g. `uvicorn server:app --workers 4` with STATE_BACKEND=sqlite
+- mongo:  MongoDB (used automatically when MONGO_URL is configured)
+
+Shared backends (sqlite, mongo) expose a data version that bumps on every
+R&D write, so each worker can tell when its facet and search indexes were
+made stale by another worker. The sqlite backend also keeps a change log
+that feeds /api/rnd/changes across workers.
+"""
+
+import os
+import abc
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.environ.get('STATE_BACKEND', '').lower()
+STATE_DB_PATH = os.environ.get('STATE_DB_PATH', '')
+
+# Change-log entries kept for resuming /api/rnd/changes clients (sqlite)
+CHANGE_LOG_RETENTION = 10000
+# Usage rows: key columns and the counters added up per key (see usage.py)
+USAGE_KEY = ("day", "provider", "model_id", "model", "feature")
+USAGE_COUNTERS = ("calls", "metered_calls", "prompt_tokens", "completion_tokens", "latency_seconds", "cost_usd")
+# Cap for list queries, matching the previous MongoDB `to_list(1000)`
+LIST_LIMIT = 1000
+# Seconds a worker trusts its last read of the shared R&D data version (other
+# workers' writes show up in its facets/search within this time)
+RND_VERSION_TTL = float(os.environ.get('RND_VERSION_TTL', '1.0'))
+
+Ranges = Dict[str, Tuple[Any, Any]]
+
+
+class DuplicateRecord(Exception):
+    """rnd_insert of an id that already exists in the collection"""
+
+    def __init__(self, collection: str, doc_id: str):
+        super().__init__(f"{collection} already has a record with id {doc_id}")
+        self.collection = collection
+        self.doc_id = doc_id
+
+
+class StateStore(abc.ABC):
+    """Interface shared by every backend"""
+
+    name = "base"
+    # True when several processes see the same data
+    shared = False
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # ---------- conversations ----------
+
+    @abc.abstractmethod
+    async def list_conversations(self) -> List[Dict]:
+        """Saved conversations, newest first"""
+
+    @abc.abstractmethod
+    async def save_conversation(self, conversation: Dict) -> Dict:
+        """Insert (at the top of the list) or replace a conversation"""
+
+    @abc.abstractmethod
+    async def delete_conversation(self, conversation_id: str):
+        """Delete a conversation (no error if it is missing)"""
+
+    # ---------- status checks ----------
+
+    @abc.abstractmethod
+    async def add_status_check(self, doc: Dict):
+        """Store a status check"""
+
+    @abc.abstractmethod
+    async def list_status_checks(self) -> List[Dict]:
+        """Stored status checks"""
+
+    # ---------- usage (usage.py) ----------
+
+    @abc.abstractmethod
+    async def add_usage(self, rows: List[Dict]):
+        """Add counters to the (day, provider, model_id, model, feature) rows"""
+
+    @abc.abstractmethod
+    async def list_usage(self, since_day: str) -> List[Dict]:
+        """Usage rows from `since_day` (YYYY-MM-DD) on"""
+
+    # ---------- R&D database ----------
+
+    @abc.abstractmethod
+    async def rnd_find(self, collection: str, equals: Optional[Dict] = None,
+                       ranges: Optional[Ranges] = None, limit: Optional[int] = LIST_LIMIT) -> List[Dict]:
+        """Records matching exact values and inclusive (low, high) ranges; limit=None returns all"""
+
+    @abc.abstractmethod
+    async def rnd_get(self, collection: str, doc_id: str) -> Optional[Dict]:
+        """A record by id, None if missing"""
+
+    @abc.abstractmethod
+    async def rnd_insert(self, collection: str, doc: Dict) -> int:
+        """Store a new record (DuplicateRecord if the id exists); returns the new data version"""
+
+    @abc.abstractmethod
+    async def rnd_update(self, collection: str, doc_id: str, changes: Dict) -> Optional[Tuple[Dict, Dict, int]]:
+        """Apply a partial update; returns (old_doc, new_doc, version) or None if missing"""
+
+    @abc.abstractmethod
+    async def rnd_delete(self, collection: str, doc_id: str) -> Optional[Tuple[Dict, int]]:
+        """Delete a record; returns (old_doc, version) or None if missing"""
+
+    @abc.abstractmethod
+    async def rnd_version(self) -> int:
+        """Counter that changes whenever any process writes R&D data"""
+
+
+# ============ MEMORY ============
+
+class MemoryStateStore(StateStore):
+    """Per-process state (the original demo/desktop behaviour)"""
+
+    name = "memory"
+
+    def __init__(self, collections: Dict, conversations_file: Path):
+        self.collections = collections
+        self.conversations_file = conversations_file
+        self.version = 0
+        self.usage: Dict[Tuple, Dict] = {}
+        # Serialises read-modify-write of the conversations file within this process
+        self._conversations_lock = asyncio.Lock()
+
+    def _load_conversations(self) -> List[Dict]:
+        try:
+            if self.conversations_file.exists():
+                with open(self.conversations_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            return []
+        except Exception as e:
+            logger.error(f"Error loading conversations: {e}")
+            return []
+
+    def _save_conversations(self, conversations: List[Dict]) -> bool:
+        try:
+            with open(self.conversations_file, 'w', encoding='utf-8') as f:
+                json.dump(conversations, f, default=str)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving conversations: {e}")
+            return False
+
+    async def list_conversations(self) -> List[Dict]:
+        return self._load_conversations()
+
+    async def save_conversation(self, conversation: Dict) -> Dict:
+        async with self._conversations_lock:
+            conversations = self._load_conversations()
+            existing_idx = next((i for i, c in enumerate(conversations) if c['id'] == conversation['id']), -1)
+            if existing_idx >= 0:
+                conversations[existing_idx] = conversation
+            else:
+                conversations.insert(0, conversation)  # Add to top
+            self._save_conversations(conversations)
+        return conversation
+
+    async def delete_conversation(self, conversation_id: str):
+        async with self._conversations_lock:
+            conversations = self._load_conversations()
+            self._save_conversations([c for c in conversations if c['id'] != conversation_id])
+
+    async def add_status_check(self, doc: Dict):
+        self.collections["status_checks"].append(doc)
+
+    async def list_status_checks(self) -> List[Dict]:
+        return self.collections["status_checks"]
+
+    async def add_usage(self, rows):
+        for row in rows:
+            key = tuple(row[name] for name in USAGE_KEY)
+            stored = self.usage.setdefault(key, {name: row[name] for name in USAGE_KEY})
+            for name in USAGE_COUNTERS:
+                stored[name] = stored.get(name, 0) + row[name]
+
+    async def list_usage(self, since_day):
+        return [dict(row) for row in self.usage.values() if row["day"] >= since_day]
+
+    async def rnd_find(self, collection, equals=None, ranges=None, limit=LIST_LIMIT):
+        store = self.collections[collection]
+        if not equals and not ranges:
+            return store.to_list()
+        return store.find(equals, ranges)
+
+    async def rnd_get(self, collection, doc_id):
+        row = self.collections[collection].get(doc_id)
+        return row.to_dict() if row is not None else None
+
+    async def rnd_insert(self, collection, doc):
+        if self.collections[collection].get(doc["id"]) is not None:
+            raise DuplicateRecord(collection, doc["id"])
+        self.collections[collection].insert(doc)
+        self.version += 1
+        return self.version
+
+    async def rnd_update(self, collection, doc_id, changes):
+        result = self.collections[collection].update(doc_id, changes)
+        if result is None:
+            return None
+        self.version += 1
+        return result[0], result[1], self.version
+
+    async def rnd_delete(self, collection, doc_id):
+        old_doc = self.collections[collection].delete(doc_id)
+        if old_doc is None:
+            return None
+        self.version += 1
+        return old_doc, self.version
+
+    async def rnd_version(self) -> int:
+        return self.version
+
+
+# ============ SQLITE ============
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS status_checks (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS rnd_records (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE TABLE IF NOT EXISTS rnd_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    op TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    doc TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    metered_calls INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    latency_seconds REAL NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, provider, model_id, model, feature)
+);
+"""
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Single-host shared state in one SQLite database (WAL journal)
+
+    WAL lets every worker read while one writes; writes take the database
+    lock with BEGIN IMMEDIATE and wait up to `busy_timeout` for it.
+    Queries run in the default thread pool, one connection per thread.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: Path, seed: Optional[Dict[str, List[Dict]]] = None,
+                 conversations_file: Optional[Path] = None, busy_timeout: float = 10.0):
+        self.path = Path(path)
+        self.seed = seed or {}
+        self.conversations_file = conversations_file
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []  # every thread's connection, closed by close()
+        self._ready = False
+        self._ready_lock = threading.Lock()
+
+    # ---------- connections ----------
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._ready_lock:
+                self._connections.append(conn)
+        if not self._ready:
+            self._initialize(conn)
+        return conn
+
+    def _initialize(self, conn: sqlite3.Connection):
+        """Create tables and seed empty collections (once per database)"""
+        with self._ready_lock:
+            if self._ready:
+                return
+            conn.executescript(SQLITE_SCHEMA)
+            with self._transaction(conn):
+                for collection, docs in self.seed.items():
+                    if conn.execute("SELECT 1 FROM rnd_records WHERE collection = ? LIMIT 1",
+                                    (collection,)).fetchone() is None:
+                        conn.executemany(
+                            "INSERT OR IGNORE INTO rnd_records (collection, id, data) VALUES (?, ?, ?)",
+                            [(collection, doc["id"], json.dumps(doc, default=str)) for doc in docs])
+                self._import_conversations(conn)
+            self._ready = True
+
+    def _import_conversations(self, conn: sqlite3.Connection):
+        """One-time import of an existing conversations.json into an empty table"""
+        if self.conversations_file is None or not self.conversations_file.exists():
+            return
+        if conn.execute("SELECT 1 FROM conversations LIMIT 1").fetchone() is not None:
+            return
+        try:
+            conversations = json.loads(self.conversations_file.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning(f"Could not import {self.conversations_file}: {e}")
+            return
+        # The file lists newest first; rowid order is oldest first
+        conn.executemany("INSERT OR IGNORE INTO conversations (id, data) VALUES (?, ?)",
+                         [(c["id"], json.dumps(c, default=str)) for c in reversed(conversations)])
+        logger.info(f"Imported {len(conversations)} conversations from {self.conversations_file}")
+
+    class _transaction:
+        """BEGIN IMMEDIATE ... COMMIT/ROLLBACK on an autocommit connection"""
+
+        def __init__(self, conn: sqlite3.Connection):
+            self.conn = conn
+
+        def __enter__(self):
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self.conn
+
+        def __exit__(self, exc_type, exc, tb):
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+            return False
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(lambda: func(self._connection(), *args))
+
+    async def open(self):
+        await self._run(lambda conn: None)
+        logger.info(f"SQLite state store: {self.path}")
+
+    async def close(self):
+        """Close the connections of every pool thread (not just the calling one)"""
+        with self._ready_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    # ---------- conversations ----------
+
+    async def list_conversations(self) -> List[Dict]:
+        def query(conn):
+            rows = conn.execute("SELECT data FROM conversations ORDER BY rowid DESC").fetchall()
+            return [json.loads(data) for (data,) in rows]
+        return await self._run(query)
+
+    async def save_conversation(self, conversation: Dict) -> Dict:
+        def upsert(conn):
+            conn.execute(
+                "INSERT INTO conversations (id, data) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+                (conversation["id"], json.dumps(conversation, default=str)))
+        await self._run(upsert)
+        return conversation
+
+    async def delete_conversation(self, conversation_id: str):
+        await self._run(lambda conn: conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,)))
+
+    # ---------- status checks ----------
+
+    async def add_status_check(self, doc: Dict):
+        await self._run(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO status_checks (id, data) VALUES (?, ?)", (doc["id"], json.dumps(doc, default=str))))
+
+    async def list_status_checks(self) -> List[Dict]:
+        def query(conn):
+            rows = conn.execute("SELECT data FROM status_checks ORDER BY rowid LIMIT ?", (LIST_LIMIT,)).fetchall()
+            return [json.loads(data) for (data,) in rows]
+        return await self._run(query)
+
+    # ---------- usage ----------
+
+    async def add_usage(self, rows):
+        columns = USAGE_KEY + USAGE_COUNTERS
+        sql = (f"INSERT INTO usage ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+               f"ON CONFLICT({', '.join(USAGE_KEY)}) DO UPDATE SET "
+               + ", ".join(f"{name} = {name} + excluded.{name}" for name in USAGE_COUNTERS))
+
+        def upsert(conn):
+            with self._transaction(conn):
+                conn.executemany(sql, [tuple(row[name] for name in columns) for row in rows])
+        await self._run(upsert)
+
+    async def list_usage(self, since_day):
+        def query(conn):
+            cursor = conn.execute("SELECT * FROM usage WHERE day >= ?", (since_day,))
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+        return await self._run(query)
+
+    # ---------- R&D database ----------
+
+    async def rnd_find(self, collection, equals=None, ranges=None, limit=LIST_LIMIT):
+        sql = ["SELECT data FROM rnd_records WHERE collection = ?"]
+        params: List[Any] = [collection]
+        for field, value in (equals or {}).items():
+            sql.append("AND json_extract(data, ?) = ?")
+            params += [f"$.{field}", value]
+        for field, (low, high) in (ranges or {}).items():
+            if low is not None:
+                sql.append("AND json_extract(data, ?) >= ?")
+                params += [f"$.{field}", low]
+            if high is not None:
+                sql.append("AND json_extract(data, ?) <= ?")
+                params += [f"$.{field}", high]
+        sql.append("ORDER BY rowid LIMIT ?")
+        params.append(-1 if limit is None else limit)
+
+        def query(conn):
+            return [json.loads(data) for (data,) in conn.execute(" ".join(sql), params).fetchall()]
+        return await self._run(query)
+
+    @staticmethod
+    def _get(conn, collection: str, doc_id: str) -> Optional[Dict]:
+        row = conn.execute("SELECT data FROM rnd_records WHERE collection = ? AND id = ?",
+                           (collection, doc_id)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def _log_change(conn, collection: str, op: str, doc_id: str, doc: Optional[Dict]) -> int:
+        cursor = conn.execute(
+            "INSERT INTO rnd_changes (collection, op, doc_id, doc, timestamp) VALUES (?, ?, ?, ?, ?)",
+            (collection, op, doc_id, json.dumps(doc, default=str) if doc is not None else None,
+             time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())))
+        seq = cursor.lastrowid
+        if seq % 500 == 0:
+            conn.execute("DELETE FROM rnd_changes WHERE seq <= ?", (seq - CHANGE_LOG_RETENTION,))
+        return seq
+
+    async def rnd_get(self, collection, doc_id):
+        return await self._run(self._get, collection, doc_id)
+
+    async def rnd_insert(self, collection, doc):
+        def insert(conn):
+            with self._transaction(conn):
+                try:
+                    conn.execute("INSERT INTO rnd_records (collection, id, data) VALUES (?, ?, ?)",
+                                 (collection, doc["id"], json.dumps(doc, default=str)))
+                except sqlite3.IntegrityError:
+                    raise DuplicateRecord(collection, doc["id"]) from None
+                return self._log_change(conn, collection, "insert", doc["id"], doc)
+        return await self._run(insert)
+
+    async def rnd_update(self, collection, doc_id, changes):
+        def update(conn):
+            with self._transaction(conn):
+                old_doc = self._get(conn, collection, doc_id)
+                if old_doc is None:
+                    return None
+                new_doc = {**old_doc, **changes}
+                conn.execute("UPDATE rnd_records SET data = ? WHERE collection = ? AND id = ?",
+                             (json.dumps(new_doc, default=str), collection, doc_id))
+                return old_doc, new_doc, self._log_change(conn, collection, "update", doc_id, new_doc)
+        return await self._run(update)
+
+    async def rnd_delete(self, collection, doc_id):
+        def delete(conn):
+            with self._transaction(conn):
+                old_doc = self._get(conn, collection, doc_id)
+                if old_doc is None:
+                    return None
+                conn.execute("DELETE FROM rnd_records WHERE collection = ? AND id = ?", (collection, doc_id))
+                return old_doc, self._log_change(conn, collection, "delete", doc_id, None)
+        return await self._run(delete)
+
+    async def rnd_version(self) -> int:
+        def query(conn):
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM rnd_changes").fetchone()[0]
+        return await self._run(query)
+
+    async def changes_since(self, seq: int, collections: List[str], limit: int = 500) -> Optional[List[Dict]]:
+        """Logged changes after `seq`, or None if some of them were already pruned"""
+        def query(conn):
+            oldest = conn.execute("SELECT MIN(seq) FROM rnd_changes").fetchone()[0]
+            if oldest is not None and oldest > seq + 1 and seq > 0:
+                return None
+            placeholders = ",".join("?" * len(collections))
+            rows = conn.execute(
+                f"SELECT seq, collection, op, doc_id, doc, timestamp FROM rnd_changes "
+                f"WHERE seq > ? AND collection IN ({placeholders}) ORDER BY seq LIMIT ?",
+                (seq, *collections, limit)).fetchall()
+            return [
+                {"token": str(row[0]), "collection": row[1], "op": row[2], "id": row[3],
+                 "doc": json.loads(row[4]) if row[4] else None, "timestamp": row[5]}
+                for row in rows
+            ]
+        return await self._run(query)
+
+
+# ============ MONGODB ============
+
+class MongoStateStore(StateStore):
+    """State in MongoDB (R&D collections, status_checks, conversations)"""
+
+    name = "mongo"
+    shared = True
+
+    def __init__(self, db, conversations_file: Optional[Path] = None, rnd_collections: Tuple[str, ...] = ()):
+        self.db = db
+        self.conversations_file = conversations_file
+        self.rnd_collections = rnd_collections
+
+    async def open(self):
+        await self.db.conversations.create_index("id", unique=True)
+        for collection in self.rnd_collections:
+            await self.db[collection].create_index("id", unique=True)
+        if self.conversations_file is None or not self.conversations_file.exists():
+            return
+        if await self.db.conversations.count_documents({}, limit=1):
+            return
+        try:
+            conversations = json.loads(self.conversations_file.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning(f"Could not import {self.conversations_file}: {e}")
+            return
+        # The file lists newest first
+        now = time.time()
+        docs = [{**c, "_created": now - i} for i, c in enumerate(conversations)]
+        if docs:
+            # Workers starting together may all get here: upserts make the import idempotent
+            from pymongo import UpdateOne
+            await self.db.conversations.bulk_write(
+                [UpdateOne({"id": doc["id"]}, {"$setOnInsert": doc}, upsert=True) for doc in docs], ordered=False)
+            logger.info(f"Imported {len(docs)} conversations from {self.conversations_file}")
+
+    async def list_conversations(self) -> List[Dict]:
+        cursor = self.db.conversations.find({}, {"_id": 0, "_created": 0}).sort("_created", -1)
+        return await cursor.to_list(None)
+
+    async def save_conversation(self, conversation: Dict) -> Dict:
+        await self.db.conversations.update_one(
+            {"id": conversation["id"]},
+            {"$set": conversation, "$setOnInsert": {"_created": time.time()}},
+            upsert=True)
+        return conversation
+
+    async def delete_conversation(self, conversation_id: str):
+        await self.db.conversations.delete_one({"id": conversation_id})
+
+    async def add_status_check(self, doc: Dict):
+        await self.db.status_checks.insert_one(dict(doc))
+
+    async def list_status_checks(self) -> List[Dict]:
+        return await self.db.status_checks.find({}, {"_id": 0}).to_list(LIST_LIMIT)
+
+    async def add_usage(self, rows):
+        from pymongo import UpdateOne
+        await self.db.usage.bulk_write([
+            UpdateOne({name: row[name] for name in USAGE_KEY},
+                      {"$inc": {name: row[name] for name in USAGE_COUNTERS}}, upsert=True)
+            for row in rows
+        ], ordered=False)
+
+    async def list_usage(self, since_day):
+        return await self.db.usage.find({"day": {"$gte": since_day}}, {"_id": 0}).to_list(None)
+
+    async def rnd_find(self, collection, equals=None, ranges=None, limit=LIST_LIMIT):
+        query = dict(equals or {})
+        for field, (low, high) in (ranges or {}).items():
+            bounds = {}
+            if low is not None:
+                bounds["$gte"] = low
+            if high is not None:
+                bounds["$lte"] = high
+            query[field] = bounds
+        return await self.db[collection].find(query, {"_id": 0}).to_list(limit)
+
+    async def rnd_get(self, collection, doc_id):
+        return await self.db[collection].find_one({"id": doc_id}, {"_id": 0})
+
+    async def _bump_version(self) -> int:
+        counter = await self.db.state_meta.find_one_and_update(
+            {"_id": "rnd_version"}, {"$inc": {"value": 1}}, upsert=True, return_document=True)
+        return counter["value"]
+
+    async def rnd_insert(self, collection, doc):
+        from pymongo.errors import DuplicateKeyError
+        try:
+            await self.db[collection].insert_one(dict(doc))
+        except DuplicateKeyError:
+            raise DuplicateRecord(collection, doc["id"]) from None
+        return await self._bump_version()
+
+    async def rnd_update(self, collection, doc_id, changes):
+        old_doc = await self.db[collection].find_one_and_update(
+            {"id": doc_id}, {"$set": changes}, projection={"_id": 0})
+        if old_doc is None:
+            return None
+        return old_doc, {**old_doc, **changes}, await self._bump_version()
+
+    async def rnd_delete(self, collection, doc_id):
+        old_doc = await self.db[collection].find_one_and_delete({"id": doc_id}, {"_id": 0})
+        if old_doc is None:
+            return None
+        return old_doc, await self._bump_version()
+
+    async def rnd_version(self) -> int:
+        counter = await self.db.state_meta.find_one({"_id": "rnd_version"})
+        return counter["value"] if counter else 0
+
+
+def create_state_store(backend: str, collections: Dict, data_dir: Path, db=None) -> StateStore:
+    """Build the configured backend ('' picks mongo when a database is available, else memory)"""
+    conversations_file = data_dir / "conversations.json"
+    backend = backend or ("mongo" if db is not None else "memory")
+    if backend == "mongo" and db is None:
+        logger.warning("STATE_BACKEND=mongo but MongoDB is not available, using memory")
+        backend = "memory"
+
+    rnd_collections = tuple(name for name in collections if name.startswith("rnd_"))
+    if backend == "mongo":
+        return MongoStateStore(db, conversations_file, rnd_collections)
+    if backend == "sqlite":
+        seed = {name: collections[name].to_list() for name in rnd_collections}
+        path = Path(STATE_DB_PATH) if STATE_DB_PATH else data_dir / "chathdi.db"
+        return SQLiteStateStore(path, seed=seed, conversations_file=conversations_file)
+    if backend != "memory":
+        logger.warning(f"Unknown STATE_BACKEND '{backend}', using memory")
+    return MemoryStateStore(collections, conversations_file)
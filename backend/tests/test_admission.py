@@ -0,0 +1,79 @@
+"""
+Test suite for the ChatHDI provider admission control
+"""
+import asyncio
+import time
+import pytest
+from admission import AdmissionController, AdmissionRejected, Limit, Priority
+
+
+def make_controller(**limits) -> AdmissionController:
+    deadlines = {Priority.INTERACTIVE: 1.0, Priority.BACKGROUND: 1.0, Priority.BATCH: 1.0}
+    return AdmissionController(limits=limits, deadlines=deadlines)
+
+
+def test_queue_serves_interactive_before_background_and_fifo_within():
+    controller = make_controller(groq=Limit(1))
+    order = []
+
+    async def call(name, priority, hold=0.02):
+        async with controller.slot("groq", priority=priority):
+            order.append(name)
+            await asyncio.sleep(hold)
+
+    async def scenario():
+        first = asyncio.create_task(call("running", Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(call(name, priority)) for name, priority in (
+            ("batch", Priority.BATCH), ("pptx", Priority.BACKGROUND),
+            ("chat-1", Priority.INTERACTIVE), ("chat-2", Priority.INTERACTIVE))]
+        await asyncio.sleep(0)
+        assert controller.report()["limiters"]["groq"]["queued"] == 4
+        await asyncio.gather(first, *waiting)
+
+    asyncio.run(scenario())
+    assert order == ["running", "chat-1", "chat-2", "pptx", "batch"]
+
+
+def test_token_bucket_spaces_calls_and_model_ids_get_own_limiter():
+    controller = make_controller(groq=Limit(10, rate=20, burst=1), **{"hdi-grok-mini": Limit(10)})
+    started = {"hdi-grok": [], "hdi-grok-mini": []}
+
+    async def call(model_id):
+        async with controller.slot("groq", model_id):
+            started[model_id].append(time.monotonic())
+
+    async def scenario():
+        await asyncio.gather(*(call("hdi-grok") for _ in range(4)), call("hdi-grok-mini"))
+
+    asyncio.run(scenario())
+    assert set(controller.limiters) == {"groq", "hdi-grok-mini"}
+    groq = started["hdi-grok"]
+    assert groq[-1] - groq[0] >= 0.14  # burst of 1, then 3 refills at 20/s
+    assert started["hdi-grok-mini"][0] - groq[0] < 0.02  # not queued behind groq
+
+
+def test_long_queue_is_rejected_fast():
+    """Once call times are known, a queue that cannot start within the deadline fails immediately"""
+    controller = make_controller(gemini=Limit(1))
+
+    async def call(hold):
+        async with controller.slot("gemini"):
+            await asyncio.sleep(hold)
+
+    async def scenario():
+        await call(0.4)  # teaches the limiter that calls take ~0.4s
+        running = [asyncio.create_task(call(0.4)) for _ in range(3)]
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await call(0)
+        elapsed = time.perf_counter() - start
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        return elapsed, rejected.value
+
+    elapsed, rejected = asyncio.run(scenario())
+    assert elapsed < 0.05 and rejected.retry_after > 1.0
+    assert controller.limiters["gemini"].active == 0
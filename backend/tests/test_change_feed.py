@@ -0,0 +1,46 @@
+"""
+Test suite for the ChatHDI R&D change feed
+"""
+import asyncio
+from change_feed import ChangeFeed, format_sse
+
+
+async def collect(feed, collections, resume_token=None, count=1):
+    events = []
+    async for event in feed.subscribe(collections, resume_token, heartbeat=0.05):
+        if event is not None:
+            events.append(event)
+        if len(events) >= count:
+            break
+    return events
+
+
+def test_live_events_are_filtered_by_collection():
+    """Subscribers only see changes for the collections they asked for"""
+    async def scenario():
+        feed = ChangeFeed()
+        task = asyncio.create_task(collect(feed, ["rnd_equipment"]))
+        await asyncio.sleep(0.01)
+        feed.publish("rnd_papers", "insert", "paper-x", {"id": "paper-x"})
+        feed.publish("rnd_equipment", "update", "equip-1", {"id": "equip-1", "status": "In Use"})
+        return await asyncio.wait_for(task, 1)
+
+    events = asyncio.run(scenario())
+    assert [(e["collection"], e["op"], e["id"]) for e in events] == [("rnd_equipment", "update", "equip-1")]
+    assert format_sse(events[0]).startswith(f"id: {events[0]['token']}\nevent: update\n")
+
+
+def test_resume_token_replays_missed_events():
+    """Reconnecting with the last token replays what was missed; stale tokens get a reset"""
+    async def scenario():
+        feed = ChangeFeed()
+        first = feed.publish("rnd_equipment", "update", "equip-1", {"status": "In Use"})
+        feed.publish("rnd_equipment", "update", "equip-2", {"status": "Maintenance"})
+        feed.publish("rnd_equipment", "delete", "equip-3")
+        replayed = await collect(feed, ["rnd_equipment"], first["token"], count=2)
+        stale = await collect(feed, ["rnd_equipment"], "not-a-token")
+        return replayed, stale
+
+    replayed, stale = asyncio.run(scenario())
+    assert [e["id"] for e in replayed] == ["equip-2", "equip-3"]
+    assert stale[0]["op"] == "reset"
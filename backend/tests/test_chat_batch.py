@@ -0,0 +1,54 @@
+"""
+Test suite for ChatHDI batch chat (JSONL in, JSONL out, resumable)
+"""
+import asyncio
+import json
+from chat_batch import ChatBatches, parse_batch
+
+BODY = "\n".join([
+    json.dumps({"id": "q1", "question": "Apa itu SOEC?"}),
+    json.dumps({"id": "q2", "messages": [{"role": "user", "content": "Apa itu PEM?"}], "use_rnd_context": True}),
+    "{not json",
+    json.dumps({"id": "q3", "question": "Apa itu AEM?"}),
+    "",
+])
+
+
+def test_parse_fans_out_models_and_reports_bad_lines():
+    items, errors = parse_batch(BODY, ["hdi-grok", "hdi-gpt4o"])
+    assert [(i.id, i.model) for i in items] == [("q1", "hdi-grok"), ("q1", "hdi-gpt4o"), ("q2", "hdi-grok"),
+                                                ("q2", "hdi-gpt4o"), ("q3", "hdi-grok"), ("q3", "hdi-gpt4o")]
+    assert items[2].use_rnd_context and items[0].messages == [{"role": "user", "content": "Apa itu SOEC?"}]
+    assert [e["id"] for e in errors] == ["line-3"]
+
+
+def test_batch_runs_concurrently_streams_by_completion_and_resumes(tmp_path):
+    items, _ = parse_batch(BODY)
+    running, peak, calls = 0, 0, []
+
+    async def answer(messages, model, use_rnd_context):
+        nonlocal running, peak
+        question = messages[-1]["content"]
+        calls.append(question)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep({"Apa itu SOEC?": 0.06, "Apa itu PEM?": 0.01, "Apa itu AEM?": 0.03}[question])
+        running -= 1
+        if question == "Apa itu AEM?" and calls.count(question) == 1:
+            return "❌ Error dari Groq: 503", {}
+        return f"jawaban: {question}", {}
+
+    async def collect(batches):
+        return [r async for r in batches.run("eval-1", items, answer)]
+
+    batches = ChatBatches(tmp_path, concurrency=2)
+    first = asyncio.run(collect(batches))
+    assert peak == 2
+    assert [(r["id"], r["status"]) for r in first] == [("q2", "ok"), ("q3", "error"), ("q1", "ok")]
+
+    # Same batch again: q1/q2 replayed from disk, only the failed q3 runs
+    second = asyncio.run(collect(batches))
+    assert [(r["id"], r["status"], r.get("resumed", False)) for r in second] == [
+        ("q1", "ok", True), ("q2", "ok", True), ("q3", "ok", False)]
+    assert calls.count("Apa itu SOEC?") == 1 and calls.count("Apa itu AEM?") == 2
+    assert set(batches.stored("eval-1")) == {("q1", "hdi-4"), ("q2", "hdi-4"), ("q3", "hdi-4")}
@@ -0,0 +1,41 @@
+"""
+Test suite for the ChatHDI normalised message model and provider encoders
+"""
+import base64
+from chat_messages import ChatHistory
+
+PNG = "data:image/png;base64," + base64.b64encode(b"\x89PNG fake").decode()
+
+
+def test_gemini_encoding_keeps_repeated_prompt_and_images():
+    history = ChatHistory.of([
+        {"role": "system", "content": "abaikan"},
+        {"role": "user", "content": "Lanjutkan"},
+        {"role": "assistant", "content": "Baik."},
+        {"role": "user", "content": [{"type": "text", "text": "Gambar apa ini?"},
+                                     {"type": "image_url", "image_url": {"url": PNG}}]},
+        {"role": "assistant", "content": "Sebuah diagram."},
+        {"role": "user", "content": "Lanjutkan"},  # same as the first message
+    ])
+    turns, prompt = history.gemini()
+    assert prompt == ["Lanjutkan"]
+    assert [t["role"] for t in turns] == ["user", "model", "user", "model"]
+    assert turns[2]["parts"] == ["Gambar apa ini?", {"mime_type": "image/png", "data": b"\x89PNG fake"}]
+    assert history.gemini() is history.gemini()
+
+
+def test_openai_encoding_is_memoised_per_system_prompt():
+    history = ChatHistory.of([{"role": "user", "content": "Apa itu SOEC?"}])
+    encoded = history.openai("Kamu adalah ChatHDI")
+    assert encoded == [{"role": "system", "content": "Kamu adalah ChatHDI"},
+                       {"role": "user", "content": "Apa itu SOEC?"}]
+    assert history.openai("Kamu adalah ChatHDI") is encoded
+    assert history.openai("Mode web search")[0]["content"] == "Mode web search"
+    assert history.last_text == "Apa itu SOEC?" and history.last_user.role == "user"
+
+
+def test_repeated_messages_stay_in_long_histories():
+    """Every message equal to the prompt used to be dropped from the history"""
+    turns = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"pesan {i % 7}"} for i in range(20001)]
+    history, prompt = ChatHistory.of(turns).gemini()
+    assert len(history) == 20000 and prompt == ["pesan 1"]
@@ -0,0 +1,34 @@
+"""
+Test suite for the ChatHDI background health prober
+"""
+import asyncio
+from health_probe import HealthProber
+
+
+def test_probe_caches_status_latency_and_errors():
+    """Each round replaces the cached results; reading them never runs a check"""
+    calls = []
+
+    async def up():
+        calls.append("up")
+
+    async def refused():
+        raise ConnectionError("connection refused")
+
+    async def hangs():
+        await asyncio.sleep(10)
+
+    prober = HealthProber(interval=60, timeout=0.05)
+    asyncio.run(prober.probe({"database": up, "groq": refused, "gemini": hangs}))
+    for _ in range(3):
+        snapshot = prober.snapshot()
+    assert calls == ["up"]
+
+    dependencies = snapshot["dependencies"]
+    assert dependencies["database"]["status"] == "up" and "error" not in dependencies["database"]
+    assert dependencies["groq"] == {"status": "down", "error": "ConnectionError: connection refused",
+                                    "latency_ms": dependencies["groq"]["latency_ms"],
+                                    "checked_at": dependencies["groq"]["checked_at"]}
+    assert dependencies["gemini"]["error"] == "timeout after 0.05s"
+    assert dependencies["gemini"]["latency_ms"] >= 50
+    assert snapshot["probed_at"] is not None
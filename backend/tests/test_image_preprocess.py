@@ -0,0 +1,67 @@
+"""
+Test suite for ChatHDI multimodal input image downscaling
+"""
+import asyncio
+import base64
+import io
+import pytest
+from chat_messages import ChatHistory
+from image_preprocess import ImagePreprocessor
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def data_url(image, fmt="PNG", **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return f"data:image/{fmt.lower()};base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def decode(url):
+    return Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+
+
+def photo(width, height):
+    """Noisy 'phone photo' (does not compress away like a flat test image)"""
+    return Image.merge("RGB", [Image.effect_noise((width, height), 32 + 16 * i) for i in range(3)])
+
+
+def test_large_images_are_downscaled_per_provider_and_cached():
+    big = data_url(photo(4000, 3000), "JPEG", quality=95)
+    history = ChatHistory.of([{"role": "user", "content": [
+        {"type": "text", "text": "Jelaskan grafik ini"},
+        {"type": "image_url", "image_url": {"url": big, "detail": "high"}},
+        {"type": "image_url", "image_url": {"url": "https://example.com/grafik.png"}},
+    ]}])
+    preprocessor = ImagePreprocessor(enabled=True, max_edges={"gemini": 1536})
+
+    async def scenario():
+        first = await preprocessor.prepare(history, "gemini")
+        again = await preprocessor.prepare(history, "gemini")
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    parts = first.messages[0].content
+    shrunk = parts[1]["image_url"]["url"]
+    assert shrunk.startswith("data:image/jpeg;base64,") and len(shrunk) < len(big) / 4
+    assert decode(shrunk).size == (1536, 1152)
+    assert parts[1]["image_url"]["detail"] == "high" and parts[2] == history.messages[0].content[2]
+    assert again.messages[0].images == first.messages[0].images
+    assert list(preprocessor.cache) and len(preprocessor.cache) == 1  # second round was a cache hit
+    assert history.messages[0].images[0] == big  # the original history is unchanged
+
+
+def test_small_transparent_and_invalid_images():
+    preprocessor = ImagePreprocessor(enabled=True, image_format="jpeg")
+    small = data_url(Image.new("RGB", (64, 64), (10, 120, 200)))  # PNG smaller than any JPEG of it
+    logo = Image.new("RGBA", (3000, 1000), (255, 0, 0, 128))
+
+    async def scenario():
+        target = preprocessor.target("aiml")
+        return (await preprocessor.process(small, target), await preprocessor.process(data_url(logo), target),
+                await preprocessor.process("data:image/png;base64,bm90IGFuIGltYWdl", target))
+
+    kept, transparent, invalid = asyncio.run(scenario())
+    assert kept == small
+    assert transparent.startswith("data:image/webp;base64,") and decode(transparent).mode == "RGBA"
+    assert invalid == "data:image/png;base64,bm90IGFuIGltYWdl"
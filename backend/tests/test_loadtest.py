@@ -0,0 +1,78 @@
+"""
+Test suite for the ChatHDI load-test harness
+"""
+import asyncio
+import httpx
+from fastapi import FastAPI, Request
+from loadtest.runner import LoadRunner, percentile
+from loadtest.scenario import Scenario, load_scenario
+
+
+def make_scenario(**overrides) -> Scenario:
+    values = {
+        "name": "test",
+        "think_time_ms": (0, 10),
+        "actions": [{"action": "chat"}, {"action": "autosave"}],
+        "stages": [{"duration": 0.5, "target": 4}, {"duration": 0.5, "target": 4}],
+    }
+    values.update(overrides)
+    return Scenario(**values)
+
+
+def test_ramp_profile_interpolates_between_stages():
+    """Users rise linearly within a stage and hold the last target afterwards"""
+    scenario = make_scenario(stages=[{"duration": 10, "target": 10}, {"duration": 10, "target": 30},
+                                     {"duration": 5, "target": 0}])
+    assert [scenario.target_users(t) for t in (0, 5, 10, 15, 20, 22.5, 99)] == [0, 5, 10, 20, 30, 15, 0]
+    assert scenario.duration == 25 and scenario.peak_users == 30
+
+    flat = scenario.with_profile(users=8, duration=30, ramp_up=10)
+    assert flat.target_users(5) == 4 and flat.target_users(20) == 8 and flat.duration == 40
+
+
+def test_percentile_uses_nearest_rank():
+    values = sorted(float(v) for v in range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile(values, 99)) == (50.0, 95.0, 99.0)
+    assert percentile([], 95) == 0.0
+
+
+def test_bundled_scenarios_load():
+    for name in ("mixed", "chat", "smoke"):
+        assert load_scenario(name).actions
+
+
+def test_runner_reports_latency_and_errors():
+    """Provider failures reported as chat text count as errors, autosaves are cleaned up"""
+    app = FastAPI()
+    saved, deleted = set(), set()
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        failing = len(body["messages"]) % 3 == 0
+        return {"response": "❌ Error dari AIML API" if failing else "Jawaban", "model": body["model"]}
+
+    @app.post("/api/conversations")
+    async def save(request: Request):
+        saved.add((await request.json())["id"])
+        return {}
+
+    @app.delete("/api/conversations/{conversation_id}")
+    async def delete(conversation_id: str):
+        deleted.add(conversation_id)
+        return {"success": True}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await LoadRunner(client, make_scenario(), tick=0.02).run()
+
+    report = asyncio.run(scenario())
+    summary = report.summary()
+    assert summary["total"]["requests"] > 10
+    assert set(summary["actions"]) == {"chat[hdi-gpt4o]", "autosave"}
+    assert summary["actions"]["autosave"]["errors"] == 0
+    assert 0 < summary["actions"]["chat[hdi-gpt4o]"]["errors"] < summary["actions"]["chat[hdi-gpt4o]"]["requests"]
+    assert max(report.users.values()) == 4
+    assert saved and saved == deleted
+    assert sum(second["requests"] for second in report.timeline()) == summary["total"]["requests"]
@@ -0,0 +1,28 @@
+"""
+Test suite for the ChatHDI event-loop lag monitor
+"""
+import time
+import asyncio
+from loop_monitor import LoopMonitor
+
+
+def test_blocking_call_is_captured_with_its_call_site():
+    monitor = LoopMonitor(interval_ms=10, threshold_ms=50)
+
+    async def blocking_handler():
+        time.sleep(0.3)  # e.g. a synchronous parser inside an async endpoint
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        await blocking_handler()
+        await asyncio.sleep(0.05)
+        monitor.stop()
+
+    asyncio.run(scenario())
+    report = monitor.report()
+    stall = report["recent"][0]
+    assert report["stalls"] >= 1 and report["max_lag_ms"] >= 250
+    assert stall["site"].startswith("test_loop_monitor.py:") and stall["site"].endswith("blocking_handler")
+    assert stall["blocked_ms"] >= 250 and stall["detected_after_ms"] < stall["blocked_ms"]
+    assert any("time.sleep(0.3)" in line for line in stall["stack"])
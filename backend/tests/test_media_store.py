@@ -0,0 +1,156 @@
+"""
+Test suite for the ChatHDI content-addressed media store
+"""
+import asyncio
+import base64
+import io
+import json
+import os
+import zipfile
+import pytest
+from media_store import MediaStore, PinnedStoreFull, media_url, request_key, upload_media_type
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1000
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 1000
+
+
+def test_repeated_prompt_is_served_from_disk(tmp_path):
+    store = MediaStore(tmp_path, max_mb=1)
+    key = request_key("Reaktor  SOEC 10 kW", "stabilityai/sdxl")
+    assert key == request_key("reaktor soec 10 kw", "stabilityai/sdxl")
+    assert key != request_key("reaktor soec 10 kw", "dall-e-3", size="1024x1024")
+
+    async def scenario():
+        miss = await store.get(key)
+        hashes = await store.put(key, "stabilityai/sdxl", [PNG])
+        # A new process sees the same cache
+        return miss, hashes, await MediaStore(tmp_path, max_mb=1).get(key)
+
+    miss, hashes, hit = asyncio.run(scenario())
+    assert miss is None and len(hashes[0]) == 64
+    assert hit["media"] == hashes and hit["model"] == "stabilityai/sdxl"
+    path = asyncio.run(store.open_blob(hashes[0]))
+    assert path.read_bytes() == PNG and asyncio.run(store.media_type(path)) == "image/png"
+    assert asyncio.run(store.open_blob("../" + hashes[0])) is None
+
+
+def test_least_recently_used_blobs_are_evicted(tmp_path):
+    store = MediaStore(tmp_path, max_mb=2.5 / 1024)  # room for two 1 KB blobs
+    blobs = [bytes([i]) * 1024 for i in range(3)]
+
+    async def scenario():
+        first = await store.put("a", "m", [blobs[0]])
+        await store.put("b", "m", [blobs[1]])
+        await store.get("a")  # a is now more recent than b
+        await store.put("c", "m", [blobs[2]])
+        return first, await store.get("a"), await store.get("b")
+
+    first, a, b = asyncio.run(scenario())
+    assert a["media"] == first and b is None
+    assert store.total_bytes == 2048 and len(os.listdir(tmp_path / "blobs")) == 2
+
+
+def test_inline_base64_is_replaced_by_references(tmp_path):
+    store = MediaStore(tmp_path)
+    inline = base64.b64encode(PNG).decode()
+    jpeg = base64.b64encode(JPEG).decode()
+    assert jpeg.startswith("/9j/")
+    media = [inline, "data:image/png;base64," + inline, "/api/media/" + "0" * 64, "bukan base64!", jpeg]
+
+    references = asyncio.run(store.references(media))
+    url = media_url(references[0].rsplit("/", 1)[1])
+    assert references[:4] == [url, url, media[2], media[3]]
+    assert store.pinned_path(url.rsplit("/", 1)[1]).read_bytes() == PNG
+    assert store.pinned_path(references[4].rsplit("/", 1)[1]).read_bytes() == JPEG
+    assert asyncio.run(MediaStore().references(media)) == media  # no store configured
+
+
+def test_pinned_media_is_never_evicted(tmp_path):
+    """Media referenced by conversations outlives the LRU cache"""
+    store = MediaStore(tmp_path, max_mb=2.5 / 1024)
+    blobs = [bytes([i]) * 1024 for i in range(5)]
+
+    async def scenario():
+        (chat_image,) = await store.put("a", "m", [blobs[0]])
+        await store.pin([chat_image])
+        (uploaded,) = await store.store([PNG])
+        for key, blob in zip("bcd", blobs[1:]):
+            await store.put(key, "m", [blob])
+        # Served from the pinned copy although the cache evicted it
+        return chat_image, uploaded, await store.open_blob(chat_image), await store.open_blob(uploaded)
+
+    chat_image, uploaded, chat_path, upload_path = asyncio.run(scenario())
+    assert not store.blob_path(chat_image).exists() and chat_image not in store.blobs
+    assert chat_path.read_bytes() == bytes([0]) * 1024 and upload_path.read_bytes() == PNG
+    assert store.total_bytes == 2048  # pinned media does not count against MEDIA_CACHE_MB
+
+
+def zip_of(*names):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name in names:
+            archive.writestr(name, "<xml/>")
+    return buffer.getvalue()
+
+
+def test_uploads_must_be_images_or_presentations():
+    assert upload_media_type(PNG) == "image/png" and upload_media_type(JPEG) == "image/jpeg"
+    assert upload_media_type(zip_of("[Content_Types].xml", "ppt/presentation.xml")).endswith("presentation")
+    assert upload_media_type(zip_of("[Content_Types].xml", "word/document.xml")) is None  # docx
+    assert upload_media_type(b"PK\x03\x04 not a zip") is None
+    assert upload_media_type(b"<html><script>") is None
+
+
+def test_pinned_area_has_a_quota(tmp_path):
+    store = MediaStore(tmp_path, pinned_mb=2.5 / 1024)
+    blobs = [bytes([i]) * 1024 for i in range(3)]
+    inline = [base64.b64encode(blob).decode() for blob in blobs]
+
+    async def scenario():
+        await store.store(blobs[:2])
+        await store.store(blobs[:1])  # already pinned: no extra space
+        with pytest.raises(PinnedStoreFull):
+            await store.store(blobs[2:])
+        (cached,) = await store.put("c", "m", blobs[2:])
+        with pytest.raises(PinnedStoreFull):
+            await store.pin([cached])
+        # Saved conversations keep their base64 when there is no room
+        return await store.references(inline[2:])
+
+    assert asyncio.run(scenario()) == inline[2:]
+    assert len(os.listdir(tmp_path / "pinned")) == 2
+
+
+def test_request_entries_are_removed_with_their_blobs(tmp_path):
+    store = MediaStore(tmp_path, max_mb=2.5 / 1024)
+    blobs = [bytes([i]) * 1024 for i in range(4)]
+
+    async def scenario():
+        for key, blob in zip("abcd", blobs):
+            await store.put(key, "m", [blob])
+
+    asyncio.run(scenario())
+    assert sorted(path.stem for path in (tmp_path / "requests").iterdir()) == ["c", "d"]
+
+    # Entries whose blobs another process deleted are swept on load
+    c_hash = json.loads((tmp_path / "requests" / "c.json").read_text())["media"][0]
+    store.blob_path(c_hash).unlink()
+    (tmp_path / "requests" / "broken.json").write_text("{")
+    fresh = MediaStore(tmp_path, max_mb=2.5 / 1024)
+    assert asyncio.run(fresh.get("d")) is not None
+    assert [path.name for path in (tmp_path / "requests").iterdir()] == ["d.json"]
+
+
+def test_media_responses_support_ranges(tmp_path):
+    """FileResponse range handling needs Starlette >= 0.39 (pinned in requirements.txt)"""
+    from fastapi import FastAPI
+    from fastapi.responses import FileResponse
+    from fastapi.testclient import TestClient
+
+    path = tmp_path / "video.mp4"
+    path.write_bytes(bytes(range(256)))
+    app = FastAPI()
+    app.get("/media")(lambda: FileResponse(path))
+
+    response = TestClient(app).get("/media", headers={"Range": "bytes=16-31"})
+    assert response.status_code == 206 and response.content == bytes(range(16, 32))
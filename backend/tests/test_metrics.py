@@ -0,0 +1,41 @@
+"""
+Test suite for the ChatHDI Prometheus metrics registry
+"""
+import pytest
+from metrics import MetricsRegistry, _Metric
+
+
+def test_counter_family_matches_samples_and_labels_are_escaped():
+    registry = MetricsRegistry()
+    errors = registry.counter("chathdi_test_errors", "Errors", ["provider", "status"])
+    errors.labels(provider="groq", status="429").inc()
+    errors.labels("groq", "429").inc(2)
+    errors.labels(provider='a"b\\c', status="500").inc()
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP chathdi_test_errors_total Errors", "# TYPE chathdi_test_errors_total counter"]
+    assert 'chathdi_test_errors_total{provider="groq",status="429"} 3' in lines
+    assert 'chathdi_test_errors_total{provider="a\\"b\\\\c",status="500"} 1' in lines
+    assert registry.counter("chathdi_test_errors", "Errors", ["provider", "status"]) is errors
+
+
+def test_gauge_and_histogram_rendering():
+    registry = MetricsRegistry()
+    registry.gauge("chathdi_test_bytes", "Bytes").set(2.5)
+    latency = registry.histogram("chathdi_test_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.labels(route="/api/chat").observe(value)
+    lines = registry.render().splitlines()
+    assert "# TYPE chathdi_test_bytes gauge" in lines and "chathdi_test_bytes 2.5" in lines
+    assert "# TYPE chathdi_test_seconds histogram" in lines
+    assert [line for line in lines if line.startswith("chathdi_test_seconds_")] == [
+        'chathdi_test_seconds_bucket{route="/api/chat",le="0.1"} 1',
+        'chathdi_test_seconds_bucket{route="/api/chat",le="1"} 3',
+        'chathdi_test_seconds_bucket{route="/api/chat",le="+Inf"} 4',
+        'chathdi_test_seconds_sum{route="/api/chat"} 4.25',
+        'chathdi_test_seconds_count{route="/api/chat"} 4',
+    ]
+
+
+def test_metric_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("chathdi_test_abstract", "Abstract")
@@ -0,0 +1,51 @@
+"""
+Test suite for the ChatHDI mock LLM/media provider
+"""
+import asyncio
+import httpx
+import openai
+from openai import AsyncOpenAI
+from mock_provider import create_app, MockConfig
+
+
+def make_client(config: MockConfig) -> AsyncOpenAI:
+    transport = httpx.ASGITransport(app=create_app(config))
+    return AsyncOpenAI(
+        api_key="mock-provider-key",
+        base_url="http://mock/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=transport, base_url="http://mock"),
+    )
+
+
+def test_openai_sdk_completion_is_deterministic():
+    """Same prompt gives the same completion, non-streaming and streaming agree"""
+    async def scenario():
+        client = make_client(MockConfig(latency_ms=0, tokens_per_second=0, completion_tokens=12))
+        messages = [{"role": "user", "content": "Apa itu hidrogen?"}]
+        first = await client.chat.completions.create(model="gpt-4o", messages=messages)
+        second = await client.chat.completions.create(model="gpt-4o", messages=messages)
+        stream = await client.chat.completions.create(model="gpt-4o", messages=messages, stream=True)
+        streamed = "".join([chunk.choices[0].delta.content or "" async for chunk in stream])
+        return first, second, streamed
+
+    first, second, streamed = asyncio.run(scenario())
+    text = first.choices[0].message.content
+    assert text.startswith("[mock:gpt-4o]")
+    assert text == second.choices[0].message.content == streamed
+    assert first.usage.completion_tokens == 12
+
+
+def test_error_injection_returns_retry_after():
+    """429s carry Retry-After so client retry logic can be exercised"""
+    async def scenario():
+        client = make_client(MockConfig(latency_ms=0, error_rate_429=1.0, retry_after=3))
+        try:
+            await client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "x"}])
+        except openai.RateLimitError as e:
+            return e
+        return None
+
+    error = asyncio.run(scenario())
+    assert error is not None
+    assert error.response.headers["retry-after"] == "3"
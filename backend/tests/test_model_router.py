@@ -0,0 +1,39 @@
+"""
+Test suite for ChatHDI hdi-auto model routing
+"""
+from model_router import ModelRouter, DEFAULT_ROUTES, classify, detect_language
+
+
+def user(content):
+    return {"role": "user", "content": content}
+
+
+def test_requests_are_classified_into_tiers():
+    assert classify([user("Apa itu hidrogen hijau?")]).tier == "light"
+    assert classify([user("Tolong debug fungsi python ini:\n```\ndef f(): return 1/0\n```")]).tier == "code"
+    assert classify([user([{"type": "text", "text": "Gambar apa ini?"},
+                           {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}}])]).tier == "vision"
+    document = "Ringkas dokumen ini\n\n[File: laporan.pdf]\n" + "Isi laporan elektrolisis. " * 400
+    decision = classify([user(document)])
+    assert decision.tier == "complex" and "large context" in decision.reasons[0]
+    assert classify([user("Ringkas catatan R&D terkait")], context="[R&D] elektroliser PEM").tier == "standard"
+    history = [user("Halo"), {"role": "assistant", "content": "Halo juga"}] * 6 + [user("Lanjutkan")]
+    assert classify(history).tier == "complex"
+
+
+def test_light_threshold_depends_on_language():
+    assert detect_language("Bagaimana cara kerja elektrolisis air yang efisien?") == "id"
+    assert detect_language("How does water electrolysis work?") == "en"
+    english = "Explain the main differences between alkaline and PEM electrolysers for a plant " * 3
+    indonesian = "Jelaskan perbedaan utama antara elektroliser alkali dan PEM untuk pabrik ini " * 3
+    assert 160 < len(indonesian) and len(english) <= 280
+    assert classify([user(english)]).tier == "light"
+    assert classify([user(indonesian)]).tier == "standard"
+
+
+def test_route_picks_first_configured_model_and_honours_overrides():
+    router = ModelRouter(dict(DEFAULT_ROUTES, light=["hdi-4-mini", "hdi-grok-mini"]))
+    question = [user("Apa itu SOEC?")]
+    assert router.route(question).model_id == "hdi-4-mini"
+    decision = router.route(question, available=lambda model_id: model_id.startswith("hdi-grok"))
+    assert decision == ("hdi-grok-mini", "light", decision.reasons)
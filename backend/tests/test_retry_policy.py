@@ -0,0 +1,94 @@
+"""
+Test suite for the ChatHDI provider retry policy
+"""
+import asyncio
+import time
+import pytest
+from retry_policy import RetryPolicy, retry_after
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def flaky(*errors, result="ok"):
+    calls = []
+
+    async def call():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return call, calls
+
+
+def test_transient_errors_are_retried_honouring_retry_after():
+    policy = RetryPolicy(attempts=3, base_delay=0.01)
+    call, calls = flaky(ProviderError(429, {"retry-after": "0.2"}), ProviderError(503))
+    assert asyncio.run(policy.call("groq", call)) == "ok"
+    assert len(calls) == 3 and calls[1] - calls[0] >= 0.2
+    assert retry_after(ProviderError(429, {"retry-after-ms": "1500"})) == 1.5
+
+
+def test_errors_that_may_have_been_processed_are_not_retried():
+    """A 500 may already have produced (and billed) a completion"""
+    policy = RetryPolicy(attempts=3, base_delay=0.01)
+    call, calls = flaky(ProviderError(500))
+    with pytest.raises(ProviderError):
+        asyncio.run(policy.call("aiml", call))
+    assert len(calls) == 1
+
+
+def test_budget_and_deadline_stop_retry_storms():
+    policy = RetryPolicy(attempts=5, base_delay=0.001, budget_ratio=0.5, budget_max=2)
+    always_429 = [ProviderError(429)] * 5
+
+    async def scenario():
+        attempts = []
+        for _ in range(3):
+            call, calls = flaky(*always_429)
+            with pytest.raises(ProviderError):
+                await policy.call("gemini", call)
+            attempts.append(len(calls))
+        return attempts
+
+    # The first call spends the whole budget (2 retries), later calls fail fast
+    assert asyncio.run(scenario()) == [3, 1, 1]
+    assert policy.budget("aiml").tokens == 2  # budgets are per provider
+
+    call, calls = flaky(ProviderError(429, {"retry-after": "5"}))
+    with pytest.raises(ProviderError):
+        asyncio.run(policy.call("aiml", call, deadline=1))
+    assert len(calls) == 1
+
+
+def test_admission_slot_is_released_during_backoff():
+    """A call sleeping on Retry-After does not hold the provider's only slot"""
+    from admission import AdmissionController, Limit, Priority
+
+    controller = AdmissionController(limits={"groq": Limit(1)}, deadlines={priority: 1.0 for priority in Priority})
+    policy = RetryPolicy(attempts=2, base_delay=0.01)
+    call, calls = flaky(ProviderError(429, {"retry-after": "0.2"}))
+    order = []
+
+    async def retried():
+        async with controller.slot("groq"):
+            result = await policy.call("groq", call)
+            order.append("retried")
+            return result
+
+    async def other():
+        await asyncio.sleep(0.05)
+        async with controller.slot("groq"):
+            order.append("other")
+
+    async def scenario():
+        result, _ = await asyncio.gather(retried(), other())
+        return result
+
+    assert asyncio.run(scenario()) == "ok"
+    assert order == ["other", "retried"] and len(calls) == 2
+    assert controller.limiters["groq"].active == 0
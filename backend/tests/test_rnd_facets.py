@@ -0,0 +1,59 @@
+"""
+Test suite for ChatHDI R&D facet counters
+"""
+from rnd_facets import FacetIndex
+from rnd_models import INITIAL_PAPERS, INITIAL_EQUIPMENT, INITIAL_MATERIALS, INITIAL_INSTITUTIONS
+
+
+def build_index():
+    index = FacetIndex()
+    index.rebuild({
+        "rnd_papers": INITIAL_PAPERS,
+        "rnd_equipment": INITIAL_EQUIPMENT,
+        "rnd_materials": INITIAL_MATERIALS,
+        "rnd_institutions": INITIAL_INSTITUTIONS,
+    })
+    return index
+
+
+def test_rebuild_matches_full_scan():
+    """Counters built at startup match a naive scan of the data"""
+    facets = build_index().snapshot()
+    assert facets["papers"]["total"] == len(INITIAL_PAPERS)
+    for paper in INITIAL_PAPERS:
+        assert facets["papers"]["category"][paper["category"]] >= 1
+        assert facets["papers"]["year"][paper["year"]] >= 1
+    assert sum(facets["equipment"]["status"].values()) == len(INITIAL_EQUIPMENT)
+    hazards = sum(len(m.get("hazards", [])) for m in INITIAL_MATERIALS)
+    assert sum(facets["materials"]["hazards"].values()) == hazards
+
+
+def test_insert_update_delete():
+    """Counters follow writes without a rescan"""
+    index = build_index()
+    version = index.version
+    doc = {"id": "equip-x", "category": "Safety", "country": "Indonesia", "status": "Maintenance"}
+
+    index.record_insert("rnd_equipment", doc)
+    facets = index.snapshot()
+    assert facets["equipment"]["status"]["Maintenance"] >= 1
+    assert facets["equipment"]["country"]["Indonesia"] >= 1
+    assert facets["version"] > version
+
+    index.record_update("rnd_equipment", doc, {**doc, "status": "Available"})
+    index.record_delete("rnd_equipment", {**doc, "status": "Available"})
+    assert index.snapshot()["equipment"] == build_index().snapshot()["equipment"]
+
+
+def test_posting_an_existing_id_is_a_conflict(tmp_path, monkeypatch):
+    """POST /api/rnd/{kind} with a known id returns 409 and leaves the facets alone"""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    from fastapi.testclient import TestClient
+    import server
+
+    client = TestClient(server.app)
+    before = client.get("/api/rnd/facets").json()["equipment"]
+    response = client.post("/api/rnd/equipment", json=INITIAL_EQUIPMENT[0])
+    assert response.status_code == 409
+    assert client.get("/api/rnd/facets").json()["equipment"] == before
+    assert before["total"] == len(INITIAL_EQUIPMENT)
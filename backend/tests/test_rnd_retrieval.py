@@ -0,0 +1,54 @@
+"""
+Test suite for ChatHDI R&D Database retrieval for chat grounding
+"""
+from rnd_retrieval import RnDRetrievalService, RETRIEVAL_FIELDS, format_record
+from rnd_similarity import TfidfIndex
+from rnd_models import INITIAL_PAPERS, INITIAL_EQUIPMENT, INITIAL_MATERIALS, INITIAL_INSTITUTIONS
+
+COLLECTIONS = {
+    "rnd_papers": INITIAL_PAPERS,
+    "rnd_equipment": INITIAL_EQUIPMENT,
+    "rnd_materials": INITIAL_MATERIALS,
+    "rnd_institutions": INITIAL_INSTITUTIONS,
+}
+
+
+def service():
+    """Retrieval service with private indexes (the paper index is a shared singleton)"""
+    retrieval = RnDRetrievalService()
+    retrieval.indexes = {collection: TfidfIndex(fields) for collection, fields in RETRIEVAL_FIELDS.items()}
+    retrieval.rebuild(COLLECTIONS)
+    return retrieval
+
+
+def test_retrieve_ranks_across_collections():
+    retrieval = service()
+    material = INITIAL_MATERIALS[0]
+    hits = retrieval.retrieve(f"{material['name']} {material['formula']}", k=3)
+    assert hits[0][0] == "rnd_materials" and hits[0][1]["id"] == material["id"]
+    scores = [score for _, _, score in hits]
+    assert scores == sorted(scores, reverse=True) and len(hits) <= 3
+
+
+def test_context_respects_token_budget():
+    retrieval = service()
+    query = "hydrogen electrolysis fuel cell catalyst membrane"
+    full, full_ids = retrieval.build_context(query, max_tokens=10000)
+    small, small_ids = retrieval.build_context(query, max_tokens=120)
+    assert len(full_ids) > len(small_ids) >= 1
+    assert small_ids == full_ids[:len(small_ids)]
+    records = small.split("\n\n", 1)[1]
+    assert len(records) <= 120 * 4
+
+
+def test_oversized_first_record_is_truncated():
+    retrieval = service()
+    query = INITIAL_PAPERS[0]["title"]
+    first = retrieval.retrieve(query)[0]
+    context, ids = retrieval.build_context(query, max_tokens=10)
+    assert ids == [first[1]["id"]]
+    assert context.endswith("- " + format_record(first[0], first[1])[:40])
+
+
+def test_no_match_returns_none():
+    assert service().build_context("zzzz qqqq xyzzy") == (None, [])
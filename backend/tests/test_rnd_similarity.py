@@ -0,0 +1,82 @@
+"""
+Test suite for ChatHDI "similar papers" recommendations
+"""
+import random
+import numpy as np
+from rnd_similarity import TfidfIndex, PAPER_FIELDS, COMPACT_MIN_ROWS
+from rnd_models import INITIAL_PAPERS
+
+
+def test_similar_excludes_self_and_ranks_by_topic():
+    """Related papers share vocabulary; the paper itself is never returned"""
+    index = TfidfIndex(PAPER_FIELDS)
+    index.rebuild(INITIAL_PAPERS)
+    paper_id = INITIAL_PAPERS[0]["id"]
+    results = index.similar(paper_id, 3)
+    assert results, "expected at least one related paper"
+    assert all(doc["id"] != paper_id for doc, _ in results)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    assert index.similar("does-not-exist") is None
+
+
+def test_incremental_add_and_remove():
+    """New papers become recommendable and deleted papers disappear"""
+    index = TfidfIndex(PAPER_FIELDS)
+    index.rebuild(INITIAL_PAPERS)
+    base = {"title": "Solid oxide electrolysis stack degradation", "abstract": "SOEC stack degradation",
+            "keywords": ["soec", "electrolysis", "degradation"]}
+    index.add({**base, "id": "new-1"})
+    index.add({**base, "id": "new-2"})
+    assert index.similar("new-1", 1)[0][0]["id"] == "new-2"
+    index.remove("new-2")
+    assert all(doc["id"] != "new-2" for doc, _ in index.similar("new-1", 10))
+    assert index.search("soec degradation", 1)[0][0]["id"] == "new-1"
+
+
+def test_updates_are_compacted():
+    """Re-indexing edited papers keeps rows and vocabulary bounded and results unchanged"""
+    index = TfidfIndex(PAPER_FIELDS)
+    index.rebuild(INITIAL_PAPERS)
+    for i in range(2000):
+        paper = INITIAL_PAPERS[i % len(INITIAL_PAPERS)]
+        index.add({**paper, "abstract": f"{paper['abstract']} revisi{i}"})
+        index.search("hydrogen")  # compiles between writes, like a live worker
+    for paper in INITIAL_PAPERS:
+        index.add(paper)
+
+    fresh = TfidfIndex(PAPER_FIELDS)
+    fresh.rebuild(INITIAL_PAPERS)
+    assert len(index) == len(INITIAL_PAPERS)
+    assert len(index.rows) < 2 * len(index) + COMPACT_MIN_ROWS
+    assert len(index.vocab) < len(fresh.vocab) + 2 * COMPACT_MIN_ROWS
+    query = INITIAL_PAPERS[0]["title"]
+    assert [(d["id"], s) for d, s in index.search(query)] == [(d["id"], s) for d, s in fresh.search(query)]
+
+
+def test_sparse_scores_match_brute_force_and_compile_once():
+    """Postings-based scores equal dense cosines; queries reuse one compiled index"""
+    rng = random.Random(0)
+    words = [f"term{i}" for i in range(500)]
+    docs = [
+        {"id": f"p{i}", "title": " ".join(rng.choices(words, k=8)),
+         "abstract": " ".join(rng.choices(words, k=60)), "keywords": rng.choices(words, k=4)}
+        for i in range(2000)
+    ]
+    index = TfidfIndex(PAPER_FIELDS)
+    index.rebuild(docs)
+    index.similar("p0", 10)
+    compiled = index._compiled_version
+
+    dense = np.zeros((len(docs), len(index.vocab)), dtype=np.float64)
+    for row in range(len(docs)):
+        start, end = index.indptr[row], index.indptr[row + 1]
+        dense[row, index.indices[start:end]] = index.data[start:end]
+    for i in range(1, 21):
+        results = index.similar(f"p{i}", 10)
+        expected = dense @ dense[i]
+        expected[i] = 0.0
+        top = sorted(range(len(docs)), key=lambda r: -expected[r])[:10]
+        assert [doc["id"] for doc, _ in results] == [f"p{r}" for r in top]
+        assert np.allclose([score for _, score in results], expected[top], atol=1e-3)
+    assert index._compiled_version == compiled  # no recompilation per query
@@ -0,0 +1,53 @@
+"""
+Test suite for the ChatHDI lazy service loader
+"""
+import asyncio
+import threading
+import time
+from service_loader import ServiceLoader
+
+
+def test_service_is_imported_once_and_reported():
+    """Concurrent first uses share one import; the report says what triggered it"""
+    calls = []
+
+    def load_slow():
+        calls.append(threading.get_ident())
+        time.sleep(0.05)
+        return object()
+
+    def load_broken():
+        raise ImportError("No module named 'pptx'")
+
+    loader = ServiceLoader({"slow": load_slow, "broken": load_broken})
+
+    async def scenario():
+        first, second = await asyncio.gather(loader.aget("slow"), loader.aget("slow"))
+        await loader.warm_up()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second and len(calls) == 1
+    report = loader.report()["services"]
+    assert report["slow"]["loaded"] and report["slow"]["trigger"] == "first use"
+    assert report["slow"]["seconds"] >= 0.05
+    assert report["broken"] == {"loaded": False, "error": "No module named 'pptx'", "trigger": "warm-up",
+                                "seconds": report["broken"]["seconds"]}
+    # A service that cannot be imported keeps the instance out of rotation
+    assert loader.warmed_up and not loader.ready
+    assert loader.report()["failures"] == {"broken": "No module named 'pptx'"}
+
+
+def test_warm_up_runs_service_hooks_before_ready():
+    """Readiness flips only after every service's own warm-up has run"""
+    class Service:
+        async def warm_up(self, timeout):
+            assert not loader.ready
+            return {"connection": "ok", "template": "error: missing"}
+
+    loader = ServiceLoader({"service": Service})
+    asyncio.run(loader.warm_up(timeout=1))
+    report = loader.report()
+    assert report["ready"] and report["warmup_seconds"] is not None
+    assert report["failures"] == {"service.template": "error: missing"}
+    assert report["services"]["service"]["warm_up"]["steps"] == {"connection": "ok", "template": "error: missing"}
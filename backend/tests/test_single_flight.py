@@ -0,0 +1,75 @@
+"""
+Test suite for ChatHDI single-flight request coalescing
+"""
+import asyncio
+import pytest
+from single_flight import SingleFlight, request_key
+
+
+def test_identical_calls_share_one_upstream_call():
+    flight = SingleFlight("chat")
+    upstream = []
+
+    async def call(prompt):
+        upstream.append(prompt)
+        await asyncio.sleep(0.05)
+        return f"jawaban untuk {prompt}"
+
+    async def scenario():
+        same = request_key("hdi-gpt4o", [{"role": "user", "content": "Apa itu PEM?"}], None)
+        other = request_key("hdi-gpt4o", [{"role": "user", "content": "Apa itu SOEC?"}], None)
+        results = await asyncio.gather(*(flight.do(same, lambda: call("PEM")) for _ in range(5)),
+                                       flight.do(other, lambda: call("SOEC")))
+        # Finished calls are not cached
+        again = await flight.do(same, lambda: call("PEM"))
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert results == ["jawaban untuk PEM"] * 5 + ["jawaban untuk SOEC"]
+    assert again == "jawaban untuk PEM" and upstream == ["PEM", "SOEC", "PEM"]
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call():
+    flight = SingleFlight("image")
+
+    async def call():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("503 from provider")
+
+    async def scenario():
+        leaving = asyncio.create_task(flight.do("key", call))
+        staying = asyncio.create_task(flight.do("key", call))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        with pytest.raises(RuntimeError):
+            await staying
+        assert leaving.cancelled() and not flight.calls
+
+    asyncio.run(scenario())
+
+
+def test_image_callers_at_other_priorities_do_not_share(monkeypatch):
+    """An interactive request never waits on a batch call; joiners get independent results"""
+    from admission import Priority
+    from media_service import MediaService
+
+    service = MediaService()
+    calls = []
+
+    async def generate(provider, prompt, model, priority):
+        calls.append(priority)
+        await asyncio.sleep(0.05)
+        return {"success": True, "images": ["/api/media/abc"], "model": model, "error": None}
+
+    monkeypatch.setattr(service, "_generate_image_cached", generate)
+
+    async def scenario():
+        return await asyncio.gather(
+            service.generate_image("reaktor", "sdxl", Priority.BATCH),
+            service.generate_image("reaktor", "sdxl", Priority.BATCH),
+            service.generate_image("reaktor", "sdxl", Priority.INTERACTIVE))
+
+    first, second, interactive = asyncio.run(scenario())
+    assert sorted(calls) == [Priority.INTERACTIVE, Priority.BATCH]
+    first["images"].append("mutated")
+    assert second["images"] == interactive["images"] == ["/api/media/abc"]
@@ -0,0 +1,138 @@
+"""
+Test suite for the ChatHDI state stores (memory and SQLite)
+"""
+import asyncio
+import json
+import sqlite3
+import pytest
+from change_feed import ChangeFeed
+from rnd_store import ColumnarCollection
+from state_store import DuplicateRecord, MemoryStateStore, SQLiteStateStore, StateStore
+
+PAPERS = [
+    {"id": f"paper-{i}", "title": f"Paper {i}", "year": 2018 + i, "category": "Fuel Cells" if i % 2 else "Solar",
+     "country": "Japan"}
+    for i in range(6)
+]
+
+
+def test_sqlite_workers_share_writes(tmp_path):
+    """Two stores on one file behave like two workers: each sees the other's writes"""
+    async def scenario():
+        path = tmp_path / "state.db"
+        first = SQLiteStateStore(path, seed={"rnd_papers": PAPERS})
+        second = SQLiteStateStore(path, seed={"rnd_papers": PAPERS})
+        await first.open()
+        await second.open()
+
+        assert len(await second.rnd_find("rnd_papers")) == len(PAPERS)  # seeded once
+        version = await first.rnd_insert("rnd_papers", {"id": "paper-x", "title": "X", "year": 2030,
+                                                        "category": "Solar", "country": "Japan"})
+        assert await second.rnd_version() == version
+        old, new, _ = await second.rnd_update("rnd_papers", "paper-x", {"year": 2031})
+        assert (old["year"], new["year"]) == (2030, 2031)
+        filtered = await first.rnd_find("rnd_papers", {"category": "Solar"}, {"year": (2020, None)})
+        assert [p["id"] for p in filtered] == ["paper-2", "paper-4", "paper-x"]
+        assert (await first.rnd_delete("rnd_papers", "paper-x"))[0]["id"] == "paper-x"
+        assert await second.rnd_get("rnd_papers", "paper-x") is None
+        assert await second.rnd_delete("rnd_papers", "paper-x") is None
+
+        changes = await second.changes_since(0, ["rnd_papers"])
+        return [(c["op"], c["id"]) for c in changes]
+
+    assert asyncio.run(scenario()) == [("insert", "paper-x"), ("update", "paper-x"), ("delete", "paper-x")]
+
+
+def test_sqlite_close_closes_every_thread_connection(tmp_path):
+    store = SQLiteStateStore(tmp_path / "state.db", seed={"rnd_papers": PAPERS})
+
+    async def scenario():
+        await store.open()
+        # Concurrent queries run on several pool threads, each with its own connection
+        await asyncio.gather(*(store.rnd_find("rnd_papers") for _ in range(16)))
+        connections = list(store._connections)
+        await store.close()
+        return connections
+
+    connections = asyncio.run(scenario())
+    assert connections and not store._connections
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
+def test_conversations_keep_order_and_import_json(tmp_path):
+    """New conversations go to the top, updates keep their place; existing JSON is imported"""
+    conversations_file = tmp_path / "conversations.json"
+    conversations_file.write_text(json.dumps([{"id": "old-2"}, {"id": "old-1"}]), encoding="utf-8")
+
+    async def scenario(store):
+        await store.open()
+        await store.save_conversation({"id": "new", "title": "a"})
+        await store.save_conversation({"id": "old-1", "title": "edited"})
+        await store.delete_conversation("old-2")
+        return await store.list_conversations()
+
+    memory = asyncio.run(scenario(MemoryStateStore({}, conversations_file)))
+    conversations_file.write_text(json.dumps([{"id": "old-2"}, {"id": "old-1"}]), encoding="utf-8")
+    sqlite = asyncio.run(scenario(SQLiteStateStore(tmp_path / "state.db", conversations_file=conversations_file)))
+    for conversations in (memory, sqlite):
+        assert [c["id"] for c in conversations] == ["new", "old-1"]
+        assert conversations[1]["title"] == "edited"
+
+
+def test_memory_store_wraps_columnar_collections(tmp_path):
+    async def scenario():
+        store = MemoryStateStore({"rnd_papers": ColumnarCollection(None, PAPERS)}, tmp_path / "c.json")
+        version = await store.rnd_insert("rnd_papers", {"id": "paper-x", "year": 2030, "category": "Solar"})
+        found = await store.rnd_find("rnd_papers", {"category": "Solar"})
+        return version, [p["id"] for p in found]
+
+    assert asyncio.run(scenario()) == (1, ["paper-0", "paper-2", "paper-4", "paper-x"])
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class PartialStore(StateStore):
+        async def list_conversations(self):
+            return []
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+def test_insert_of_existing_id_is_rejected(tmp_path):
+    """A second insert with the same id must not replace the record (or bump the version)"""
+    async def scenario(store):
+        await store.open()
+        version = await store.rnd_version()
+        with pytest.raises(DuplicateRecord):
+            await store.rnd_insert("rnd_papers", {**PAPERS[0], "title": "Duplikat"})
+        return await store.rnd_version() - version, (await store.rnd_get("rnd_papers", "paper-0"))["title"]
+
+    memory = MemoryStateStore({"rnd_papers": ColumnarCollection(None, PAPERS)}, tmp_path / "c.json")
+    sqlite = SQLiteStateStore(tmp_path / "state.db", seed={"rnd_papers": PAPERS})
+    assert asyncio.run(scenario(memory)) == asyncio.run(scenario(sqlite)) == (0, "Paper 0")
+
+
+def test_change_feed_polls_shared_store_and_resumes(tmp_path):
+    """/rnd/changes on the SQLite store streams other workers' writes and resumes by token"""
+    async def scenario():
+        store = SQLiteStateStore(tmp_path / "state.db", seed={"rnd_papers": PAPERS})
+        await store.open()
+        feed = ChangeFeed()
+        events = feed.watch_store(store, ["rnd_papers"], heartbeat=5, interval=0.01)
+        first = asyncio.ensure_future(events.__anext__())
+        await asyncio.sleep(0.05)
+        await store.rnd_delete("rnd_papers", "paper-1")
+        await store.rnd_delete("rnd_papers", "paper-2")
+        live = await asyncio.wait_for(first, 1)
+        await events.aclose()
+
+        resumed = feed.watch_store(store, ["rnd_papers"], resume_token=live["token"], heartbeat=5, interval=0.01)
+        missed = await asyncio.wait_for(resumed.__anext__(), 1)
+        await resumed.aclose()
+        return live, missed
+
+    live, missed = asyncio.run(scenario())
+    assert (live["op"], live["id"]) == ("delete", "paper-1")
+    assert (missed["op"], missed["id"]) == ("delete", "paper-2")
@@ -0,0 +1,83 @@
+"""
+Test suite for ChatHDI in-process tracing and file export
+"""
+import asyncio
+import json
+import pytest
+from tracing import tracer, traced
+
+
+@pytest.fixture
+def enabled_tracer(tmp_path):
+    enabled, exporter = tracer.enabled, tracer.exporter
+    tracer.configure(True, tmp_path)
+    yield tracer
+    tracer.flush()
+    tracer.enabled, tracer.exporter = enabled, exporter
+
+
+@traced("test.fetch")
+async def fetch(delay: float):
+    await asyncio.sleep(delay)
+    tracer.current_span().set_attribute("delay", delay)
+    return tracer.current_span()
+
+
+@traced()
+def compute():
+    return tracer.current_span()
+
+
+def read_otlp(directory):
+    lines = (directory / "traces.otlp.jsonl").read_text().splitlines()
+    return [json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"] for line in lines]
+
+
+def test_spans_nest_through_awaits_and_tasks(enabled_tracer, tmp_path):
+    async def request():
+        async with tracer.span("http.request", path="/api/chat") as root:
+            first, second = await asyncio.gather(fetch(0.01), fetch(0))
+            return root, first, second, compute()
+
+    root, first, second, sync_span = asyncio.run(request())
+    assert first.parent_id == second.parent_id == sync_span.parent_id == root.span_id
+    assert {first.trace_id, second.trace_id, sync_span.trace_id} == {root.trace_id}
+    assert sync_span.name.endswith("compute")
+    assert tracer.current_span().__class__.__name__ == "_NoopSpan"  # context restored
+
+    tracer.flush()
+    (spans,) = read_otlp(tmp_path)
+    by_name = {span["name"]: span for span in spans}
+    assert "parentSpanId" not in by_name["http.request"]
+    assert by_name["test.fetch"]["parentSpanId"] == root.span_id
+    assert {"key": "path", "value": {"stringValue": "/api/chat"}} in by_name["http.request"]["attributes"]
+    assert all(int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"]) for span in spans)
+
+
+def test_errors_and_chrome_export(enabled_tracer, tmp_path):
+    with pytest.raises(ValueError):
+        with tracer.span("failing"):
+            raise ValueError("boom")
+    with tracer.span("second"):
+        pass
+    tracer.flush()
+
+    (failing,), (second,) = read_otlp(tmp_path)
+    assert failing["status"] == {"code": 2, "message": "ValueError: boom"}
+    assert second["status"] == {"code": 1}
+    events = json.loads((tmp_path / "traces.chrome.json").read_text().rstrip(",\n") + "]")
+    assert [event["name"] for event in events] == ["failing", "second"]
+    assert events[0]["ph"] == "X" and events[0]["args"]["error"] == "ValueError: boom"
+
+
+def test_disabled_tracer_exports_nothing(tmp_path):
+    enabled, exporter = tracer.enabled, tracer.exporter
+    tracer.configure(False, tmp_path)
+    try:
+        with tracer.span("ignored") as span:
+            span.set_attribute("key", "value")
+        assert compute().__class__.__name__ == "_NoopSpan"
+        tracer.flush()
+        assert not (tmp_path / "traces.otlp.jsonl").exists()
+    finally:
+        tracer.enabled, tracer.exporter = enabled, exporter
@@ -0,0 +1,58 @@
+"""
+Test suite for ChatHDI token usage and cost accounting
+"""
+import asyncio
+from types import SimpleNamespace
+from state_store import SQLiteStateStore
+from usage import UsageMeter, note_usage
+
+
+def openai_response(prompt, completion):
+    return SimpleNamespace(usage=SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion))
+
+
+def gemini_response(prompt, completion):
+    return SimpleNamespace(usage=None, usage_metadata=SimpleNamespace(prompt_token_count=prompt,
+                                                                      candidates_token_count=completion))
+
+
+def test_calls_are_metered_priced_and_flushed_in_batches(tmp_path):
+    """Two workers flush into one SQLite file; summaries add stored and unflushed rows"""
+    async def scenario():
+        store = SQLiteStateStore(tmp_path / "state.db")
+        await store.open()
+        first, second = UsageMeter(), UsageMeter()
+        first.store = second.store = store
+
+        for _ in range(2):
+            with first.track("aiml", "hdi-gpt4o-mini", "gpt-4o-mini", "chat"):
+                note_usage(openai_response(1000, 500))
+        with first.track("gemini", "hdi-4", "gemini-1.5-flash-latest", "pptx"):
+            note_usage(gemini_response(2000, 1000))
+        with first.track("groq", "hdi-grok", "llama-3.3-70b-versatile", "chat"):
+            pass  # provider error: no usage reported
+        note_usage(openai_response(1, 1))  # outside a call: ignored
+        await first.flush()
+        assert first.pending == {}
+
+        with second.track("aiml", "hdi-gpt4o-mini", "gpt-4o-mini", "chat"):
+            note_usage(openai_response(1000, 500))
+        await second.flush()
+        with second.track("aiml", "hdi-gpt4o-mini", "gpt-4o-mini", "chat"):
+            note_usage(openai_response(1000, 500))
+        return await second.summary("model"), await second.summary("feature")
+
+    by_model, by_feature = asyncio.run(scenario())
+    mini = by_model["groups"][0]
+    assert (mini["model"], mini["provider"], mini["calls"]) == ("hdi-gpt4o-mini", "aiml", 4)
+    assert (mini["prompt_tokens"], mini["completion_tokens"]) == (4000, 2000)
+    assert abs(mini["cost_usd"] - 4 * (1000 * 0.15 + 500 * 0.60) / 1e6) < 1e-9
+    assert by_model["totals"]["calls"] == 6 and by_model["totals"]["metered_calls"] == 5
+    assert {g["feature"]: g["calls"] for g in by_feature["groups"]} == {"chat": 5, "pptx": 1}
+
+
+def test_longest_price_key_wins():
+    meter = UsageMeter(prices={"gpt-4o": (2.5, 10), "gpt-4o-mini": (0.15, 0.6)})
+    assert meter.price("openai/gpt-4o-mini-2024-07-18") == (0.15, 0.6)
+    assert meter.price("gpt-4o") == (2.5, 10)
+    assert meter.cost("unknown-model", 1000, 1000) == 0.0
@@ -0,0 +1,260 @@
+"""
+Tracing for ChatHDI - lightweight in-process request spans
+Spans are propagated with contextvars (so they follow `await` chains) and,
+when a request's root span ends, the whole trace is written to local files:
+- traces.otlp.jsonl   one OTLP/JSON `resourceSpans` document per line
+- traces.chrome.json  Chrome trace events (open in https://ui.perfetto.dev
+                      or chrome://tracing, works offline)
+
+Enable with TRACING_ENABLED=true; files go to TRACE_EXPORT_DIR. Finished
+traces are queued and serialised/written by a background thread, so export
+never blocks the event loop.
+"""
+
+import os
+import json
+import time
+import queue
+import inspect
+import logging
+import secrets
+import threading
+import functools
+import contextvars
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+TRACE_EXPORT_DIR = os.environ.get('TRACE_EXPORT_DIR', '')
+SERVICE_NAME = 'chathdi-backend'
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar('chathdi_span', default=None)
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "error", "trace", "_token")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict):
+        self.name = name
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        # Every span of a trace shares the root's list; exported when the root ends
+        self.trace: List["Span"] = parent.trace if parent else []
+        self.trace.append(self)
+        self._token = None
+
+    @property
+    def is_root(self) -> bool:
+        return self.parent_id is None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+    def to_chrome(self) -> Dict:
+        return {
+            "name": self.name,
+            "cat": "chathdi",
+            "ph": "X",
+            "ts": self.start_ns / 1000,
+            "dur": (self.end_ns - self.start_ns) / 1000,
+            "pid": os.getpid(),
+            # One row per trace in the viewer
+            "tid": int(self.trace_id[:8], 16),
+            "args": {**self.attributes, **({"error": self.error} if self.error else {})},
+        }
+
+
+class _NoopSpan:
+    """Returned when tracing is disabled so call sites need no checks"""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _SpanContext:
+    """Context manager usable with both `with` and `async with`"""
+
+    __slots__ = ("tracer", "name", "attributes", "span")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+
+    def __enter__(self):
+        if not self.tracer.enabled:
+            return _NOOP_SPAN
+        self.span = Span(self.name, _current_span.get(), self.attributes)
+        self.span._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        if span is None:
+            return False
+        span.end_ns = time.time_ns()
+        if exc is not None:
+            span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(span._token)
+        if span.is_root:
+            self.tracer.export(span.trace)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+class FileSpanExporter:
+    """Append finished traces to OTLP/JSON and Chrome trace files (from a writer thread)"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.otlp_path = directory / "traces.otlp.jsonl"
+        self.chrome_path = directory / "traces.chrome.json"
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, spans: List[Span]):
+        """Queue a finished trace; returns immediately"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        self._queue.put(spans)
+
+    def flush(self):
+        """Block until every queued trace is written (tests, shutdown)"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                self.write(spans)
+            except Exception as e:
+                logger.warning(f"Trace export failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def write(self, spans: List[Span]):
+        document = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "chathdi"}, "spans": [s.to_otlp() for s in spans]}],
+            }]
+        }
+        chrome_events = "".join(json.dumps(s.to_chrome(), default=str) + ",\n" for s in spans)
+        # Only the writer thread appends, so the files need no lock
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.otlp_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(document, default=str) + "\n")
+        # Chrome's JSON array format allows the closing bracket to be omitted
+        new_file = not self.chrome_path.exists()
+        with open(self.chrome_path, "a", encoding="utf-8") as f:
+            if new_file:
+                f.write("[\n")
+            f.write(chrome_events)
+
+
+class Tracer:
+    """Creates spans and hands finished traces to the exporter"""
+
+    def __init__(self, enabled: bool = False, exporter: Optional[FileSpanExporter] = None):
+        self.enabled = enabled
+        self.exporter = exporter
+
+    def configure(self, enabled: bool, export_dir: Optional[Path] = None):
+        self.enabled = enabled
+        if export_dir is not None:
+            self.exporter = FileSpanExporter(Path(export_dir))
+        if enabled:
+            logger.info(f"Tracing enabled, exporting to {self.exporter.directory if self.exporter else 'nowhere'}")
+
+    def span(self, name: str, **attributes) -> _SpanContext:
+        """Start a child of the current span (or a new trace)"""
+        return _SpanContext(self, name, attributes)
+
+    def current_span(self):
+        return _current_span.get() or _NOOP_SPAN
+
+    def export(self, spans: List[Span]):
+        if self.exporter is None:
+            return
+        self.exporter.export(spans)
+
+    def flush(self):
+        if self.exporter is not None:
+            self.exporter.flush()
+
+
+# Singleton tracer
+tracer = Tracer()
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator that wraps a sync or async function in a span"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,201 @@
+"""
+Usage Accounting for ChatHDI - tokens, latency and estimated cost per AI call
+AIService wraps every provider call in `usage_meter.track(...)`; the `_chat_*`
+handlers report the provider's token counts with `note_usage(response)`
+(OpenAI-compatible `usage`, Gemini `usage_metadata`). Calls that return no
+usage (provider errors, missing keys, admission rejections) are counted as
+unmetered.
+
+Counts are aggregated in memory per (day, provider, model, feature) and
+flushed to the state store in one batch every USAGE_FLUSH_INTERVAL seconds
+(and at shutdown), so recording a call never waits on the database.
+GET /api/usage sums the stored rows plus this worker's unflushed ones.
+
+Costs are estimates from list prices in USD per million tokens; override or
+add models with USAGE_PRICES='{"gpt-4o": [2.5, 10], "llama-3.1-8b": [0.05, 0.08]}'
+(keys match as substrings of the provider's model name, longest first).
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from metrics import PROVIDER_TOKENS, PROVIDER_COST
+from state_store import USAGE_COUNTERS as COUNTERS
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSH_INTERVAL = float(os.environ.get('USAGE_FLUSH_INTERVAL', '60'))
+
+# USD per million (prompt, completion) tokens
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "claude-3-7-sonnet": (3.00, 15.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "llama-3.3-70b": (0.59, 0.79),
+    "llama-3.1-8b": (0.05, 0.08),
+    "gemma-3-27b": (0.10, 0.20),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-flash": (0.075, 0.30),
+}
+
+GROUPS = {"model": "model_id", "provider": "provider", "day": "day", "feature": "feature"}
+
+UsageKey = Tuple[str, str, str, str, str]  # day, provider, model_id, model, feature
+
+# Token counts of the provider call running in this task (set by UsageMeter.track)
+_current_call: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar('chathdi_usage', default=None)
+
+
+def _load_prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    raw = os.environ.get('USAGE_PRICES', '')
+    if raw:
+        try:
+            for model, (prompt, completion) in json.loads(raw).items():
+                prices[model.lower()] = (float(prompt), float(completion))
+        except (ValueError, AttributeError, TypeError) as e:
+            logger.error(f"Invalid USAGE_PRICES, using defaults: {e}")
+    return prices
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def note_usage(response):
+    """Add the token counts of a provider response to the current call (no-op outside one)"""
+    call = _current_call.get()
+    if call is None:
+        return
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        prompt, completion = getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0)
+    else:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        prompt, completion = getattr(usage, "prompt_token_count", 0), getattr(usage, "candidates_token_count", 0)
+    call["prompt_tokens"] += prompt or 0
+    call["completion_tokens"] += completion or 0
+    call["metered"] = True
+
+
+class UsageMeter:
+    """In-memory usage aggregates with periodic batched flushes to the state store"""
+
+    def __init__(self, flush_interval: float = USAGE_FLUSH_INTERVAL,
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.flush_interval = flush_interval
+        self.prices = prices or _load_prices()
+        # Longest key first so "gpt-4o-mini" wins over "gpt-4o"
+        self._price_keys = sorted(self.prices, key=len, reverse=True)
+        self.pending: Dict[UsageKey, Dict[str, float]] = {}
+        self.store = None
+
+    def price(self, model: str) -> Optional[Tuple[float, float]]:
+        name = model.lower()
+        return next((self.prices[key] for key in self._price_keys if key in name), None)
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price = self.price(model)
+        if price is None:
+            return 0.0
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    @contextmanager
+    def track(self, provider: str, model_id: str, model: str, feature: str):
+        """Measure one provider call; `note_usage` inside it adds the token counts"""
+        call = {"prompt_tokens": 0, "completion_tokens": 0, "metered": False}
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            _current_call.reset(token)
+            self.record(provider, model_id, model, feature, time.perf_counter() - start,
+                        call["prompt_tokens"], call["completion_tokens"], call["metered"])
+
+    def record(self, provider: str, model_id: str, model: str, feature: str, seconds: float,
+               prompt_tokens: int = 0, completion_tokens: int = 0, metered: bool = True):
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        row = self.pending.setdefault((_today(), provider, model_id, model, feature), dict.fromkeys(COUNTERS, 0))
+        row["calls"] += 1
+        row["metered_calls"] += int(metered)
+        row["prompt_tokens"] += prompt_tokens
+        row["completion_tokens"] += completion_tokens
+        row["latency_seconds"] += seconds
+        row["cost_usd"] += cost
+        if metered:
+            PROVIDER_TOKENS.labels(provider=provider, model=model, kind="prompt").inc(prompt_tokens)
+            PROVIDER_TOKENS.labels(provider=provider, model=model, kind="completion").inc(completion_tokens)
+            PROVIDER_COST.labels(provider=provider, model=model).inc(cost)
+
+    @staticmethod
+    def _rows(pending: Dict[UsageKey, Dict[str, float]]) -> List[Dict]:
+        return [{"day": day, "provider": provider, "model_id": model_id, "model": model, "feature": feature, **counts}
+                for (day, provider, model_id, model, feature), counts in pending.items()]
+
+    async def flush(self):
+        """Write the pending aggregates to the store in one batch"""
+        if self.store is None or not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        try:
+            await self.store.add_usage(self._rows(pending))
+        except Exception as e:
+            logger.error(f"Usage flush failed, keeping {len(pending)} rows for the next one: {e}")
+            for key, counts in pending.items():
+                row = self.pending.setdefault(key, dict.fromkeys(COUNTERS, 0))
+                for name in COUNTERS:
+                    row[name] += counts[name]
+
+    async def run(self, store):
+        """Flush every flush_interval seconds (the server flushes once more at shutdown)"""
+        self.store = store
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def summary(self, group_by: str = "model", days: int = 7) -> Dict:
+        """Totals per model, provider, day or feature over the last `days` days (UTC)"""
+        field = GROUPS[group_by]
+        since = (datetime.now(timezone.utc).date() - timedelta(days=max(1, days) - 1)).isoformat()
+        rows = await self.store.list_usage(since) if self.store is not None else []
+        rows += [row for row in self._rows(self.pending) if row["day"] >= since]
+
+        groups: Dict[str, Dict] = {}
+        totals = dict.fromkeys(COUNTERS, 0)
+        for row in rows:
+            group = groups.setdefault(row[field], dict.fromkeys(COUNTERS, 0))
+            if field == "model_id":
+                group["provider"] = row["provider"]
+            for name in COUNTERS:
+                group[name] += row[name]
+                totals[name] += row[name]
+
+        def finish(counts: Dict) -> Dict:
+            calls = counts["calls"]
+            return {**counts, "latency_seconds": round(counts["latency_seconds"], 3),
+                    "avg_latency_seconds": round(counts["latency_seconds"] / calls, 3) if calls else None,
+                    "cost_usd": round(counts["cost_usd"], 6)}
+
+        order = sorted(groups.items(), reverse=field != "day",
+                       key=(lambda item: item[0]) if field == "day"
+                       else (lambda item: (item[1]["cost_usd"], item[1]["calls"])))
+        return {
+            "group_by": group_by,
+            "since": since,
+            "totals": finish(totals),
+            "groups": [{group_by: name, **finish(counts)} for name, counts in order],
+        }
+
+
+# Singleton instance
+usage_meter = UsageMeter()
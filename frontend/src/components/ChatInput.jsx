@@ -1,5 +1,5 @@
 import React, { useState, useRef, useEffect } from 'react';
-import { Send, Image as ImageIcon, Sparkles, Mic, Paperclip, FileText, Globe, Lock, StopCircle, ChevronDown, Zap, Code, Eye, Brain, FolderOpen, X, Palette, BookOpen } from 'lucide-react';
+import { Send, Image as ImageIcon, Sparkles, Mic, Paperclip, FileText, Globe, Lock, StopCircle, ChevronDown, Zap, Code, Eye, Brain, FolderOpen, X, Palette, BookOpen, Wand2 } from 'lucide-react';
 import { cn } from '../lib/utils';
 import { aiModels } from '../data/mockData';
 
@@ -434,7 +434,7 @@ const ChatInput = ({
   const modelIcons = {
     'hdi-4': Zap, 'hdi-4-mini': Sparkles, 'hdi-grok': Brain,
     'hdi-grok-mini': Sparkles, 'hdi-vision': Eye, 'hdi-code': Code,
-    'hdi-image': Palette, 'hdi-image-flux': Palette
+    'hdi-image': Palette, 'hdi-image-flux': Palette, 'hdi-auto': Wand2
   };
   const ModelIcon = modelIcons[currentModel.id] || Zap;
 
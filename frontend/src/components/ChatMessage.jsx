@@ -1,6 +1,14 @@
 import React from 'react';
 import { User, Copy, Check, RefreshCw, ThumbsUp, ThumbsDown, Share, Bookmark, MoreHorizontal, Sparkles, Download, Play, Image as ImageIcon, Film, FileText, FolderOpen, StopCircle, Table } from 'lucide-react';
 import { cn } from '../lib/utils';
+import config from '../config';
+
+// Media from the backend is a reference (/api/media/<hash>); older messages hold base64
+const mediaSrc = (data, mimeType) => {
+  if (data.startsWith('/api/')) return `${config.API_URL}${data.slice('/api'.length)}`;
+  if (data.startsWith('http') || data.startsWith('data:')) return data;
+  return `data:${mimeType};base64,${data}`;
+};
 
 const ChatMessage = ({ message, onRegenerate, isLast, onOpenCanvas, onGeneratePPT, onExport, onBookmark, autoSpeak, onSpeakEnd }) => {
   const [copied, setCopied] = React.useState(false);
@@ -145,7 +153,7 @@ const ChatMessage = ({ message, onRegenerate, isLast, onOpenCanvas, onGeneratePP
     }
   };
 
-  const handleDownloadMedia = (base64Data, mediaType, index) => {
+  const handleDownloadMedia = async (data, mediaType, index) => {
     let mimeType, extension, filename;
 
     if (mediaType === 'image') {
@@ -162,12 +170,24 @@ const ChatMessage = ({ message, onRegenerate, isLast, onOpenCanvas, onGeneratePP
       filename = message.filename || `ChatHDI_Presentation_${Date.now()}.pptx`;
     }
 
+    let href = mediaSrc(data, mimeType);
+    if (href.startsWith('http')) {
+      // The download attribute is ignored for cross-origin URLs: download through a blob
+      try {
+        const response = await fetch(href);
+        href = URL.createObjectURL(await response.blob());
+      } catch (error) {
+        console.error('Failed to download media:', error);
+      }
+    }
+
     const link = document.createElement('a');
-    link.href = `data:${mimeType};base64,${base64Data}`;
+    link.href = href;
     link.download = filename;
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
+    if (href.startsWith('blob:')) setTimeout(() => URL.revokeObjectURL(href), 1000);
   };
 
   const renderMedia = () => {
@@ -182,7 +202,8 @@ const ChatMessage = ({ message, onRegenerate, isLast, onOpenCanvas, onGeneratePP
             {message.mediaType === 'image' ? (
               <div className="relative rounded-xl overflow-hidden border border-[#2f2f2f] max-w-lg">
                 <img
-                  src={`data:image/png;base64,${data}`}
+                  src={mediaSrc(data, 'image/png')}
+                  loading="lazy"
                   alt={`Generated image ${index + 1}`}
                   className="w-full h-auto"
                 />
@@ -222,7 +243,7 @@ const ChatMessage = ({ message, onRegenerate, isLast, onOpenCanvas, onGeneratePP
             ) : (
               <div className="relative rounded-xl overflow-hidden border border-[#2f2f2f] max-w-lg">
                 <video
-                  src={`data:video/mp4;base64,${data}`}
+                  src={mediaSrc(data, 'video/mp4')}
                   controls
                   className="w-full h-auto"
                 />
@@ -141,6 +141,9 @@ export const mockConversations = [
 ];
 
 export const aiModels = [
+  // === AUTO - picks a model per question (backend model_router.py) ===
+  { id: 'hdi-auto', name: 'HDI Auto', description: 'Pilih model otomatis sesuai pertanyaan', icon: '🪄', category: 'chat', badge: '✨ Auto' },
+
   // === AIML API - Top Models (FREE 50k credits) ===
   // { id: 'hdi-gpt4o', name: 'GPT-4o', description: 'OpenAI terkuat via AIML (Gratis)', icon: '🧠', category: 'chat', badge: '🆓 Free' },
   // { id: 'hdi-gpt4o-mini', name: 'GPT-4o Mini', description: 'OpenAI cepat via AIML (Gratis)', icon: '⚡', category: 'chat', badge: '🆓 Free' },
@@ -84,6 +84,24 @@ const ChatPage = () => {
     }
   };
 
+  // Generated files go to the backend media store; the conversation keeps only the /api/media reference
+  const uploadMedia = async (base64, filename) => {
+    try {
+      const bytes = Uint8Array.from(atob(base64), (c) => c.charCodeAt(0));
+      const form = new FormData();
+      form.append('file', new Blob([bytes]), filename);
+      const response = await fetch(`${config.API_URL}/media`, { method: 'POST', body: form });
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const data = await response.json();
+      return data.url;
+    } catch (error) {
+      console.error('Failed to upload media, keeping it inline:', error);
+      return base64;
+    }
+  };
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
@@ -352,7 +370,7 @@ const ChatPage = () => {
           content: aiText,
           timestamp: new Date(),
           mediaType: success ? 'pptx' : null,
-          mediaData: success ? [pptBase64] : null,
+          mediaData: success ? [await uploadMedia(pptBase64, filename)] : null,
           filename: filename
         };
 
@@ -620,7 +638,7 @@ const ChatPage = () => {
         content: `Presentasi berhasil dibuat dari pesan yang dipilih!`,
         timestamp: new Date(),
         mediaType: 'pptx',
-        mediaData: [base64],
+        mediaData: [await uploadMedia(base64, filename)],
         filename: filename
       };
 